@@ -1,7 +1,18 @@
+import asyncio
+
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+
+from core.accounts import migrate_legacy_token
+from core.metrics import MetricsMiddleware
+from core.mirrors import mirror_scheduler
+from core.profiling import PROFILING_ENABLED, ProfilingMiddleware
+from core.responses import CompressionMiddleware, FastJSONResponse
 from routers import (
+    admin,
     downloads,
     search,
     channels,
@@ -12,9 +23,23 @@ from routers import (
     home,
     videos,
     activities,
+    metrics,
+    thumbnails,
+    subscriptions,
 )
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Upgraded single-account installs keep their creds/token.json account
+    await asyncio.to_thread(migrate_legacy_token)
+    # Playlist mirrors sync on their own schedule, not on requests
+    mirror_scheduler.start()
+    yield
+    mirror_scheduler.stop()
+
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 app.include_router(downloads.router)
 app.include_router(search.router)
 app.include_router(channels.router)
@@ -25,6 +50,11 @@ app.include_router(history.router)
 app.include_router(home.router)
 app.include_router(videos.router)
 app.include_router(activities.router)
+app.include_router(metrics.router)
+app.include_router(thumbnails.router)
+app.include_router(subscriptions.router)
+if PROFILING_ENABLED:
+    app.include_router(admin.router)
 
 load_dotenv()
 
@@ -45,10 +75,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(CompressionMiddleware)
+
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    body = await request.body()
-    print("Incoming request body:", body.decode("utf-8"))
-    response = await call_next(request)
-    return response
+# Outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
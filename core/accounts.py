@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from google.oauth2.credentials import Credentials
+
+from core.activities import pollers
+from core.credentials import CredentialCache
+from core.subscriptions import syncers
+from core.youtube import account_key
+from db.db import SessionLocal
+from schemas.schemas import Account, AccountSession, AccountSessionMember
+
+logger = logging.getLogger(__name__)
+
+# Single-account installs kept their token here, it is imported once
+LEGACY_TOKEN_PATH = os.path.join("creds", "token.json")
+
+_migration_lock = threading.Lock()
+_migrated = False
+_default_id: Optional[str] = None  # Cached, reset whenever accounts change
+# Requests without a session use the oldest account, for single-user installs only
+DEFAULT_ACCOUNT_FALLBACK = os.getenv("DEFAULT_ACCOUNT_FALLBACK", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+SESSION_TOKEN_BYTES = 32
+
+
+@dataclass
+class SessionAccounts:
+    id: str
+    selected: Optional[str]
+    accounts: List[str]  # Authorized through this session
+
+
+# Sessions are read on every request, entries are dropped whenever they change
+_sessions: Dict[str, SessionAccounts] = {}
+
+
+def _load_token(account_id: str) -> Optional[Credentials]:
+    db = SessionLocal()
+    try:
+        account = db.get(Account, account_id)
+        if account is None:
+            return None
+        return Credentials.from_authorized_user_info(json.loads(account.token))
+    finally:
+        db.close()
+
+
+def _persist_token(account_id: str, credentials: Credentials):
+    # One row per account, so refreshes of different accounts never contend.
+    # A refresh finishing after the account was deleted must not bring it back.
+    db = SessionLocal()
+    try:
+        db.query(Account).filter(Account.id == account_id).update(
+            {Account.token: credentials.to_json(), Account.updated_at: datetime.now()}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+# Credentials are read from the database once per account, then served from memory
+credential_cache = CredentialCache(load=_load_token, persist=_persist_token)
+
+
+def save_account(account_id: str, credentials: Credentials, title: Optional[str]):
+    global _default_id
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        account = db.get(Account, account_id) or Account(id=account_id, created_at=now)
+        account.token = credentials.to_json()
+        account.updated_at = now
+        if title is not None:
+            account.title = title
+        db.add(account)
+        db.commit()
+    finally:
+        db.close()
+    credential_cache.put(account_id, credentials)
+    _default_id = None
+
+
+def _delete_account(account_id: str) -> bool:
+    global _default_id
+    _default_id = None
+    db = SessionLocal()
+    try:
+        deleted = db.query(Account).filter(Account.id == account_id).delete()
+        db.query(AccountSessionMember).filter(
+            AccountSessionMember.account_id == account_id
+        ).delete()
+        db.query(AccountSession).filter(
+            AccountSession.selected_account_id == account_id
+        ).update({AccountSession.selected_account_id: None})
+        db.commit()
+    finally:
+        db.close()
+    _sessions.clear()
+    credential_cache.evict(account_id)
+    return bool(deleted)
+
+
+async def delete_account(account_id: str) -> bool:
+    """Forget an account and stop the background work running for it."""
+    credentials = await asyncio.to_thread(_load_token, account_id)
+    if not await asyncio.to_thread(_delete_account, account_id):
+        return False
+    if credentials is not None:
+        key = account_key(credentials)
+        for workers in (pollers, syncers):
+            worker = workers.pop(key, None)
+            if worker is not None:
+                worker.stop()
+    return True
+
+
+def list_accounts(account_ids: List[str]) -> List[Dict]:
+    db = SessionLocal()
+    try:
+        return [
+            {
+                "id": account.id,
+                "title": account.title,
+                "created_at": account.created_at,
+                "updated_at": account.updated_at,
+            }
+            for account in db.query(Account)
+            .filter(Account.id.in_(account_ids))
+            .order_by(Account.created_at)
+        ]
+    finally:
+        db.close()
+
+
+def _session_id(token: str) -> str:
+    # Only a hash is stored, so the table does not hold usable cookies
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def load_session(token: str) -> Optional[SessionAccounts]:
+    """Accounts of the session behind a session cookie, None when unknown."""
+    session_id = _session_id(token)
+    session = _sessions.get(session_id)
+    if session is not None:
+        return session
+    db = SessionLocal()
+    try:
+        record = db.get(AccountSession, session_id)
+        if record is None:
+            return None
+        members = db.query(AccountSessionMember.account_id).filter(
+            AccountSessionMember.session_id == session_id
+        )
+        session = SessionAccounts(
+            id=session_id,
+            selected=record.selected_account_id,
+            accounts=[member.account_id for member in members],
+        )
+    finally:
+        db.close()
+    _sessions[session_id] = session
+    return session
+
+
+def add_session_account(token: Optional[str], account_id: str) -> str:
+    """
+    Authorize an account for a session and select it.
+
+    A new session is created when token is missing or unknown. Returns the
+    token of the session, to be set as its cookie.
+    """
+    if token is None or load_session(token) is None:
+        token = secrets.token_urlsafe(SESSION_TOKEN_BYTES)
+    session_id = _session_id(token)
+    db = SessionLocal()
+    try:
+        record = db.get(AccountSession, session_id) or AccountSession(
+            id=session_id, created_at=datetime.now()
+        )
+        record.selected_account_id = account_id
+        db.add(record)
+        if db.get(AccountSessionMember, (session_id, account_id)) is None:
+            db.add(AccountSessionMember(session_id=session_id, account_id=account_id))
+        db.commit()
+    finally:
+        db.close()
+    _sessions.pop(session_id, None)
+    return token
+
+
+def select_session_account(session: SessionAccounts, account_id: str) -> bool:
+    if account_id not in session.accounts:
+        return False
+    db = SessionLocal()
+    try:
+        db.get(AccountSession, session.id).selected_account_id = account_id
+        db.commit()
+    finally:
+        db.close()
+    _sessions.pop(session.id, None)
+    return True
+
+
+def account_exists(account_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.get(Account, account_id) is not None
+    finally:
+        db.close()
+
+
+def migrate_legacy_token():
+    """Import creds/token.json as an account, once, and set the file aside."""
+    global _migrated
+    if _migrated:
+        return
+    with _migration_lock:
+        if _migrated:
+            return
+        if os.path.exists(LEGACY_TOKEN_PATH):
+            with open(LEGACY_TOKEN_PATH) as token_file:
+                credentials = Credentials.from_authorized_user_info(
+                    json.load(token_file)
+                )
+            account_id = account_key(credentials)
+            if not account_exists(account_id):
+                save_account(account_id, credentials, None)
+            os.replace(LEGACY_TOKEN_PATH, LEGACY_TOKEN_PATH + ".migrated")
+            logger.info(f"Imported {LEGACY_TOKEN_PATH} as account {account_id}")
+        _migrated = True
+
+
+def default_account_id() -> Optional[str]:
+    """The oldest account, used when a request does not pick one."""
+    global _default_id
+    if _default_id is None:
+        migrate_legacy_token()
+        db = SessionLocal()
+        try:
+            account = db.query(Account.id).order_by(Account.created_at).first()
+            _default_id = account.id if account else None
+        finally:
+            db.close()
+    return _default_id
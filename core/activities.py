@@ -0,0 +1,176 @@
+import asyncio
+import logging
+
+from collections import deque
+from typing import Dict, List, Set
+
+from sqlalchemy.dialects.sqlite import insert
+
+from core.youtube import account_key, execute_with_retry, parse_timestamp
+from db.db import SessionLocal
+from schemas.schemas import ActivityRecord
+
+logger = logging.getLogger(__name__)
+
+POLL_MIN_INTERVAL = 60  # Seconds between polls right after new activity
+POLL_MAX_INTERVAL = 15 * 60  # Quiet accounts back off up to this interval
+SEEN_IDS = 500  # Activity IDs remembered for change detection
+
+# contentDetails sections that reference a video, by activity type
+VIDEO_REFERENCES = {
+    "upload": ("videoId",),
+    "like": ("resourceId", "videoId"),
+    "favorite": ("resourceId", "videoId"),
+    "playlistItem": ("resourceId", "videoId"),
+    "recommendation": ("resourceId", "videoId"),
+    "bulletin": ("resourceId", "videoId"),
+}
+
+
+def _video_id(item: Dict) -> str | None:
+    activity_type = item["snippet"].get("type")
+    value = item.get("contentDetails", {}).get(activity_type, {})
+    for key in VIDEO_REFERENCES.get(activity_type, ()):
+        value = value.get(key, {}) if isinstance(value, dict) else {}
+    # Types without a video reference leave their whole section here
+    return value if isinstance(value, str) and value else None
+
+
+def activity_row(item: Dict, account: str) -> Dict:
+    snippet = item["snippet"]
+    return {
+        "id": item["id"],
+        "account": account,
+        "type": snippet.get("type"),
+        "title": snippet.get("title"),
+        "description": snippet.get("description"),
+        "video_id": _video_id(item),
+        "published_at": parse_timestamp(snippet["publishedAt"]),
+    }
+
+
+def _store_activities(rows: List[Dict]):
+    db = SessionLocal()
+    try:
+        db.execute(insert(ActivityRecord).values(rows).on_conflict_do_nothing())
+        db.commit()
+    finally:
+        db.close()
+
+
+def _recent_ids(account: str) -> List[str]:
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(ActivityRecord.id)
+            .filter(ActivityRecord.account == account)
+            .order_by(ActivityRecord.published_at.desc())
+            .limit(SEEN_IDS)
+        )
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+class ActivityPoller:
+    """
+    Polls the activities of one account in the background.
+
+    New items are detected against the last seen IDs, stored locally and
+    pushed to subscribers. The interval doubles while nothing changes and
+    drops back to the minimum as soon as new activity shows up.
+    """
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.account = account_key(credentials)
+        self.interval = POLL_MIN_INTERVAL
+        self.ready = asyncio.Event()  # Set after the first successful poll
+        self._seen: deque = deque(maxlen=SEEN_IDS)
+        self._seen_set: Set[str] = set()
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=100)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _remember(self, activity_id: str):
+        if len(self._seen) == self._seen.maxlen:
+            self._seen_set.discard(self._seen[0])
+        self._seen.append(activity_id)
+        self._seen_set.add(activity_id)
+
+    async def poll_once(self) -> List[Dict]:
+        response = await execute_with_retry(
+            self.credentials,
+            lambda youtube: youtube.activities().list(
+                part="snippet,contentDetails", mine=True, maxResults=50
+            ),
+        )
+        new_rows = [
+            activity_row(item, self.account)
+            for item in response.get("items", [])
+            if item["id"] not in self._seen_set
+        ]
+        if new_rows:
+            await asyncio.to_thread(_store_activities, new_rows)
+            # Oldest first, so subscribers receive them in order
+            for row in sorted(new_rows, key=lambda row: row["published_at"]):
+                self._remember(row["id"])
+                self._publish(row)
+        return new_rows
+
+    def _publish(self, row: Dict):
+        event = {**row, "published_at": row["published_at"].isoformat() + "Z"}
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumers lose the oldest pending item
+                queue.get_nowait()
+                queue.put_nowait(event)
+
+    async def _run(self):
+        for activity_id in reversed(await asyncio.to_thread(_recent_ids, self.account)):
+            self._remember(activity_id)
+
+        while True:
+            try:
+                new_rows = await self.poll_once()
+                self.interval = (
+                    POLL_MIN_INTERVAL
+                    if new_rows
+                    else min(self.interval * 2, POLL_MAX_INTERVAL)
+                )
+            except Exception as e:
+                logger.warning(f"Activity poll failed: {e}")
+                self.interval = min(self.interval * 2, POLL_MAX_INTERVAL)
+            finally:
+                self.ready.set()
+            await asyncio.sleep(self.interval)
+
+
+pollers: Dict[str, ActivityPoller] = {}
+
+
+def ensure_poller(credentials) -> ActivityPoller:
+    """Return the running poller of an account, starting it on first use."""
+    key = account_key(credentials)
+    poller = pollers.get(key)
+    if poller is None:
+        poller = pollers[key] = ActivityPoller(credentials)
+    poller.start()
+    return poller
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import time
+
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Protocol, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AI_COMMENT_BACKEND = os.getenv("AI_COMMENT_BACKEND", "gemini")  # "gemini" or "stub"
+AI_MODEL_NAME = os.getenv("AI_MODEL_NAME", "gemini-1.5-flash")
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_CACHE_SIZE = 512
+AI_CACHE_TTL = 60 * 60
+
+
+class CommentModel(Protocol):
+    async def generate(self, prompt: str) -> str: ...
+
+    def stream(self, prompt: str) -> AsyncIterator[str]: ...
+
+
+class GeminiCommentModel:
+    """Gemini backend, configured once and reused across requests."""
+
+    def __init__(self, api_key: str, model_name: str = AI_MODEL_NAME):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model_name=model_name)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._model.generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self._model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+
+class StubCommentModel:
+    """Deterministic local backend for tests and benchmarks."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+
+    def _text(self, prompt: str) -> str:
+        comment = prompt.rsplit(": ", 1)[-1]
+        return "\n".join(
+            ["**Option 1**", f"{comment}!", "", "**Option 2**", f"Honestly, {comment}"]
+        )
+
+    async def generate(self, prompt: str) -> str:
+        await asyncio.sleep(self.delay)
+        return self._text(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        for line in self._text(prompt).split("\n"):
+            await asyncio.sleep(self.delay / 5)
+            yield line + "\n"
+
+
+_model: Optional[CommentModel] = None
+
+
+def get_comment_model() -> CommentModel:
+    global _model
+    if _model is None:
+        if AI_COMMENT_BACKEND == "stub":
+            _model = StubCommentModel()
+        else:
+            _model = GeminiCommentModel(api_key=os.environ["GEMINI_API_KEY"])
+    return _model
+
+
+def set_comment_model(model: Optional[CommentModel]):
+    """Swap the backend, e.g. for a stub in tests. `None` restores the default."""
+    global _model
+    _model = model
+
+
+def build_prompt(comment_text: str, category: str) -> str:
+    return f"Please improve this comment by making it more {category}: {comment_text}"
+
+
+def parse_line(
+    line: str, current_category: Optional[str]
+) -> Tuple[Optional[str], Optional[str]]:
+    """Classify one response line, returns (category, comment)."""
+    line = line.strip()  # Remove leading/trailing whitespace
+    if line.startswith("**") and line.endswith("**"):  # Detect category headers
+        return line.strip("**"), None
+    if line and current_category:  # Add comments to the current category
+        return current_category, line
+    return current_category, None
+
+
+def parse_categorized_comments(text: str) -> Dict[str, List[str]]:
+    categorized_comments = {}
+    current_category = None
+    for line in text.split("\n"):
+        current_category, comment = parse_line(line, current_category)
+        if current_category is not None:
+            categorized_comments.setdefault(current_category, [])
+        if comment:
+            categorized_comments[current_category].append(comment)
+    return categorized_comments
+
+
+class CommentGenerator:
+    """Runs generations on a bounded pool with a result cache keyed by (comment_text, category)."""
+
+    def __init__(
+        self,
+        max_concurrency: int = AI_MAX_CONCURRENCY,
+        cache_size: int = AI_CACHE_SIZE,
+        cache_ttl: float = AI_CACHE_TTL,
+    ):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def cached(self, comment_text: str, category: str) -> Optional[Dict]:
+        key = (comment_text, category)
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > self.cache_ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _store(self, comment_text: str, category: str, comments: Dict):
+        self._cache[(comment_text, category)] = (time.time(), comments)
+        self._cache.move_to_end((comment_text, category))
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _generate(self, comment_text: str, category: str) -> Dict:
+        async with self._semaphore:
+            text = await get_comment_model().generate(
+                build_prompt(comment_text, category)
+            )
+        comments = parse_categorized_comments(text)
+        self._store(comment_text, category, comments)
+        return comments
+
+    async def generate(self, comment_text: str, category: str) -> Dict:
+        comments = self.cached(comment_text, category)
+        if comments is not None:
+            return comments
+
+        # Identical concurrent requests share one generation
+        key = (comment_text, category)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._generate(comment_text, category))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded, so a client going away does not cancel it for the others
+        return await asyncio.shield(task)
+
+    async def _read_model(self, prompt: str, chunks: asyncio.Queue):
+        # Holds a pool slot only while the model runs, never while a client reads
+        try:
+            async with self._semaphore:
+                async for chunk in get_comment_model().stream(prompt):
+                    chunks.put_nowait(chunk)
+        finally:
+            chunks.put_nowait(None)
+
+    async def stream(self, comment_text: str, category: str) -> AsyncIterator[Dict]:
+        """Yield {"category", "comment"} events as the model produces lines."""
+        comments = self.cached(comment_text, category)
+        if comments is not None:
+            for cached_category, lines in comments.items():
+                for comment in lines:
+                    yield {"category": cached_category, "comment": comment}
+            return
+
+        prompt = build_prompt(comment_text, category)
+        text = ""
+        buffer = ""
+        current_category = None
+        chunks: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.create_task(self._read_model(prompt, chunks))
+        try:
+            while (chunk := await chunks.get()) is not None:
+                text += chunk
+                buffer += chunk
+                *lines, buffer = buffer.split("\n")
+                for line in lines:
+                    current_category, comment = parse_line(line, current_category)
+                    if comment:
+                        yield {"category": current_category, "comment": comment}
+            await reader  # Raises the model's error, if any
+        finally:
+            reader.cancel()
+
+        current_category, comment = parse_line(buffer, current_category)
+        if comment:
+            yield {"category": current_category, "comment": comment}
+        self._store(comment_text, category, parse_categorized_comments(text))
+
+
+comment_generator = CommentGenerator()
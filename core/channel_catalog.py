@@ -0,0 +1,352 @@
+import asyncio
+import json
+import logging
+import re
+
+from datetime import datetime
+from typing import Dict, List, Set
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from core.local_store import (
+    LOCAL_PAGE_PREFIX,
+    UPSERT_CHUNK_SIZE,
+    local_page_offset,
+    next_local_page_token,
+)
+from core.youtube import (
+    execute_with_retry,
+    naive_utc,
+    parse_timestamp,
+    uploads_playlist_id,
+)
+from db.db import SessionLocal
+from models.channels import ChannelSearchParams
+from schemas.schemas import ChannelCatalog, ChannelVideo
+
+logger = logging.getLogger(__name__)
+
+CATALOG_BATCH_SIZE = 50  # videos.list accepts up to 50 IDs per call
+CATALOG_CONCURRENCY = 4
+CATALOG_TTL = 60 * 60  # Catalogs older than this are refreshed in the background
+# Statistics of catalogued videos refreshed per sync, least recently refreshed first
+CATALOG_STATS_REFRESH = 4 * CATALOG_BATCH_SIZE
+
+DURATION_REGEX = re.compile(
+    r"P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?"
+)
+# Same buckets as search.list's videoDuration filter
+DURATION_BOUNDS = {
+    "short": (0, 4 * 60),
+    "medium": (4 * 60, 20 * 60),
+    "long": (20 * 60, None),
+}
+DEFINITIONS = {"high": "hd", "medium": "sd", "low": "sd"}
+SORT_COLUMNS = {
+    "date": ChannelVideo.published_at.desc(),
+    "relevance": ChannelVideo.published_at.desc(),
+    "viewCount": ChannelVideo.view_count.desc(),
+    "rating": ChannelVideo.like_count.desc(),
+}
+
+_refreshing: Set[str] = set()
+
+
+def parse_duration(value: str | None) -> int | None:
+    """Convert an ISO 8601 duration such as PT1H2M3S into seconds."""
+    match = DURATION_REGEX.fullmatch(value or "")
+    if not match:
+        return None
+    parts = {name: int(amount or 0) for name, amount in match.groupdict().items()}
+    return (
+        parts["days"] * 86400
+        + parts["hours"] * 3600
+        + parts["minutes"] * 60
+        + parts["seconds"]
+    )
+
+
+def _int_or_none(value) -> int | None:
+    return int(value) if value is not None else None
+
+
+def _video_row(item: Dict) -> Dict:
+    snippet = item["snippet"]
+    statistics = item.get("statistics", {})
+    content_details = item.get("contentDetails", {})
+    return {
+        "video_id": item["id"],
+        "channel_id": snippet["channelId"],
+        "title": snippet["title"],
+        "description": snippet.get("description"),
+        "channel_title": snippet.get("channelTitle"),
+        "thumbnails": json.dumps(snippet.get("thumbnails", {})),
+        "published_at": parse_timestamp(snippet["publishedAt"]),
+        "duration_seconds": parse_duration(content_details.get("duration")),
+        "definition": content_details.get("definition"),
+        "view_count": _int_or_none(statistics.get("viewCount")),
+        "like_count": _int_or_none(statistics.get("likeCount")),
+        "comment_count": _int_or_none(statistics.get("commentCount")),
+    }
+
+
+def _known_ids(db: Session, video_ids: List[str]) -> Set[str]:
+    rows = db.query(ChannelVideo.video_id).filter(ChannelVideo.video_id.in_(video_ids))
+    return {row.video_id for row in rows}
+
+
+def _stale_ids(db: Session, channel_id: str, limit: int) -> List[str]:
+    rows = (
+        db.query(ChannelVideo.video_id)
+        .filter(ChannelVideo.channel_id == channel_id)
+        .order_by(ChannelVideo.stats_synced_at)  # Never refreshed ones sort first
+        .limit(limit)
+    )
+    return [row.video_id for row in rows]
+
+
+def _statistics_row(video_id: str, item: Dict | None, now: datetime) -> Dict:
+    # Videos gone from YouTube keep their last counts and rotate on
+    statistics = item.get("statistics", {}) if item else {}
+    row = {"video_id": video_id, "stats_synced_at": now}
+    if item:
+        row.update(
+            view_count=_int_or_none(statistics.get("viewCount")),
+            like_count=_int_or_none(statistics.get("likeCount")),
+            comment_count=_int_or_none(statistics.get("commentCount")),
+        )
+    return row
+
+
+def _store(db: Session, channel_id: str, rows: List[Dict], statistics: List[Dict]):
+    # Chunked to stay below SQLite's limit on bound variables
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        statement = insert(ChannelVideo).values(rows[start : start + UPSERT_CHUNK_SIZE])
+        statement = statement.on_conflict_do_update(
+            index_elements=[ChannelVideo.video_id],
+            set_={
+                column: statement.excluded[column]
+                for column in (
+                    "title",
+                    "view_count",
+                    "like_count",
+                    "comment_count",
+                    "stats_synced_at",
+                )
+            },
+        )
+        db.execute(statement)
+    # Rows differ in their columns, videos gone from YouTube only rotate
+    for row in statistics:
+        db.execute(
+            update(ChannelVideo)
+            .where(ChannelVideo.video_id == row["video_id"])
+            .values({key: value for key, value in row.items() if key != "video_id"})
+        )
+
+    catalog = db.get(ChannelCatalog, channel_id) or ChannelCatalog(
+        channel_id=channel_id, uploads_playlist_id=uploads_playlist_id(channel_id)
+    )
+    catalog.video_count = (
+        db.query(func.count(ChannelVideo.video_id))
+        .filter(ChannelVideo.channel_id == channel_id)
+        .scalar()
+    )
+    catalog.synced_at = datetime.now()
+    db.add(catalog)
+    db.commit()
+    return catalog
+
+
+async def _fetch_details(
+    credentials,
+    video_ids: List[str],
+    semaphore,
+    part: str = "snippet,contentDetails,statistics",
+) -> List[Dict]:
+    async with semaphore:
+        response = await execute_with_retry(
+            credentials,
+            lambda youtube: youtube.videos().list(
+                part=part,
+                id=",".join(video_ids),
+                maxResults=CATALOG_BATCH_SIZE,
+            ),
+        )
+    return response.get("items", [])
+
+
+async def _refresh_statistics(credentials, db: Session, channel_id: str, semaphore):
+    """Statistics rows for the catalogued videos refreshed least recently."""
+    video_ids = await asyncio.to_thread(
+        _stale_ids, db, channel_id, CATALOG_STATS_REFRESH
+    )
+    batches = await asyncio.gather(
+        *(
+            _fetch_details(
+                credentials,
+                video_ids[start : start + CATALOG_BATCH_SIZE],
+                semaphore,
+                part="statistics",
+            )
+            for start in range(0, len(video_ids), CATALOG_BATCH_SIZE)
+        )
+    )
+    items = {item["id"]: item for batch in batches for item in batch}
+    now = datetime.now()
+    return [
+        _statistics_row(video_id, items.get(video_id), now) for video_id in video_ids
+    ]
+
+
+async def sync_channel_catalog(credentials, db: Session, channel_id: str) -> Dict:
+    """
+    Mirror new uploads of a channel into the local catalog.
+
+    The uploads playlist lists the newest videos first, so paging stops at the
+    first page that contains an already catalogued video. Details for each
+    page of new IDs are fetched with one videos.list call while paging goes on.
+    Statistics of already catalogued videos are refreshed in rotation, up to
+    CATALOG_STATS_REFRESH per sync.
+    """
+    playlist_id = uploads_playlist_id(channel_id)
+    semaphore = asyncio.Semaphore(CATALOG_CONCURRENCY)
+    detail_tasks = []
+    page_token = None
+
+    try:
+        while True:
+            response = await execute_with_retry(
+                credentials,
+                lambda youtube: youtube.playlistItems().list(
+                    part="contentDetails",
+                    playlistId=playlist_id,
+                    maxResults=CATALOG_BATCH_SIZE,
+                    pageToken=page_token,
+                ),
+            )
+            video_ids = [
+                item["contentDetails"]["videoId"] for item in response.get("items", [])
+            ]
+            known = await asyncio.to_thread(_known_ids, db, video_ids)
+            new_ids = [video_id for video_id in video_ids if video_id not in known]
+            if new_ids:
+                detail_tasks.append(
+                    asyncio.create_task(_fetch_details(credentials, new_ids, semaphore))
+                )
+
+            page_token = response.get("nextPageToken")
+            if known or not page_token:
+                break
+
+        batches = await asyncio.gather(*detail_tasks)
+    finally:
+        for task in detail_tasks:
+            task.cancel()
+
+    # Picked before the new videos are stored, so they are not refreshed twice
+    statistics = await _refresh_statistics(credentials, db, channel_id, semaphore)
+
+    now = datetime.now()
+    rows = [
+        {**_video_row(item), "stats_synced_at": now}
+        for batch in batches
+        for item in batch
+    ]
+    catalog = await asyncio.to_thread(_store, db, channel_id, rows, statistics)
+    return {
+        "channel_id": channel_id,
+        "new_videos": len(rows),
+        "refreshed_videos": len(statistics),
+        "video_count": catalog.video_count,
+        "synced_at": catalog.synced_at,
+    }
+
+
+def schedule_catalog_refresh(credentials, channel_id: str):
+    """Refresh a catalog in the background, at most once at a time per channel."""
+    if channel_id in _refreshing:
+        return
+    _refreshing.add(channel_id)
+
+    async def refresh():
+        db = SessionLocal()
+        try:
+            await sync_channel_catalog(credentials, db, channel_id)
+        except Exception as e:
+            logger.warning(f"Background catalog refresh of {channel_id} failed: {e}")
+        finally:
+            db.close()
+            _refreshing.discard(channel_id)
+
+    asyncio.create_task(refresh())
+
+
+def _search_result(video: ChannelVideo) -> Dict:
+    # Shaped like a search.list result, with the catalogued details attached
+    return {
+        "kind": "youtube#searchResult",
+        "id": {"kind": "youtube#video", "videoId": video.video_id},
+        "snippet": {
+            "publishedAt": video.published_at.isoformat() + "Z",
+            "channelId": video.channel_id,
+            "title": video.title,
+            "description": video.description,
+            "thumbnails": json.loads(video.thumbnails or "{}"),
+            "channelTitle": video.channel_title,
+        },
+        "contentDetails": {
+            "durationSeconds": video.duration_seconds,
+            "definition": video.definition,
+        },
+        "statistics": {
+            "viewCount": video.view_count,
+            "likeCount": video.like_count,
+            "commentCount": video.comment_count,
+        },
+    }
+
+
+def is_local_page_token(page_token: str | None) -> bool:
+    return page_token is None or page_token.startswith(LOCAL_PAGE_PREFIX)
+
+
+def query_channel_videos(db: Session, params: ChannelSearchParams) -> Dict:
+    """Filter, sort and paginate a catalogued channel without calling the API."""
+    query = db.query(ChannelVideo).filter(ChannelVideo.channel_id == params.channel_id)
+
+    if params.videoDefinition != "any":
+        query = query.filter(
+            ChannelVideo.definition == DEFINITIONS[params.videoDefinition]
+        )
+    if params.videoDuration != "any":
+        lower, upper = DURATION_BOUNDS[params.videoDuration]
+        query = query.filter(ChannelVideo.duration_seconds >= lower)
+        if upper is not None:
+            query = query.filter(ChannelVideo.duration_seconds < upper)
+    if params.publishedAfter:
+        query = query.filter(
+            ChannelVideo.published_at >= naive_utc(params.publishedAfter)
+        )
+    if params.publishedBefore:
+        query = query.filter(
+            ChannelVideo.published_at < naive_utc(params.publishedBefore)
+        )
+
+    offset = local_page_offset(params.page_token)
+    total = query.count()
+    videos = (
+        query.order_by(SORT_COLUMNS[params.order], ChannelVideo.video_id)
+        .offset(offset)
+        .limit(params.max_results)
+        .all()
+    )
+    next_offset = offset + len(videos)
+    return {
+        "kind": "youtube#searchListResponse",
+        "items": [_search_result(video) for video in videos],
+        "nextPageToken": next_local_page_token(next_offset, total),
+        "pageInfo": {"totalResults": total, "resultsPerPage": params.max_results},
+    }
@@ -0,0 +1,175 @@
+import asyncio
+
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from core.comments import complete_replies, threads_request
+from core.youtube import execute_with_retry, naive_utc, parse_timestamp
+from schemas.schemas import CommentRecord, CommentSyncState
+
+SYNC_CONCURRENCY = 4
+SEARCH_ORDERS = {
+    "relevance": "bm25(comments_fts)",
+    "likes": "c.like_count DESC",
+    "newest": "c.published_at DESC",
+    "oldest": "c.published_at ASC",
+}
+
+
+def _comment_row(comment: Dict, video_id: str, parent_id: str | None = None) -> Dict:
+    snippet = comment["snippet"]
+    return {
+        "id": comment["id"],
+        "video_id": video_id,
+        "parent_id": parent_id,
+        "author": snippet.get("authorDisplayName"),
+        "text": snippet.get("textOriginal") or snippet.get("textDisplay"),
+        "like_count": snippet.get("likeCount", 0),
+        "published_at": parse_timestamp(snippet.get("publishedAt")),
+        "updated_at": parse_timestamp(snippet.get("updatedAt")),
+    }
+
+
+def comment_rows(threads: Iterable[Dict]) -> List[Dict]:
+    """Flatten comment threads into rows for the top-level comments and their replies."""
+    rows = []
+    for thread in threads:
+        video_id = thread["snippet"]["videoId"]
+        top_level = thread["snippet"]["topLevelComment"]
+        rows.append(_comment_row(top_level, video_id))
+        for reply in thread.get("replies", {}).get("comments", []):
+            rows.append(_comment_row(reply, video_id, parent_id=top_level["id"]))
+    return rows
+
+
+def store_comment_threads(db: Session, threads: Iterable[Dict]) -> int:
+    """Upsert comment threads into the local store, returns the number of rows written."""
+    rows = comment_rows(threads)
+    if not rows:
+        return 0
+    statement = insert(CommentRecord).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[CommentRecord.id],
+        set_={
+            column: statement.excluded[column]
+            for column in ("author", "text", "like_count", "updated_at")
+        },
+    )
+    db.execute(statement)
+    db.commit()
+    return len(rows)
+
+
+async def sync_video_comments(credentials, db: Session, video_id: str) -> Dict:
+    """
+    Store the threads of a video that are newer than the last sync.
+
+    Threads are listed newest first, so paging stops at the first thread
+    already covered by a previous sync. New replies to old threads are only
+    picked up by a full export.
+    """
+    state = await asyncio.to_thread(db.get, CommentSyncState, video_id)
+    since = state.last_published_at if state else None
+    newest = since
+    semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+    stored = 0
+    page_token = None
+
+    while True:
+        response = await execute_with_retry(
+            credentials,
+            lambda youtube: threads_request(youtube, video_id, page_token),
+        )
+        threads = []
+        reached_synced = False
+        for thread in response.get("items", []):
+            published_at = parse_timestamp(
+                thread["snippet"]["topLevelComment"]["snippet"]["publishedAt"]
+            )
+            if since and published_at <= since:
+                reached_synced = True
+                break
+            threads.append(thread)
+            newest = max(newest, published_at) if newest else published_at
+
+        threads = await asyncio.gather(
+            *(complete_replies(credentials, thread, semaphore) for thread in threads)
+        )
+        stored += await asyncio.to_thread(store_comment_threads, db, threads)
+
+        page_token = response.get("nextPageToken")
+        if reached_synced or not page_token:
+            break
+
+    def save_state():
+        record = db.get(CommentSyncState, video_id) or CommentSyncState(
+            video_id=video_id
+        )
+        record.last_published_at = newest
+        record.synced_at = datetime.now()
+        db.add(record)
+        db.commit()
+
+    await asyncio.to_thread(save_state)
+    return {"video_id": video_id, "stored": stored, "last_published_at": newest}
+
+
+def search_comments(
+    db: Session,
+    q: str | None = None,
+    video_id: str | None = None,
+    author: str | None = None,
+    min_likes: int | None = None,
+    published_after: datetime | None = None,
+    published_before: datetime | None = None,
+    order: str = "relevance",
+    limit: int = 50,
+    offset: int = 0,
+) -> List[Dict]:
+    """Query stored comments, using the FTS5 index for keywords."""
+    conditions = []
+    params = {"limit": limit, "offset": offset}
+    datetime_params = []
+    source = "comments AS c"
+
+    if q:
+        source = "comments_fts JOIN comments AS c ON c.rowid = comments_fts.rowid"
+        conditions.append("comments_fts MATCH :q")
+        params["q"] = q
+    elif order == "relevance":
+        order = "newest"
+    if video_id:
+        conditions.append("c.video_id = :video_id")
+        params["video_id"] = video_id
+    if author:
+        conditions.append("c.author = :author")
+        params["author"] = author
+    if min_likes is not None:
+        conditions.append("c.like_count >= :min_likes")
+        params["min_likes"] = min_likes
+    if published_after:
+        conditions.append("c.published_at >= :published_after")
+        params["published_after"] = naive_utc(published_after)
+        datetime_params.append(bindparam("published_after", type_=DateTime()))
+    if published_before:
+        conditions.append("c.published_at < :published_before")
+        params["published_before"] = naive_utc(published_before)
+        datetime_params.append(bindparam("published_before", type_=DateTime()))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = text(f"""
+        SELECT c.id, c.video_id, c.parent_id, c.author, c.text, c.like_count,
+               c.published_at, c.updated_at
+        FROM {source}
+        {where}
+        ORDER BY {SEARCH_ORDERS[order]}
+        LIMIT :limit OFFSET :offset
+        """)
+    query = query.bindparams(*datetime_params).columns(
+        published_at=DateTime(), updated_at=DateTime()
+    )
+    return [dict(row._mapping) for row in db.execute(query, params)]
@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+from typing import Awaitable, Callable, Dict, List
+
+from googleapiclient.errors import HttpError
+
+from core.youtube import execute_with_retry
+
+EXPORT_PAGE_SIZE = 100  # YouTube API limit for commentThreads and comments
+
+
+def threads_request(youtube, video_id, page_token=None, order="time"):
+    """A commentThreads.list request for one full page of a video's threads."""
+    return youtube.commentThreads().list(
+        part="snippet,replies",
+        videoId=video_id,
+        maxResults=EXPORT_PAGE_SIZE,
+        order=order,  # "time" lists the newest threads first
+        pageToken=page_token,
+        textFormat="plainText",
+    )
+
+
+async def fetch_all_replies(credentials, parent_id: str) -> List[Dict]:
+    """Fetch every reply of a top-level comment."""
+    replies = []
+    page_token = None
+    while True:
+        response = await execute_with_retry(
+            credentials,
+            lambda youtube: youtube.comments().list(
+                part="snippet",
+                parentId=parent_id,
+                maxResults=EXPORT_PAGE_SIZE,
+                pageToken=page_token,
+                textFormat="plainText",
+            ),
+        )
+        replies.extend(response.get("items", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return replies
+
+
+async def complete_replies(credentials, thread: Dict, semaphore) -> Dict:
+    """Fill in every reply of a thread, commentThreads only inlines a few."""
+    inline = thread.get("replies", {}).get("comments", [])
+    if thread["snippet"].get("totalReplyCount", 0) > len(inline):
+        async with semaphore:
+            replies = await fetch_all_replies(credentials, thread["id"])
+        thread["replies"] = {"comments": replies}
+    return thread
+
+
+async def export_comment_threads(
+    credentials,
+    video_id: str,
+    page_token: str | None = None,
+    concurrency: int = 4,
+    on_page: Callable[[List[Dict]], Awaitable[None]] | None = None,
+):
+    """
+    Yield every comment thread of a video with all of its replies as NDJSON.
+
+    Threads are emitted as soon as their replies are complete. A checkpoint
+    line follows each page; its token resumes the export after that page.
+    `on_page` receives the completed threads of each page before its checkpoint.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    checkpoint = page_token
+
+    def fetch_page(token):
+        return asyncio.create_task(
+            execute_with_retry(
+                credentials, lambda youtube: threads_request(youtube, video_id, token)
+            )
+        )
+
+    page = fetch_page(page_token)
+    threads = []
+    try:
+        while page is not None:
+            response = await page
+            next_page_token = response.get("nextPageToken")
+            # Fetch the next page while the replies of this one are collected
+            page = fetch_page(next_page_token) if next_page_token else None
+
+            threads = [
+                asyncio.create_task(complete_replies(credentials, thread, semaphore))
+                for thread in response.get("items", [])
+            ]
+            completed = []
+            for thread in asyncio.as_completed(threads):
+                completed.append(await thread)
+                yield json.dumps({"type": "thread", "thread": completed[-1]}) + "\n"
+            if on_page:
+                await on_page(completed)
+
+            checkpoint = next_page_token
+            yield json.dumps({"type": "checkpoint", "nextPageToken": checkpoint}) + "\n"
+    except HttpError as e:
+        # Headers are already sent, report the failure and where to resume from
+        yield json.dumps(
+            {"type": "error", "error": str(e), "resumePageToken": checkpoint}
+        ) + "\n"
+    finally:
+        for task in [page, *threads]:
+            if task is not None:
+                task.cancel()
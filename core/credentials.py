@@ -0,0 +1,119 @@
+import logging
+import os
+import tempfile
+import threading
+
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+logger = logging.getLogger(__name__)
+
+REFRESH_MARGIN = timedelta(minutes=5)  # Refresh this long before the token expires
+
+
+def _utcnow() -> datetime:
+    # Credentials keep their expiry as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def write_atomic(path: str, data: str):
+    """Write a file via a temporary sibling and rename, so readers never see partial data."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class CredentialCache:
+    """
+    Keeps credentials in memory and refreshes them ahead of expiry.
+
+    Storage is only touched on the first lookup of a key and after a refresh.
+    At most one refresh per key runs at a time; near expiry it happens in a
+    background thread while callers keep using the still valid token.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[str], Optional[Credentials]],
+        persist: Callable[[str, Credentials], None],
+    ):
+        self._load = load
+        self._persist = persist
+        self._credentials: Dict[str, Credentials] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            with self._guard:
+                lock = self._locks.setdefault(key, threading.Lock())
+        return lock
+
+    def get(self, key: str) -> Optional[Credentials]:
+        credentials = self._credentials.get(key)
+        if credentials is None:
+            with self._lock_for(key):
+                credentials = self._credentials.get(key)
+                if credentials is None:
+                    credentials = self._load(key)
+                    if credentials is None:
+                        return None
+                    self._credentials[key] = credentials
+
+        if not credentials.refresh_token:
+            return credentials
+        if not credentials.valid:
+            # No usable token left, callers have to wait for the refresh
+            self._refresh(key, wait=True)
+        elif credentials.expiry and credentials.expiry - _utcnow() < REFRESH_MARGIN:
+            self._refresh(key, wait=False)
+        return credentials
+
+    def put(self, key: str, credentials: Credentials):
+        with self._lock_for(key):
+            self._persist(key, credentials)
+            self._credentials[key] = credentials
+
+    def evict(self, key: str):
+        self._credentials.pop(key, None)
+
+    def _refresh(self, key: str, wait: bool):
+        lock = self._lock_for(key)
+        if wait:
+            with lock:
+                # Another caller may have refreshed while we were waiting
+                credentials = self._credentials.get(key)
+                if credentials is not None and not credentials.valid:
+                    self._do_refresh(key)
+        elif lock.acquire(blocking=False):
+            threading.Thread(
+                target=self._background_refresh, args=(key, lock), daemon=True
+            ).start()
+
+    def _background_refresh(self, key: str, lock: threading.Lock):
+        try:
+            self._do_refresh(key)
+        except Exception as e:
+            # The token is still valid, the next lookup retries
+            logger.warning(f"Background credential refresh failed: {e}")
+        finally:
+            lock.release()
+
+    def _do_refresh(self, key: str):
+        credentials = self._credentials.get(key)
+        if credentials is None:
+            return  # Evicted, e.g. the account was deleted
+        credentials.refresh(Request())
+        self._persist(key, credentials)
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import shutil
+import threading
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Free space kept untouched on every filesystem, on top of the reservations
+DISK_HEADROOM_BYTES = int(os.getenv("DISK_HEADROOM_BYTES", str(512 * 1024 * 1024)))
+# Format sizes are estimates, some videos come out larger
+DISK_ESTIMATE_MARGIN = float(os.getenv("DISK_ESTIMATE_MARGIN", "1.1"))
+# Claim the space on disk with a reservation file that shrinks as data arrives
+DISK_PREALLOCATE = os.getenv("DISK_PREALLOCATE", "").lower() in ("1", "true", "yes")
+DISK_RECHECK_INTERVAL = 5  # Seconds between checks of deferred reservations
+PREALLOCATE_STEP = 64 * 1024 * 1024  # Shrink the file in steps, not every chunk
+
+
+class InsufficientSpace(Exception):
+    def __init__(self, path: str, required: int, available: int):
+        self.path = path
+        self.required = required
+        self.available = available
+        super().__init__(
+            f"{path} needs {required} bytes but only {available} are available"
+        )
+
+
+def estimate_download_size(formats: Iterable[Dict], format_ids: Iterable[str]) -> int:
+    """Sum of the known sizes of the selected formats, 0 when none is known."""
+    by_id = {f["format_id"]: f for f in formats}
+    return sum(
+        by_id[format_id].get("filesize") or by_id[format_id].get("filesize_approx") or 0
+        for format_id in format_ids
+        if format_id in by_id
+    )
+
+
+def required_space(download_size: int, postprocessing: bool = False) -> int:
+    required = int(download_size * DISK_ESTIMATE_MARGIN)
+    if postprocessing:
+        # Post-processing writes a full copy before replacing the original
+        required *= 2
+    return required
+
+
+def _existing_dir(path: str) -> str:
+    """Nearest existing directory, the output directory is created later."""
+    path = os.path.abspath(path)
+    while not os.path.isdir(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+@dataclass
+class Reservation:
+    device: int
+    path: str
+    size: int
+    consumed: int = 0  # Bytes already written, they show up in the free space
+    preallocated: Optional[str] = None
+    _allocated: int = field(default=0, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def outstanding(self) -> int:
+        if self.preallocated:
+            return 0  # Held by the reservation file, already out of the free space
+        return max(0, self.size - self.consumed)
+
+    def preallocate(self, directory: str):
+        if not hasattr(os, "posix_fallocate") or not self.size:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f".reserve-{id(self)}")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.posix_fallocate(fd, 0, self.size)
+        except OSError as e:
+            os.close(fd)
+            os.remove(path)
+            logger.info(f"Preallocation in {directory} is not available: {e}")
+            return
+        os.close(fd)
+        self.preallocated = path
+        self._allocated = self.size
+
+    def update(self, consumed: int):
+        """Record progress, called from the download thread."""
+        self.consumed = consumed
+        if not self.preallocated:
+            return
+        remaining = max(0, self.size - consumed)
+        with self._lock:
+            if self.preallocated and self._allocated - remaining >= PREALLOCATE_STEP:
+                os.truncate(self.preallocated, remaining)
+                self._allocated = remaining
+
+    def close(self):
+        with self._lock:
+            if self.preallocated:
+                try:
+                    os.remove(self.preallocated)
+                except FileNotFoundError:
+                    pass
+                self.preallocated = None
+
+
+class DiskSpace:
+    """
+    Reserves space for downloads per filesystem.
+
+    A download is admitted when its estimated size fits into the free space
+    minus the headroom and the part of other reservations not written yet.
+    Downloads that could never fit are rejected up front, the rest wait
+    until earlier reservations are released.
+    """
+
+    def __init__(self, headroom: int = DISK_HEADROOM_BYTES):
+        self.headroom = headroom
+        self._reservations: List[Reservation] = []
+        self._released: Optional[asyncio.Condition] = None
+
+    def _device(self, path: str):
+        directory = _existing_dir(path)
+        return directory, os.stat(directory).st_dev
+
+    def _available(self, device: int, directory: str) -> int:
+        reserved = sum(
+            reservation.outstanding
+            for reservation in self._reservations
+            if reservation.device == device
+        )
+        return shutil.disk_usage(directory).free - self.headroom - reserved
+
+    def check(self, path: str, size: int):
+        """Raise InsufficientSpace when the disk cannot hold size even once idle."""
+        directory, _ = self._device(path)
+        available = shutil.disk_usage(directory).free - self.headroom
+        if size > available:
+            raise InsufficientSpace(path, size, max(0, available))
+
+    async def reserve(self, path: str, size: int, preallocate: bool = DISK_PREALLOCATE):
+        """Wait until size fits next to the other reservations and take it."""
+        if self._released is None:
+            self._released = asyncio.Condition()
+        directory, device = self._device(path)
+        async with self._released:
+            while self._available(device, directory) < size:
+                self.check(path, size)  # Others' writes may have taken the space
+                try:
+                    await asyncio.wait_for(
+                        self._released.wait(), timeout=DISK_RECHECK_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass  # Space may have been freed outside the application
+            reservation = Reservation(device=device, path=path, size=size)
+            self._reservations.append(reservation)
+        if preallocate:
+            await asyncio.to_thread(reservation.preallocate, path)
+        return reservation
+
+    async def release(self, reservation: Reservation):
+        await asyncio.to_thread(reservation.close)
+        if reservation in self._reservations:
+            self._reservations.remove(reservation)
+        if self._released is not None:
+            async with self._released:
+                self._released.notify_all()
+
+    def stats(self) -> List[Dict]:
+        devices: Dict[int, Dict] = {}
+        for reservation in self._reservations:
+            entry = devices.setdefault(
+                reservation.device,
+                {
+                    "path": _existing_dir(reservation.path),
+                    "free": shutil.disk_usage(_existing_dir(reservation.path)).free,
+                    "headroom": self.headroom,
+                    "reservations": 0,
+                    "reserved": 0,
+                    "outstanding": 0,
+                    "preallocated": 0,
+                },
+            )
+            entry["reservations"] += 1
+            entry["reserved"] += reservation.size
+            entry["outstanding"] += reservation.outstanding
+            entry["preallocated"] += bool(reservation.preallocated)
+        return list(devices.values())
+
+
+disk_space = DiskSpace()
@@ -1,18 +1,73 @@
 import asyncio
+import contextlib
+import glob
 import logging
+import os
+import re
 
-from typing import Optional, Callable
+from typing import Dict, Optional, Callable, Set
+from fastapi import BackgroundTasks
 from yt_dlp import YoutubeDL
 
 from sqlalchemy.orm import Session
 
+from core.diskspace import Reservation, disk_space
+from core.postprocess import FFMPEG_PATH, PostJob, build_job, postprocess_pool
+from core.throughput import TaskThroughput, fleet_throughput
 from schemas.schemas import Download
-from models.downloads import DownloadStatus
-
+from models.downloads import DownloadStatus, PostProcessOperation, PostProcessOptions
 
 logging.basicConfig()
 logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
 
+# Only the network part of a download holds a slot, post-processing runs outside it
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "3"))
+download_slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+# Written next to downloads by writethumbnail, never the download itself
+THUMBNAIL_EXTENSIONS = {"webp", "jpg", "jpeg", "png"}
+# Finished outputs, "... - {video_id}.{ext}" with no second suffix
+DOWNLOAD_FILENAME = re.compile(r" - ([A-Za-z0-9_-]{11})\.([^.]+)$")
+# Every task ends in one of these, the fleet's per-status counts rely on it
+FINISHED_STATUSES = {
+    DownloadStatus.COMPLETE,
+    DownloadStatus.CANCELED,
+    DownloadStatus.ERROR,
+}
+
+
+def find_download_file(
+    output_dir: str, video_id: str, ext: Optional[str] = None
+) -> Optional[str]:
+    """
+    Finished file of a download in output_dir, the newest when several match.
+
+    Outputs are named "... - {video_id}.{ext}". Partial and intermediate
+    files carry a second suffix (.part, .f137.mp4, .pp-tmp.mp4) and are skipped.
+    """
+    marker = f" - {video_id}."
+    candidates = []
+    for path in glob.glob(os.path.join(glob.escape(output_dir), f"*{marker}*")):
+        suffix = os.path.basename(path).rpartition(marker)[2]
+        if "." in suffix or suffix.lower() in THUMBNAIL_EXTENSIONS:
+            continue
+        if ext is None or suffix.lower() == ext.lower():
+            candidates.append(path)
+    return max(candidates, key=os.path.getmtime, default=None)
+
+
+def downloaded_video_ids(output_dir: str) -> Set[str]:
+    """Videos with a finished file in output_dir, from one directory listing."""
+    try:
+        names = os.listdir(output_dir)
+    except FileNotFoundError:
+        return set()
+    video_ids = set()
+    for name in names:
+        match = DOWNLOAD_FILENAME.search(name)
+        if match and match.group(2).lower() not in THUMBNAIL_EXTENSIONS:
+            video_ids.add(match.group(1))
+    return video_ids
+
 
 class DownloadTask:
     def __init__(
@@ -39,6 +94,22 @@ class DownloadTask:
         self.on_complete = on_complete
         self.db = db
         self.download_record = None
+        self.output_path: Optional[str] = None
+        self._post_job: Optional[PostJob] = None
+        self._reservation: Optional[Reservation] = None
+        self._finished_bytes = 0  # Bytes of the formats already downloaded
+        self.throughput = TaskThroughput(fleet_throughput)
+
+    @property
+    def status(self) -> DownloadStatus:
+        return self._status
+
+    @status.setter
+    def status(self, status: DownloadStatus):
+        # Keeps the fleet's per-status counts current without scanning tasks
+        old = getattr(self, "_status", None)
+        fleet_throughput.transition(old.value if old else None, status.value)
+        self._status = status
 
     def progress_hook(self, d):
         if self._cancel_event.is_set():
@@ -50,6 +121,10 @@ class DownloadTask:
             self.elapsed_time = d["elapsed"]
             self.eta = d["eta"]
             self.speed = d["speed"]
+            written = self._finished_bytes + self.downloaded_bytes
+            self.throughput.update(written)
+            if self._reservation:
+                self._reservation.update(written)
 
             # Update stage based on the fragment count or downloaded bytes
             if "fragments" in d:
@@ -68,6 +143,8 @@ class DownloadTask:
 
         elif d["status"] == "finished":
             self.stage = f"download complete for: {d['info_dict']['filename']}"
+            self._finished_bytes += d.get("total_bytes") or self.downloaded_bytes
+            self.throughput.update(self._finished_bytes, force=True)
             self.status = DownloadStatus.DOWNLOADING  # Still downloading if merging
 
         elif d["status"] == "error":
@@ -81,12 +158,29 @@ class DownloadTask:
         if self._cancel_event.is_set():
             raise asyncio.CancelledError("Download cancelled by user.")
 
+        # yt-dlp's own postprocessors merge, queued jobs run after the download
+        postprocessing = self.status == DownloadStatus.POSTPROCESSING
+        verb = "post-processing" if postprocessing else "merging"
+
         # Update stage based on postprocessing info
         if pp_info["status"] == "started":
-            self.stage = f"merging: {pp_info['postprocessor']}"
+            self.stage = f"{verb}: {pp_info['postprocessor']}"
+        elif pp_info["status"] == "processing":
+            progress = pp_info.get("progress") or 0
+            self.stage = f"{verb}: {pp_info['postprocessor']} ({progress:.0%})"
         elif pp_info["status"] == "finished":
-            self.stage = "merge complete"
-            self.status = DownloadStatus.MERGED
+            if postprocessing:
+                self.stage = f"{pp_info['postprocessor']} complete"
+            else:
+                self.stage = "merge complete"
+                self.status = DownloadStatus.MERGED
+
+    def _report_postprocessing(self, operation: str, status: str, progress=None):
+        if self._cancel_event.is_set():
+            return  # The job itself is being canceled
+        self.postprocessor_hook(
+            {"status": status, "postprocessor": operation, "progress": progress}
+        )
 
     def _create_db_record(self):
         """Actual database record creation logic (blocking)."""
@@ -124,9 +218,11 @@ class DownloadTask:
         output_filename: str = "output",
         output_format: str = "mp4",
         output_dir: str = "./tmp",
+        postprocess: Optional[PostProcessOptions] = None,
+        required_space: int = 0,
     ):
-        if self.status == DownloadStatus.CANCELED:
-            self.status = DownloadStatus.QUEUED
+        if self._cancel_event.is_set():
+            return  # Canceled while still queued
 
         self.output_dir = output_dir
 
@@ -138,45 +234,131 @@ class DownloadTask:
             format_str = quality
             self.quality = quality
         else:
+            self.status = DownloadStatus.ERROR
             raise ValueError("Either quality or explicit format IDs must be provided.")
 
         ydl_opts = {
             "quiet": True,
             "format": format_str,
-            "outtmpl": f"{output_dir}/{output_filename} - {channel_title} - {self.video_id}.mp4",
+            "outtmpl": f"{output_dir}/{output_filename} - {channel_title} - {self.video_id}.%(ext)s",
             "progress_hooks": [self.progress_hook],
             "postprocessor_hooks": [self.postprocessor_hook],
-            "merge_output_format": "mp4",
         }
+        if not (postprocess and PostProcessOperation.REMUX in postprocess.operations):
+            # With remux requested the pool changes the container instead
+            ydl_opts["merge_output_format"] = output_format
+        if FFMPEG_PATH != "ffmpeg":
+            ydl_opts["ffmpeg_location"] = FFMPEG_PATH
+        if (
+            postprocess
+            and PostProcessOperation.EMBED_THUMBNAIL in postprocess.operations
+        ):
+            ydl_opts["writethumbnail"] = True
 
         # Create the download record in the database
-        self.download_record = (
-            await self.create_db_record()
-        )  # Ensuxre record is created
+        try:
+            self.download_record = await self.create_db_record()
+        except Exception:
+            self.status = DownloadStatus.ERROR
+            raise
 
         asyncio.create_task(self.sync_to_db())
+        if self._cancel_event.is_set():
+            return  # Canceled while the record was written
 
         # Create a new task to run the download
-        self._task = asyncio.create_task(self._run_download(ydl_opts))
+        self._task = asyncio.create_task(
+            self._run_download(ydl_opts, output_dir, required_space)
+        )
 
         try:
-            await self._task
+            info = await self._task
+            if self._cancel_event.is_set():
+                raise asyncio.CancelledError()  # Canceled as the download finished
+            if postprocess and postprocess.operations:
+                await self._run_postprocessing(info, postprocess)
         except asyncio.CancelledError:
             self.status = DownloadStatus.CANCELED
             self._cancel_event.set()
+            return
+        except Exception as e:
+            logging.error(f"Download of {self.video_id} failed: {e}")
+            self.status = DownloadStatus.ERROR
+            self.stage = f"error: {e}"
+            return
+        finally:
+            if self._reservation:
+                await disk_space.release(self._reservation)
+                self._reservation = None
+
+        self.status = DownloadStatus.COMPLETE
+        self.stage = "complete"
+
+    async def _run_download(self, ydl_opts, output_dir: str, required_space: int):
+        self.stage = "waiting for disk space"
+        self._reservation = await disk_space.reserve(output_dir, required_space)
+        self.stage = "waiting for a download slot"
+        async with download_slots:
+            with YoutubeDL(ydl_opts) as ydl:
+                info = await asyncio.to_thread(
+                    ydl.extract_info, f"https://www.youtube.com/watch?v={self.video_id}"
+                )
+        downloads = info.get("requested_downloads") or [{}]
+        self.output_path = downloads[0].get("filepath")
+        return info
+
+    async def _run_postprocessing(self, info, options: PostProcessOptions):
+        """Run the requested operations one after another, each as a queued job."""
+        self.status = DownloadStatus.POSTPROCESSING
+        thumbnail_path = next(
+            (
+                thumbnail["filepath"]
+                for thumbnail in reversed(info.get("thumbnails") or [])
+                if thumbnail.get("filepath")
+            ),
+            None,
+        )
 
-    async def _run_download(self, ydl_opts):
-        with YoutubeDL(ydl_opts) as ydl:
-            await asyncio.to_thread(
-                ydl.download, [f"https://www.youtube.com/watch?v={self.video_id}"]
-            )
+        try:
+            for operation in options.operations:
+                job = build_job(
+                    self.video_id,
+                    operation,
+                    self.output_path,
+                    options,
+                    duration=info.get("duration"),
+                    thumbnail_path=thumbnail_path,
+                )
+                if job is None:
+                    continue
+                job.on_progress = lambda status, progress, name=operation.value: (
+                    self._report_postprocessing(name, status, progress)
+                )
+                self.stage = f"queued for post-processing: {operation.value}"
+                self._post_job = job
+                self.output_path = await postprocess_pool.submit(job)
+                self._post_job = None
+        finally:
+            # Written by writethumbnail only to be embedded
+            for thumbnail in info.get("thumbnails") or []:
+                if thumbnail.get("filepath"):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(thumbnail["filepath"])
 
     def cancel(self):
-        """Cancels the download by setting the event and cancelling the task."""
+        """
+        Cancels the download by setting the event and cancelling the task.
+
+        A task that has not started yet returns as soon as download() runs.
+        """
+        if self.status in FINISHED_STATUSES:
+            return
+        self._cancel_event.set()
         if self._task and not self._task.done():
             self._task.cancel()
-            self.status = DownloadStatus.CANCELED
-            self._cancel_event.set()
+        if self._post_job:
+            self._post_job.cancel()
+        self.status = DownloadStatus.CANCELED
 
     async def sync_to_db(self):
         try:
@@ -184,7 +366,7 @@ class DownloadTask:
                 if self.status in {
                     DownloadStatus.ERROR,
                     DownloadStatus.CANCELED,
-                    DownloadStatus.MERGED,
+                    DownloadStatus.COMPLETE,
                 }:
                     break
                 logging.debug(
@@ -211,3 +393,71 @@ class DownloadTask:
                 self.db.commit()
 
             await asyncio.to_thread(update_db)
+
+
+# In-memory tasks
+download_tasks: Dict[str, DownloadTask] = {}
+
+
+def start_download(
+    background_tasks: BackgroundTasks,
+    db: Session,
+    video_id: str,
+    video_format_id: Optional[str],
+    audio_format_id: Optional[str],
+    output_filename: str,
+    channel_title: Optional[str] = None,
+    quality: Optional[str] = None,
+    output_format: str = "mp4",
+    output_dir: str = "./tmp",
+    postprocess_options: Optional[PostProcessOptions] = None,
+    needed_space: int = 0,
+) -> DownloadTask:
+    """Register a download and schedule it, replacing an earlier record of the video."""
+
+    def cleanup_task(video_id: str):
+        # Remove the task from download_tasks once it's complete or canceled
+        download_tasks.pop(video_id, None)
+
+    # Check for existing downloads with the same video_id
+    existing_download = db.query(Download).filter_by(video_id=video_id).first()
+
+    # If an existing download is cancelled or errored, delete it
+    if existing_download:
+        try:
+            db.delete(existing_download)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise RuntimeError(f"Error removing existing download: {str(e)}") from e
+
+    # Create and store a DownloadTask for each video with the cleanup callback
+    task = DownloadTask(
+        video_id=video_id,
+        video_title=output_filename,
+        on_complete=cleanup_task,
+        db=db,
+    )
+
+    # Known before the download runs, so queued tasks can be matched by folder
+    task.output_dir = output_dir
+    # A replaced task would otherwise keep running unseen and stay counted
+    previous = download_tasks.get(video_id)
+    if previous is not None:
+        previous.cancel()
+    # task = DownloadTask(video_id, on_complete=cleanup_task, db=db)
+    download_tasks[video_id] = task
+    # Schedule the background download task
+    background_tasks.add_task(
+        task.download,
+        channel_title,
+        quality,
+        video_format_id,
+        audio_format_id,
+        output_filename,
+        output_format,
+        output_dir,
+        postprocess_options,
+        needed_space,
+    )
+    return task
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import random
+import time
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from googleapiclient.errors import HttpError
+
+from core.subscriptions import ensure_syncer, subscribed_channel_ids
+from core.youtube import account_key, execute_async, uploads_playlist_id
+
+logger = logging.getLogger(__name__)
+
+FEED_TTL = 60 * 10  # Serve a cached feed for up to 10 minutes before refreshing
+FEED_SUBSCRIPTIONS = 5  # Number of subscribed channels the feed is built from
+FEED_UPLOADS_PER_CHANNEL = 3  # Latest uploads kept per channel
+FEED_CONCURRENCY = 8  # Concurrent playlistItems.list calls per refresh
+FEED_SIZE = 10
+FEED_SYNC_TIMEOUT = 10  # Seconds a first build waits for the subscription mirror
+
+
+@dataclass
+class FeedEntry:
+    uploads: Dict[str, List[Dict]]
+    fetched_at: float = field(default_factory=time.time)
+    refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self.fetched_at > FEED_TTL
+
+
+# Per-user feed cache and in-flight initial builds
+_feeds: Dict[str, FeedEntry] = {}
+_pending: Dict[str, asyncio.Task] = {}
+
+
+def _to_feed_video(item: Dict) -> Optional[Dict]:
+    snippet = item.get("snippet", {})
+    thumbnail = snippet.get("thumbnails", {}).get("high")
+    # Private and deleted videos come back without thumbnails
+    if not thumbnail:
+        return None
+    return {
+        "title": snippet["title"],
+        "videoId": snippet["resourceId"]["videoId"],
+        "thumbnail": thumbnail["url"],
+        "channelTitle": snippet.get("videoOwnerChannelTitle")
+        or snippet.get("channelTitle"),
+    }
+
+
+async def fetch_channel_uploads(
+    credentials, channel_id: str, semaphore: asyncio.Semaphore
+) -> List[Dict]:
+    """Fetch the latest uploads of a channel (1 quota unit)."""
+    async with semaphore:
+        try:
+            response = await execute_async(
+                credentials,
+                lambda youtube: youtube.playlistItems().list(
+                    part="snippet",
+                    playlistId=uploads_playlist_id(channel_id),
+                    maxResults=FEED_UPLOADS_PER_CHANNEL,
+                ),
+            )
+        except HttpError as e:
+            # Channels without public uploads have no uploads playlist
+            if e.resp.status == 404:
+                return []
+            raise
+
+    videos = [_to_feed_video(item) for item in response.get("items", [])]
+    return [video for video in videos if video]
+
+
+async def _subscribed_channels(credentials) -> List[str]:
+    syncer = ensure_syncer(credentials)
+    try:
+        await asyncio.wait_for(syncer.ready.wait(), timeout=FEED_SYNC_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
+    channel_ids = await asyncio.to_thread(
+        subscribed_channel_ids, syncer.account, FEED_SUBSCRIPTIONS
+    )
+    if channel_ids:
+        return channel_ids
+
+    # Mirror not available yet, ask the API directly
+    subscriptions = await execute_async(
+        credentials,
+        lambda youtube: youtube.subscriptions().list(
+            part="snippet", mine=True, maxResults=FEED_SUBSCRIPTIONS
+        ),
+    )
+    return [
+        item["snippet"]["resourceId"]["channelId"]
+        for item in subscriptions.get("items", [])
+    ]
+
+
+async def build_feed(credentials) -> Dict[str, List[Dict]]:
+    channel_ids = await _subscribed_channels(credentials)
+
+    semaphore = asyncio.Semaphore(FEED_CONCURRENCY)
+    results = await asyncio.gather(
+        *(
+            fetch_channel_uploads(credentials, channel_id, semaphore)
+            for channel_id in channel_ids
+        )
+    )
+    return dict(zip(channel_ids, results))
+
+
+async def _refresh(key: str, credentials):
+    try:
+        uploads = await build_feed(credentials)
+    except Exception as e:
+        uploads = None
+        # Keep serving the previous feed, it is retried on the next stale read
+        logger.warning(f"Background feed refresh failed: {e}")
+    entry = _feeds.get(key)
+    if entry is None or entry.refresh_task is not asyncio.current_task():
+        return  # Replaced by a forced rebuild meanwhile, which is newer
+    if uploads is None:
+        entry.refresh_task = None
+    else:
+        _feeds[key] = FeedEntry(uploads=uploads)
+
+
+async def _initial_build(key: str, credentials) -> FeedEntry:
+    task = _pending.get(key)
+    if task is None:
+        task = asyncio.create_task(build_feed(credentials))
+        _pending[key] = task
+        task.add_done_callback(lambda _: _pending.pop(key, None))
+    # Shielded, so a client going away does not cancel it for the others
+    uploads = await asyncio.shield(task)
+    entry = _feeds.get(key)
+    if entry is None:
+        entry = _feeds[key] = FeedEntry(uploads=uploads)
+    return entry
+
+
+async def get_feed_uploads(credentials, refresh: bool = False) -> Dict[str, List[Dict]]:
+    """Return the cached uploads per channel, refreshing them in the background when stale."""
+    key = account_key(credentials)
+    entry = _feeds.get(key)
+
+    if entry is None or refresh:
+        if refresh:
+            _feeds.pop(key, None)
+        entry = await _initial_build(key, credentials)
+    elif entry.stale and entry.refresh_task is None:
+        entry.refresh_task = asyncio.create_task(_refresh(key, credentials))
+
+    return entry.uploads
+
+
+def sample_feed(uploads: Dict[str, List[Dict]], size: int = FEED_SIZE) -> List[Dict]:
+    # Pick 1-3 videos per channel and shuffle to keep the feed dynamic
+    videos = []
+    for channel_videos in uploads.values():
+        videos.extend(channel_videos[: random.randint(1, FEED_UPLOADS_PER_CHANNEL)])
+    random.shuffle(videos)
+    return videos[:size]
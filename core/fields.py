@@ -0,0 +1,134 @@
+import copy
+import re
+
+from typing import Any, Dict, Optional
+
+# Parsed selector: field name -> nested selector, or None for the whole value
+FieldTree = Dict[str, Optional["FieldTree"]]
+
+FIELDS_MAX_LENGTH = 1024
+FIELD_NAME_REGEX = re.compile(r"[A-Za-z0-9_]+|\*")
+
+# Paging fields that list endpoints always need from the API
+LIST_ENVELOPE = ("nextPageToken", "pageInfo")
+
+
+def _merge(target: FieldTree, name: str, subtree: Optional[FieldTree]):
+    if name in target and target[name] is None:
+        return  # Already selected as a whole
+    if subtree is None or name not in target:
+        target[name] = subtree
+        return
+    for child, child_subtree in subtree.items():
+        _merge(target[name], child, child_subtree)
+
+
+class _Parser:
+    def __init__(self, spec: str):
+        self.spec = spec
+        self.pos = 0
+
+    def error(self, message: str):
+        raise ValueError(f"Invalid fields selector at position {self.pos}: {message}")
+
+    def peek(self) -> str:
+        return self.spec[self.pos] if self.pos < len(self.spec) else ""
+
+    def name(self) -> str:
+        match = FIELD_NAME_REGEX.match(self.spec, self.pos)
+        if not match:
+            self.error("expected a field name")
+        self.pos = match.end()
+        return match.group()
+
+    def selection(self, closing: str = "") -> FieldTree:
+        tree: FieldTree = {}
+        while True:
+            path = [self.name()]
+            while self.peek() == "/":
+                self.pos += 1
+                path.append(self.name())
+
+            subtree = None
+            if self.peek() == "(":
+                self.pos += 1
+                subtree = self.selection(closing=")")
+                self.pos += 1
+
+            for name in reversed(path[1:]):
+                subtree = {name: subtree}
+            _merge(tree, path[0], subtree)
+
+            if self.peek() != ",":
+                break
+            self.pos += 1
+
+        if self.peek() != closing:
+            self.error(f"expected {closing!r}" if closing else "unexpected character")
+        return tree
+
+
+def parse_fields(spec: str) -> FieldTree:
+    """
+    Parse a selector in the syntax of the API's `fields` parameter.
+
+    Supports comma separated fields, `a/b` paths, `a(b,c)` sub-selections and
+    `*` wildcards, e.g. `id,snippet(title,thumbnails/default/url)`.
+    """
+    spec = spec.replace(" ", "")
+    if not spec:
+        raise ValueError("Invalid fields selector: empty")
+    if len(spec) > FIELDS_MAX_LENGTH:
+        raise ValueError("Invalid fields selector: too long")
+    return _Parser(spec).selection()
+
+
+def merge_fields(tree: FieldTree, *specs: str) -> FieldTree:
+    """Return a copy of `tree` extended with the fields of `specs`."""
+    merged = copy.deepcopy(tree)
+    for spec in specs:
+        for name, subtree in parse_fields(spec).items():
+            _merge(merged, name, subtree)
+    return merged
+
+
+def format_fields(tree: FieldTree) -> str:
+    """Render a selector back into the API syntax."""
+    parts = []
+    for name, subtree in tree.items():
+        if subtree is None:
+            parts.append(name)
+        elif len(subtree) == 1:
+            parts.append(f"{name}/{format_fields(subtree)}")
+        else:
+            parts.append(f"{name}({format_fields(subtree)})")
+    return ",".join(parts)
+
+
+def list_fields(items: FieldTree) -> FieldTree:
+    """Wrap an item selector for a whole list response, keeping the paging fields."""
+    tree: FieldTree = {name: None for name in LIST_ENVELOPE}
+    tree["items"] = items
+    return tree
+
+
+def project(data: Any, tree: Optional[FieldTree]) -> Any:
+    """Keep only the selected fields of a response, lists are projected per element."""
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [project(element, tree) for element in data]
+    if not isinstance(data, dict):
+        return data
+
+    if "*" in tree:
+        wildcard = tree["*"]
+        return {
+            name: project(value, tree.get(name, wildcard))
+            for name, value in data.items()
+        }
+    return {
+        name: project(data[name], subtree)
+        for name, subtree in tree.items()
+        if name in data
+    }
@@ -0,0 +1,228 @@
+import asyncio
+import time
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from yt_dlp import YoutubeDL
+
+from models.downloads import FormatConstraints
+
+# Codec names accepted in constraints, mapped to the prefixes yt-dlp reports
+CODEC_ALIASES = {
+    "h264": ("avc1", "h264"),
+    "h265": ("hvc1", "hev1", "h265"),
+    "vp9": ("vp09", "vp9"),
+    "av1": ("av01",),
+    "aac": ("mp4a", "aac"),
+    "opus": ("opus",),
+}
+AUDIO_CONTAINERS = {"mp4": "m4a", "webm": "webm"}
+
+# In-memory cache of extracted formats
+video_formats_cache: Dict[str, Dict[str, Any]] = {}
+cache_expiration_time = 60 * 30  # Cache expiration time in seconds
+semaphore = asyncio.Semaphore(5)  # Limit to 5 concurrent extractions
+# Extractions in flight, so concurrent requests for one video share them
+pending_formats: Dict[str, asyncio.Task] = {}
+
+
+class FormatsUnavailable(Exception):
+    pass
+
+
+def _codec_rank(codec: Optional[str], preferred: Sequence[str]) -> int:
+    """Position of codec in the preference list, unlisted codecs come last."""
+    codec = (codec or "").lower()
+    for rank, name in enumerate(preferred):
+        if codec.startswith(CODEC_ALIASES.get(name.lower(), (name.lower(),))):
+            return rank
+    return len(preferred)
+
+
+def estimated_size(fmt: Dict, duration: Optional[float]) -> Optional[int]:
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return size
+    if fmt.get("tbr") and duration:
+        return int(fmt["tbr"] * 1000 / 8 * duration)  # tbr is in kbit/s
+    return None
+
+
+def _fits(size: Optional[int], budget: Optional[int]) -> bool:
+    # Unknown sizes are allowed, the disk check at download time still applies
+    return budget is None or size is None or size <= budget
+
+
+def _audio_formats(formats: List[Dict], constraints: FormatConstraints) -> List[Dict]:
+    # Storyboards have neither codec and are typed audio-only too
+    candidates = [
+        f
+        for f in formats
+        if f.get("type") == "audio-only" and f.get("acodec") not in (None, "none")
+    ]
+    if constraints.container:
+        ext = AUDIO_CONTAINERS[constraints.container]
+        candidates = [f for f in candidates if f.get("ext") == ext]
+    return sorted(
+        candidates,
+        key=lambda f: (
+            _codec_rank(f.get("acodec"), constraints.audio_codecs),
+            -(f.get("abr") or f.get("tbr") or 0),
+        ),
+    )
+
+
+def _video_formats(
+    formats: List[Dict], constraints: FormatConstraints, kind: str
+) -> List[Dict]:
+    candidates = []
+    for f in formats:
+        if f.get("type") != kind:
+            continue
+        if constraints.max_height and (f.get("height") or 0) > constraints.max_height:
+            continue
+        if constraints.max_fps and (f.get("fps") or 0) > constraints.max_fps:
+            continue
+        if constraints.container and f.get("ext") != constraints.container:
+            continue
+        candidates.append(f)
+    return sorted(
+        candidates,
+        key=lambda f: (
+            -(f.get("height") or 0),
+            _codec_rank(f.get("vcodec"), constraints.video_codecs),
+            -(f.get("fps") or 0),
+            -(f.get("tbr") or 0),
+        ),
+    )
+
+
+def _selection(video: Optional[Dict], audio: Optional[Dict], duration) -> Dict:
+    sizes = [estimated_size(f, duration) for f in (video, audio) if f]
+    chosen = [f["format_id"] for f in (video, audio) if f]
+    return {
+        "format": "+".join(chosen),
+        "video_format_id": video["format_id"] if video else None,
+        "audio_format_id": audio["format_id"] if audio else None,
+        "height": video.get("height") if video else None,
+        "fps": video.get("fps") if video else None,
+        "vcodec": video.get("vcodec") if video else None,
+        "acodec": (audio or video).get("acodec"),
+        "ext": (video or audio).get("ext"),
+        "estimated_size": None if None in sizes else sum(sizes),
+    }
+
+
+def resolve_format(
+    formats: List[Dict], constraints: FormatConstraints, duration: Optional[float]
+) -> Optional[Dict]:
+    """
+    Best format pair for the constraints, None when nothing matches.
+
+    Video is ranked by height, then codec preference, fps and bitrate. Under
+    a size budget, lower audio bitrates are tried before lower resolutions,
+    since audio is the smaller part.
+    """
+    budget = constraints.max_filesize
+    audio_formats = _audio_formats(formats, constraints)
+
+    if constraints.audio_only:
+        for audio in audio_formats:
+            if _fits(estimated_size(audio, duration), budget):
+                return _selection(None, audio, duration)
+        return None
+
+    for video in _video_formats(formats, constraints, "video-only"):
+        video_size = estimated_size(video, duration)
+        for audio in audio_formats:
+            audio_size = estimated_size(audio, duration)
+            total = (
+                None if None in (video_size, audio_size) else video_size + audio_size
+            )
+            if _fits(total, budget):
+                return _selection(video, audio, duration)
+
+    # Older videos may only have formats with both streams
+    for video in _video_formats(formats, constraints, "video+audio"):
+        if _fits(estimated_size(video, duration), budget):
+            return _selection(video, None, duration)
+    return None
+
+
+async def fetch_video_formats(video_id: str):
+    """Fetch video formats with yt-dlp for a given video ID."""
+    ydl_opts = {
+        "skip_download": True,
+        "quiet": False,
+        "verbose": True,
+    }
+    async with semaphore:  # Limit concurrency
+        try:
+            with YoutubeDL(ydl_opts) as ydl:
+                info = await asyncio.to_thread(
+                    ydl.extract_info,
+                    f"https://www.youtube.com/watch?v={video_id}",
+                )
+                formats = [
+                    {
+                        "format_id": f["format_id"],
+                        "ext": f["ext"],
+                        "resolution": f.get("resolution"),
+                        "height": f.get("height"),
+                        "vcodec": f.get("vcodec"),
+                        "acodec": f.get("acodec"),
+                        "filesize": f.get("filesize"),
+                        "filesize_approx": f.get("filesize_approx"),
+                        "fps": f.get("fps"),
+                        "tbr": f.get("tbr"),
+                        "abr": f.get("abr"),
+                        "type": (
+                            "video+audio"
+                            if f.get("vcodec") != "none" and f.get("acodec") != "none"
+                            else (
+                                "video-only"
+                                if f.get("vcodec") != "none"
+                                else "audio-only"
+                            )
+                        ),
+                    }
+                    for f in info.get("formats", [])
+                ]
+
+                return {
+                    "video_id": video_id,
+                    "title": info.get("title"),
+                    "duration": info.get("duration"),
+                    "formats": formats,
+                }
+        except Exception as e:
+            print(f"Error fetching video formats for {video_id}: {e}")
+            raise FormatsUnavailable(
+                "An unexpected error occurred while fetching formats."
+            ) from e
+
+
+async def get_video_formats(video_id: str):
+    """Get video formats from cache or fetch them if not cached."""
+    current_time = time.time()
+
+    # Check cache first
+    if video_id in video_formats_cache:
+        cache_entry = video_formats_cache[video_id]
+        # if current_time - cache_entry["timestamp"] < cache_expiration_time:
+        return cache_entry["data"]
+
+    # Fetch data if not in cache or expired, joining a fetch already running
+    pending = pending_formats.get(video_id)
+    if pending is None:
+        pending = asyncio.create_task(_fetch_and_cache(video_id, current_time))
+        pending_formats[video_id] = pending
+        pending.add_done_callback(lambda _: pending_formats.pop(video_id, None))
+    # Shielded, so a client going away does not cancel it for the others
+    return await asyncio.shield(pending)
+
+
+async def _fetch_and_cache(video_id: str, current_time: float):
+    data = await fetch_video_formats(video_id)
+    video_formats_cache[video_id] = {"data": data, "timestamp": current_time}
+    return data
@@ -0,0 +1,21 @@
+from typing import Optional
+
+# Pages of locally mirrored listings are addressed by offset, e.g. "local:50"
+LOCAL_PAGE_PREFIX = "local:"
+UPSERT_CHUNK_SIZE = 500  # Rows per upsert, below SQLite's limit on bound variables
+
+
+def is_valid_local_page_token(page_token: str) -> bool:
+    return (
+        page_token.startswith(LOCAL_PAGE_PREFIX)
+        and page_token[len(LOCAL_PAGE_PREFIX) :].isdigit()
+    )
+
+
+def local_page_offset(page_token: Optional[str]) -> int:
+    """Offset of a validated local page token, 0 for the first page."""
+    return int(page_token[len(LOCAL_PAGE_PREFIX) :]) if page_token else 0
+
+
+def next_local_page_token(next_offset: int, total: int) -> Optional[str]:
+    return f"{LOCAL_PAGE_PREFIX}{next_offset}" if next_offset < total else None
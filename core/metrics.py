@@ -0,0 +1,191 @@
+import bisect
+import json
+import logging
+import os
+import random
+import time
+
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+access_logger = logging.getLogger("access")
+access_logger.setLevel(logging.INFO)
+
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.1"))
+ACCESS_LOG_SLOW_SECONDS = float(os.getenv("ACCESS_LOG_SLOW_SECONDS", "1.0"))
+ACCESS_LOG_MAX_FIELD = 256  # Longer paths and query strings are truncated
+REDACTED_PARAMS = {"code", "token", "key", "access_token", "refresh_token", "state"}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"  # Keeps label cardinality bounded for 404s
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Request metrics kept in plain dicts, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        self.in_flight: Dict[str, int] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        """Add a callable returning extra exposition lines, e.g. from caches."""
+        self._collectors.append(collector)
+
+    def observe(self, method: str, route: str, status: int, duration: float):
+        key = (method, route)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram()
+        histogram.observe(duration)
+        response_key = (method, route, status)
+        self.responses[response_key] = self.responses.get(response_key, 0) + 1
+        if status >= 500:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}'
+            )
+            lines.append(
+                f"http_request_duration_seconds_sum{{{labels}}} {histogram.sum}"
+            )
+            lines.append(
+                f"http_request_duration_seconds_count{{{labels}}} {histogram.count}"
+            )
+
+        lines += [
+            "# HELP http_responses_total Responses by route and status code.",
+            "# TYPE http_responses_total counter",
+        ]
+        for (method, route, status), count in sorted(self.responses.items()):
+            lines.append(
+                f'http_responses_total{{method="{method}",route="{route}",status="{status}"}} {count}'
+            )
+
+        lines += [
+            "# HELP http_request_errors_total Requests that failed with a 5xx or an exception.",
+            "# TYPE http_request_errors_total counter",
+        ]
+        for (method, route), count in sorted(self.errors.items()):
+            lines.append(
+                f'http_request_errors_total{{method="{method}",route="{route}"}} {count}'
+            )
+
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for method, count in sorted(self.in_flight.items()):
+            lines.append(f'http_requests_in_flight{{method="{method}"}} {count}')
+
+        for collector in self._collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _truncate(value: str) -> str:
+    if len(value) <= ACCESS_LOG_MAX_FIELD:
+        return value
+    return value[:ACCESS_LOG_MAX_FIELD] + "..."
+
+
+def _safe_query(query_string: bytes) -> str:
+    if not query_string:
+        return ""
+    params = [
+        (name, "REDACTED" if name in REDACTED_PARAMS else value)
+        for name, value in parse_qsl(query_string.decode("latin-1"))
+    ]
+    return _truncate(urlencode(params))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and in-flight requests per route.
+
+    Request bodies are never read. Access log lines are JSON, written for a
+    sampled fraction of requests plus every slow or failed one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        response_bytes = 0
+        start = time.perf_counter()
+        metrics.in_flight[method] = metrics.in_flight.get(method, 0) + 1
+
+        async def send_wrapper(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            metrics.in_flight[method] -= 1
+            route = scope.get("route")
+            route = route.path if route is not None else UNMATCHED_ROUTE
+            metrics.observe(method, route, status, duration)
+
+            if (
+                status >= 500
+                or duration >= ACCESS_LOG_SLOW_SECONDS
+                or random.random() < ACCESS_LOG_SAMPLE_RATE
+            ):
+                access_logger.info(
+                    json.dumps(
+                        {
+                            "method": method,
+                            "path": _truncate(scope["path"]),
+                            "query": _safe_query(scope.get("query_string", b"")),
+                            "route": route,
+                            "status": status,
+                            "duration_ms": round(duration * 1000, 2),
+                            "response_bytes": response_bytes,
+                            "client": (scope.get("client") or ("-",))[0],
+                        }
+                    )
+                )
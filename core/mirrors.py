@@ -0,0 +1,464 @@
+import asyncio
+import json
+import logging
+import os
+import re
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from fastapi import BackgroundTasks
+from sqlalchemy import exists
+from sqlalchemy.dialects.sqlite import insert
+
+from core.accounts import credential_cache
+from core.diskspace import InsufficientSpace, disk_space, required_space
+from core.downloads import (
+    download_tasks,
+    downloaded_video_ids,
+    find_download_file,
+    start_download,
+)
+from core.formats import get_video_formats, resolve_format
+from core.playlist_snapshots import ensure_snapshot
+from core.youtube import account_key
+from db.db import SessionLocal
+from models.downloads import DownloadStatus, FormatConstraints
+from models.playlists import PlaylistMirrorRequest
+from schemas.schemas import (
+    Download,
+    PlaylistMirror,
+    PlaylistMirrorItem,
+    PlaylistSnapshotItem,
+)
+
+logger = logging.getLogger(__name__)
+
+MIRROR_POLL_INTERVAL = 60  # Seconds between checks for due mirrors
+MIRROR_RETRY_INTERVAL = 5 * 60  # After a failed sync
+# Characters that break paths or yt-dlp's output template
+UNSAFE_FILENAME_CHARACTERS = re.compile(r'[\\/:*?"<>|%\x00-\x1f]')
+
+_resolving: Set[str] = set()  # Videos whose formats are being resolved
+_jobs: Set[asyncio.Task] = set()
+
+
+class MirrorError(Exception):
+    pass
+
+
+def _safe_filename(name: Optional[str]) -> str:
+    return UNSAFE_FILENAME_CHARACTERS.sub("_", name or "").strip() or "untitled"
+
+
+def mirror_dict(mirror: PlaylistMirror) -> Dict:
+    return {
+        "id": mirror.id,
+        "playlist_id": mirror.playlist_id,
+        "account_id": mirror.account_id,
+        "output_dir": mirror.output_dir,
+        "constraints": json.loads(mirror.constraints),
+        "output_format": mirror.output_format,
+        "prune": mirror.prune,
+        "interval_minutes": mirror.interval // 60,
+        "enabled": mirror.enabled,
+        "synced_at": mirror.synced_at,
+        "next_sync_at": mirror.next_sync_at,
+        "last_error": mirror.last_error,
+    }
+
+
+def save_mirror(
+    request: PlaylistMirrorRequest, account_id: str, account_ids: List[str]
+) -> Dict:
+    """
+    Create or update the mirror of a playlist into a folder, due for a sync
+    right away.
+
+    A playlist has one mirror per folder. A mirror set up by an account
+    outside account_ids is left alone.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        mirror = (
+            db.query(PlaylistMirror)
+            .filter(
+                PlaylistMirror.playlist_id == request.playlist_id,
+                PlaylistMirror.output_dir == request.output_dir,
+            )
+            .first()
+        )
+        if mirror is not None and mirror.account_id not in account_ids:
+            raise MirrorError(
+                f"Playlist {request.playlist_id} is already mirrored into "
+                f"{request.output_dir} by another account"
+            )
+        mirror = mirror or PlaylistMirror(
+            playlist_id=request.playlist_id,
+            output_dir=request.output_dir,
+            created_at=now,
+        )
+        mirror.account_id = account_id
+        mirror.constraints = request.constraints.model_dump_json()
+        mirror.output_format = request.output_format
+        mirror.prune = request.prune
+        mirror.interval = request.interval_minutes * 60
+        mirror.enabled = request.enabled
+        mirror.next_sync_at = now
+        db.add(mirror)
+        db.commit()
+        return mirror_dict(mirror)
+    finally:
+        db.close()
+
+
+def delete_mirror(mirror_id: int, account_ids: List[str]) -> bool:
+    """Forget a mirror, downloads it made are kept."""
+    db = SessionLocal()
+    try:
+        deleted = (
+            db.query(PlaylistMirror)
+            .filter(
+                PlaylistMirror.id == mirror_id,
+                PlaylistMirror.account_id.in_(account_ids),
+            )
+            .delete(synchronize_session=False)
+        )
+        if not deleted:
+            return False
+        db.query(PlaylistMirrorItem).filter(
+            PlaylistMirrorItem.mirror_id == mirror_id
+        ).delete(synchronize_session=False)
+        db.commit()
+        return bool(deleted)
+    finally:
+        db.close()
+
+
+def list_mirrors(account_ids: List[str]) -> List[Dict]:
+    db = SessionLocal()
+    try:
+        return [
+            mirror_dict(mirror)
+            for mirror in db.query(PlaylistMirror)
+            .filter(PlaylistMirror.account_id.in_(account_ids))
+            .order_by(PlaylistMirror.created_at)
+        ]
+    finally:
+        db.close()
+
+
+def mirror_owned(mirror_id: int, account_ids: List[str]) -> bool:
+    mirror = _get_mirror(mirror_id)
+    return mirror is not None and mirror.account_id in account_ids
+
+
+def _get_mirror(mirror_id: int) -> Optional[PlaylistMirror]:
+    db = SessionLocal()
+    try:
+        return db.get(PlaylistMirror, mirror_id)
+    finally:
+        db.close()
+
+
+def _due_mirrors() -> List[int]:
+    db = SessionLocal()
+    try:
+        return [
+            row.id
+            for row in db.query(PlaylistMirror.id).filter(
+                PlaylistMirror.enabled.is_(True),
+                PlaylistMirror.next_sync_at <= datetime.now(),
+            )
+        ]
+    finally:
+        db.close()
+
+
+def _finish_sync(mirror_id: int, error: Optional[str] = None):
+    db = SessionLocal()
+    try:
+        mirror = db.get(PlaylistMirror, mirror_id)
+        if mirror is None:
+            return  # Deleted while syncing
+        now = datetime.now()
+        if error is None:
+            mirror.synced_at = now
+        interval = MIRROR_RETRY_INTERVAL if error else mirror.interval
+        mirror.next_sync_at = now + timedelta(seconds=interval)
+        mirror.last_error = error
+        db.commit()
+    finally:
+        db.close()
+
+
+def _missing_videos(account: str, playlist_id: str, output_dir: str) -> List[Dict]:
+    """
+    Snapshot items not downloaded into output_dir yet.
+
+    A video counts as present with a completed download recorded for
+    output_dir, or a finished file there. Downloads keep one record per
+    video, so the file is what tells a video mirrored into several folders.
+    Running downloads are skipped by the caller.
+    """
+    present = downloaded_video_ids(output_dir)
+    db = SessionLocal()
+    try:
+        recorded = exists().where(
+            Download.video_id == PlaylistSnapshotItem.video_id,
+            Download.output_dir == output_dir,
+            Download.status == DownloadStatus.COMPLETE,
+        )
+        rows = (
+            db.query(
+                PlaylistSnapshotItem.video_id,
+                PlaylistSnapshotItem.title,
+                PlaylistSnapshotItem.video_owner_channel_title,
+            )
+            .filter(
+                PlaylistSnapshotItem.account == account,
+                PlaylistSnapshotItem.playlist_id == playlist_id,
+                ~recorded,
+            )
+            .order_by(PlaylistSnapshotItem.position)
+        )
+        videos = {}
+        for row in rows:
+            if row.video_id in present:
+                continue
+            videos.setdefault(
+                row.video_id,
+                {
+                    "video_id": row.video_id,
+                    "title": row.title,
+                    "channel_title": row.video_owner_channel_title,
+                },
+            )
+        return list(videos.values())
+    finally:
+        db.close()
+
+
+def _removed_videos(account: str, mirror_id: int, playlist_id: str) -> List[str]:
+    """Videos the mirror downloaded that are no longer in the playlist."""
+    db = SessionLocal()
+    try:
+        listed = exists().where(
+            PlaylistSnapshotItem.account == account,
+            PlaylistSnapshotItem.playlist_id == playlist_id,
+            PlaylistSnapshotItem.video_id == PlaylistMirrorItem.video_id,
+        )
+        return [
+            row.video_id
+            for row in db.query(PlaylistMirrorItem.video_id).filter(
+                PlaylistMirrorItem.mirror_id == mirror_id, ~listed
+            )
+        ]
+    finally:
+        db.close()
+
+
+def _record_item(mirror_id: int, video_id: str):
+    db = SessionLocal()
+    try:
+        db.execute(
+            insert(PlaylistMirrorItem)
+            .values(
+                mirror_id=mirror_id,
+                video_id=video_id,
+                enqueued_at=datetime.now(),
+            )
+            .on_conflict_do_nothing()
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _prune(mirror_id: int, output_dir: str, video_ids: List[str]):
+    """Delete the files and records of videos removed from the playlist."""
+    db = SessionLocal()
+    try:
+        for video_id in video_ids:
+            while path := find_download_file(output_dir, video_id):
+                os.remove(path)
+        db.query(Download).filter(
+            Download.video_id.in_(video_ids), Download.output_dir == output_dir
+        ).delete(synchronize_session=False)
+        db.query(PlaylistMirrorItem).filter(
+            PlaylistMirrorItem.mirror_id == mirror_id,
+            PlaylistMirrorItem.video_id.in_(video_ids),
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _mirror_video(mirror: PlaylistMirror, video: Dict):
+    """Pick a format under the mirror's constraints and start the download."""
+    video_id = video["video_id"]
+    try:
+        data = await get_video_formats(video_id)
+        constraints = FormatConstraints.model_validate_json(mirror.constraints)
+        selection = resolve_format(data["formats"], constraints, data.get("duration"))
+        if selection is None:
+            logger.warning(f"No format of {video_id} matches the mirror constraints")
+            return
+        needed_space = required_space(selection["estimated_size"] or 0)
+        disk_space.check(mirror.output_dir, needed_space)
+
+        # The download outlives this sync, so it gets a session of its own
+        db = SessionLocal()
+        background_tasks = BackgroundTasks()
+        try:
+            task = start_download(
+                background_tasks,
+                db,
+                video_id,
+                None,
+                None,
+                _safe_filename(data.get("title") or video["title"]),
+                channel_title=_safe_filename(video["channel_title"]),
+                quality=selection["format"],
+                output_format=mirror.output_format,
+                output_dir=mirror.output_dir,
+                needed_space=needed_space,
+            )
+        except Exception:
+            db.close()
+            raise
+        background_tasks.add_task(db.close)
+        try:
+            await asyncio.to_thread(_record_item, mirror.id, video_id)
+        except Exception:
+            # Never run, the task must not stay queued
+            task.cancel()
+            download_tasks.pop(video_id, None)
+            db.close()
+            raise
+    except InsufficientSpace as e:
+        logger.warning(f"Mirroring {video_id} skipped: {e}")
+        return
+    except Exception as e:
+        logger.warning(f"Mirroring {video_id} failed: {getattr(e, 'detail', e)}")
+        return
+    finally:
+        _resolving.discard(video_id)
+    await background_tasks()
+
+
+async def sync_mirror(mirror_id: int) -> Dict:
+    """
+    Enqueue the videos of a mirrored playlist that are not downloaded yet.
+
+    The playlist snapshot is brought up to date first, which costs one quota
+    unit while the playlist is unchanged. The snapshot is then compared with
+    the downloads table locally, so only new videos cost an extraction.
+    With prune set, videos removed from the playlist are deleted again.
+    """
+    mirror = await asyncio.to_thread(_get_mirror, mirror_id)
+    if mirror is None:
+        raise MirrorError(f"No mirror {mirror_id}")
+    playlist_id = mirror.playlist_id
+    credentials = (
+        await asyncio.to_thread(credential_cache.get, mirror.account_id)
+        if mirror.account_id
+        else None
+    )
+    if credentials is None:
+        raise MirrorError(f"Unknown account: {mirror.account_id}")
+
+    snapshot = await ensure_snapshot(credentials, playlist_id, refresh=True)
+    account = account_key(credentials)
+
+    missing = await asyncio.to_thread(
+        _missing_videos, account, playlist_id, mirror.output_dir
+    )
+    enqueued = []
+    for video in missing:
+        video_id = video["video_id"]
+        if video_id in download_tasks or video_id in _resolving:
+            continue
+        _resolving.add(video_id)
+        job = asyncio.create_task(_mirror_video(mirror, video))
+        _jobs.add(job)
+        job.add_done_callback(_jobs.discard)
+        enqueued.append(video_id)
+
+    pruned = []
+    if mirror.prune:
+        pruned = await asyncio.to_thread(
+            _removed_videos, account, mirror.id, playlist_id
+        )
+        for video_id in pruned:
+            # Downloads of the video into other folders are not the mirror's
+            task = download_tasks.get(video_id)
+            if task and task.output_dir == mirror.output_dir:
+                task.cancel()
+                download_tasks.pop(video_id, None)
+        if pruned:
+            await asyncio.to_thread(_prune, mirror.id, mirror.output_dir, pruned)
+
+    return {
+        "mirror_id": mirror.id,
+        "playlist_id": playlist_id,
+        "changed": snapshot["changed"],
+        "enqueued": enqueued,
+        "pruned": pruned,
+        "total": snapshot["total"],
+    }
+
+
+class MirrorScheduler:
+    """Syncs mirrors when they are due, one at a time."""
+
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def wake(self):
+        """Look for due mirrors now instead of at the next poll."""
+        self.start()
+        self._wake.set()
+
+    async def sync_now(self, mirror_id: int) -> Dict:
+        """Sync a mirror immediately, waiting for a sync that is already running."""
+        async with self._locks.setdefault(mirror_id, asyncio.Lock()):
+            try:
+                result = await sync_mirror(mirror_id)
+            except Exception as e:
+                await asyncio.to_thread(_finish_sync, mirror_id, str(e))
+                raise
+            await asyncio.to_thread(_finish_sync, mirror_id)
+            return result
+
+    async def _run(self):
+        while True:
+            try:
+                due = await asyncio.to_thread(_due_mirrors)
+            except Exception as e:
+                logger.warning(f"Listing due mirrors failed: {e}")
+                due = []
+            for mirror_id in due:
+                try:
+                    await self.sync_now(mirror_id)
+                except Exception as e:
+                    logger.warning(f"Sync of mirror {mirror_id} failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=MIRROR_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+
+mirror_scheduler = MirrorScheduler()
@@ -0,0 +1,309 @@
+import asyncio
+import json
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from core.local_store import (
+    UPSERT_CHUNK_SIZE,
+    local_page_offset,
+    next_local_page_token,
+)
+from core.youtube import account_key, execute_with_retry, parse_timestamp
+from db.db import SessionLocal
+from models.playlists import SortOrder
+from schemas.schemas import PlaylistSnapshot, PlaylistSnapshotItem
+
+PLAYLIST_PAGE_SIZE = 50  # playlistItems.list returns at most 50 per page
+# Snapshots younger than this are served without asking YouTube
+PLAYLIST_CHECK_INTERVAL = 5 * 60
+SORT_COLUMNS = {
+    SortOrder.NEWEST: (
+        PlaylistSnapshotItem.published_at.desc(),
+        PlaylistSnapshotItem.position.desc(),
+    ),
+    SortOrder.OLDEST: (
+        PlaylistSnapshotItem.published_at,
+        PlaylistSnapshotItem.position,
+    ),
+    SortOrder.TITLE: (PlaylistSnapshotItem.title, PlaylistSnapshotItem.position),
+    SortOrder.POSITION: (PlaylistSnapshotItem.position,),
+}
+
+_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+
+class PlaylistNotFound(Exception):
+    pass
+
+
+def snapshot_item_row(item: Dict, account: str, position: int) -> Dict:
+    snippet = item["snippet"]
+    return {
+        "account": account,
+        "playlist_id": snippet["playlistId"],
+        "item_id": item["id"],
+        "video_id": snippet["resourceId"]["videoId"],
+        "title": snippet.get("title"),
+        "description": snippet.get("description"),
+        "channel_id": snippet.get("channelId"),
+        "channel_title": snippet.get("channelTitle"),
+        "video_owner_channel_id": snippet.get("videoOwnerChannelId"),
+        "video_owner_channel_title": snippet.get("videoOwnerChannelTitle"),
+        "thumbnails": json.dumps(snippet.get("thumbnails", {})),
+        "published_at": parse_timestamp(snippet.get("publishedAt")),
+        "position": position,
+    }
+
+
+def _diff_entry(row) -> Dict:
+    return {
+        "itemId": row["item_id"],
+        "videoId": row["video_id"],
+        "title": row["title"],
+        "position": row["position"],
+    }
+
+
+def _snapshot(account: str, playlist_id: str) -> Optional[PlaylistSnapshot]:
+    db = SessionLocal()
+    try:
+        return db.get(PlaylistSnapshot, (account, playlist_id))
+    finally:
+        db.close()
+
+
+def _touch_snapshot(account: str, playlist_id: str):
+    db = SessionLocal()
+    try:
+        snapshot = db.get(PlaylistSnapshot, (account, playlist_id))
+        snapshot.checked_at = datetime.now()
+        db.commit()
+    finally:
+        db.close()
+
+
+def _store(
+    account: str, playlist_id: str, rows: List[Dict], etag: Optional[str]
+) -> Dict:
+    """Replace the snapshot with rows, returning the items added and removed."""
+    db = SessionLocal()
+    try:
+        known = {
+            row.item_id: {
+                "item_id": row.item_id,
+                "video_id": row.video_id,
+                "title": row.title,
+                "position": row.position,
+            }
+            for row in db.query(
+                PlaylistSnapshotItem.item_id,
+                PlaylistSnapshotItem.video_id,
+                PlaylistSnapshotItem.title,
+                PlaylistSnapshotItem.position,
+            ).filter(
+                PlaylistSnapshotItem.account == account,
+                PlaylistSnapshotItem.playlist_id == playlist_id,
+            )
+        }
+        current = {row["item_id"] for row in rows}
+        removed = [known[item_id] for item_id in known.keys() - current]
+        if removed:
+            db.query(PlaylistSnapshotItem).filter(
+                PlaylistSnapshotItem.account == account,
+                PlaylistSnapshotItem.playlist_id == playlist_id,
+                PlaylistSnapshotItem.item_id.in_([row["item_id"] for row in removed]),
+            ).delete(synchronize_session=False)
+
+        # Chunked to stay below SQLite's limit on bound variables
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            statement = insert(PlaylistSnapshotItem).values(
+                rows[start : start + UPSERT_CHUNK_SIZE]
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=[
+                    PlaylistSnapshotItem.account,
+                    PlaylistSnapshotItem.playlist_id,
+                    PlaylistSnapshotItem.item_id,
+                ],
+                set_={
+                    column: statement.excluded[column]
+                    for column in (
+                        "video_id",
+                        "title",
+                        "description",
+                        "channel_id",
+                        "channel_title",
+                        "video_owner_channel_id",
+                        "video_owner_channel_title",
+                        "thumbnails",
+                        "published_at",
+                        "position",
+                    )
+                },
+            )
+            db.execute(statement)
+
+        now = datetime.now()
+        snapshot = db.get(PlaylistSnapshot, (account, playlist_id)) or PlaylistSnapshot(
+            account=account, playlist_id=playlist_id
+        )
+        snapshot.etag = etag
+        snapshot.item_count = len(rows)
+        snapshot.synced_at = now
+        snapshot.checked_at = now
+        db.add(snapshot)
+        db.commit()
+        return {
+            "added": [_diff_entry(row) for row in rows if row["item_id"] not in known],
+            "removed": sorted(
+                (_diff_entry(row) for row in removed), key=lambda e: e["position"]
+            ),
+        }
+    finally:
+        db.close()
+
+
+async def _fetch_items_page(credentials, playlist_id, page_token=None) -> Dict:
+    return await execute_with_retry(
+        credentials,
+        lambda youtube: youtube.playlistItems().list(
+            part="snippet",
+            playlistId=playlist_id,
+            maxResults=PLAYLIST_PAGE_SIZE,
+            pageToken=page_token,
+        ),
+    )
+
+
+async def sync_playlist_snapshot(
+    credentials, playlist_id: str, force: bool = False
+) -> Dict:
+    """
+    Bring the local snapshot of a playlist up to date.
+
+    The playlist resource is fetched first, one quota unit. While its etag
+    matches the one of the last walk the snapshot is kept as it is. Otherwise,
+    or when forced, every page of items is walked again and the items added
+    and removed since the last walk are returned.
+    """
+    account = account_key(credentials)
+    response = await execute_with_retry(
+        credentials,
+        lambda youtube: youtube.playlists().list(part="contentDetails", id=playlist_id),
+    )
+    if not response.get("items"):
+        raise PlaylistNotFound(playlist_id)
+    etag = response["items"][0].get("etag")
+
+    snapshot = await asyncio.to_thread(_snapshot, account, playlist_id)
+    if snapshot and etag and snapshot.etag == etag and not force:
+        await asyncio.to_thread(_touch_snapshot, account, playlist_id)
+        return {
+            "playlist_id": playlist_id,
+            "changed": False,
+            "added": [],
+            "removed": [],
+            "total": snapshot.item_count,
+        }
+
+    items = []
+    page_token = None
+    while True:
+        page = await _fetch_items_page(credentials, playlist_id, page_token)
+        items.extend(page.get("items", []))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            break
+
+    # Pages can shift while they are walked, an item is kept once
+    rows = {}
+    for item in items:
+        row = snapshot_item_row(item, account, len(rows))
+        rows.setdefault(row["item_id"], row)
+    rows = list(rows.values())
+    diff = await asyncio.to_thread(_store, account, playlist_id, rows, etag)
+    return {
+        "playlist_id": playlist_id,
+        "changed": True,
+        **diff,
+        "total": len(rows),
+    }
+
+
+async def ensure_snapshot(
+    credentials, playlist_id: str, refresh: bool = False, force: bool = False
+) -> Optional[Dict]:
+    """
+    Make sure a snapshot exists and was checked recently, syncing when needed.
+
+    Concurrent callers for the same playlist share one sync. Returns the
+    result of the sync, or None when the snapshot was recent enough.
+    """
+    key = (account_key(credentials), playlist_id)
+    lock = _locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        snapshot = await asyncio.to_thread(_snapshot, *key)
+        if snapshot and not refresh:
+            age = (datetime.now() - snapshot.checked_at).total_seconds()
+            if age < PLAYLIST_CHECK_INTERVAL:
+                return None
+        return await sync_playlist_snapshot(credentials, playlist_id, force)
+
+
+def _playlist_item(record: PlaylistSnapshotItem) -> Dict:
+    # Shaped like a playlistItems.list item
+    return {
+        "kind": "youtube#playlistItem",
+        "id": record.item_id,
+        "snippet": {
+            "publishedAt": (
+                record.published_at.isoformat() + "Z" if record.published_at else None
+            ),
+            "channelId": record.channel_id,
+            "title": record.title,
+            "description": record.description,
+            "thumbnails": json.loads(record.thumbnails or "{}"),
+            "channelTitle": record.channel_title,
+            "videoOwnerChannelTitle": record.video_owner_channel_title,
+            "videoOwnerChannelId": record.video_owner_channel_id,
+            "playlistId": record.playlist_id,
+            "position": record.position,
+            "resourceId": {"kind": "youtube#video", "videoId": record.video_id},
+        },
+    }
+
+
+def query_playlist_items(
+    db: Session,
+    account: str,
+    playlist_id: str,
+    sort_order: SortOrder = SortOrder.OLDEST,
+    page_token: Optional[str] = None,
+    max_results: int = 50,
+) -> Dict:
+    """Read one page of a snapshot in the requested order without calling the API."""
+    snapshot = db.get(PlaylistSnapshot, (account, playlist_id))
+    offset = local_page_offset(page_token)
+    records = (
+        db.query(PlaylistSnapshotItem)
+        .filter(
+            PlaylistSnapshotItem.account == account,
+            PlaylistSnapshotItem.playlist_id == playlist_id,
+        )
+        .order_by(*SORT_COLUMNS[sort_order])
+        .offset(offset)
+        .limit(max_results)
+        .all()
+    )
+    total = snapshot.item_count if snapshot else 0
+    next_offset = offset + len(records)
+    return {
+        "videos": [_playlist_item(record) for record in records],
+        "nextPageToken": next_local_page_token(next_offset, total),
+        "totalResults": total,
+        "syncedAt": snapshot.synced_at if snapshot else None,
+    }
@@ -1,10 +1,32 @@
-from googleapiclient.discovery import build
-from datetime import datetime
+import asyncio
+import heapq
+import json
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from googleapiclient.errors import HttpError
+
+from core.fields import FieldTree, format_fields, list_fields, merge_fields, project
+from core.youtube import (
+    REJECTED_STATUSES,
+    TRANSIENT_STATUSES,
+    build_youtube,
+    execute_async,
+    execute_with_retry,
+    naive_utc,
+    parse_timestamp,
+    retry_delay,
+)
 from models.playlists import SortOrder
 
+INSERT_RETRIES = 3
+# Items added this long before an insert was sent may still be its own
+INSERT_CLOCK_SKEW = timedelta(minutes=1)
+
 
 def get_playlists(credentials, channel_id, max_results=50, page_token=None):
-    youtube = build("youtube", "v3", credentials=credentials)
+    youtube = build_youtube(credentials)
 
     # Request videos from the playlist
     request = youtube.playlists().list(
@@ -22,90 +44,259 @@ def get_playlists(credentials, channel_id, max_results=50, page_token=None):
     }
 
 
-def get_playlist_items(
-    credentials, playlist_id, max_results=50, sort_order: SortOrder = SortOrder.OLDEST
+def _published_at(item):
+    # ISO 8601 timestamps from the API sort lexicographically, no parsing needed
+    return item.get("snippet", {}).get("publishedAt", "")
+
+
+def _title(item):
+    return item.get("snippet", {}).get("title", "")
+
+
+def top_k_playlist_items(items, k, sort_order: SortOrder):
+    """Select the first `k` items in sort order, keeping at most `k` in memory."""
+    select = heapq.nlargest if sort_order == SortOrder.NEWEST else heapq.nsmallest
+    key = _title if sort_order == SortOrder.TITLE else _published_at
+    return select(k, items, key=key)
+
+
+def _list_playlist_items(youtube, playlist_id, page_size, page_token=None, fields=None):
+    return youtube.playlistItems().list(
+        part="snippet",
+        playlistId=playlist_id,
+        maxResults=page_size,  # YouTube API limit is 50
+        pageToken=page_token,
+        fields=fields,
+    )
+
+
+def _upstream_fields(fields: FieldTree | None, sort_order: SortOrder) -> str | None:
+    if fields is None:
+        return None
+    if sort_order != SortOrder.POSITION:
+        # The sort key is fetched even when not selected, and projected away later
+        sort_key = "title" if sort_order == SortOrder.TITLE else "publishedAt"
+        fields = merge_fields(fields, f"snippet/{sort_key}")
+    return format_fields(list_fields(fields))
+
+
+async def stream_playlist_items(
+    credentials,
+    playlist_id,
+    max_results=50,
+    sort_order: SortOrder = SortOrder.OLDEST,
+    fields: FieldTree | None = None,
 ):
-    youtube = build("youtube", "v3", credentials=credentials)
-    videos = []
-    next_page_token = None
+    """Yield NDJSON lines of playlist items as pages arrive from the API."""
+    upstream_fields = _upstream_fields(fields, sort_order)
+    sorted_output = sort_order != SortOrder.POSITION
+    remaining = max_results
+    page_token = None
+    top_k = []
 
-    while True:
-        # Request videos from the playlist
-        request = youtube.playlistItems().list(
-            part="snippet",
-            playlistId=playlist_id,
-            maxResults=min(max_results, 50),  # YouTube API limit is 50
-            pageToken=next_page_token,
-        )
-        response = request.execute()
-        print(f"totalResults: {response.get('pageInfo', {}).get('totalResults')}")
-
-        # Extract video details
-        for item in response["items"]:
-            videos.append(item)
-
-        # Check if there are more pages and if we need more results
-        next_page_token = response.get("nextPageToken")
-        if not next_page_token:
-            break
-
-    # Sort videos based on publishedAt using datetime parsing
-    videos.sort(
-        key=lambda x: (
-            datetime.fromisoformat(
-                x.get("snippet", {}).get("publishedAt", "").replace("Z", "+00:00")
+    try:
+        while True:
+            page_size = 50 if sorted_output else min(remaining, 50)
+            response = await execute_async(
+                credentials,
+                lambda youtube: _list_playlist_items(
+                    youtube, playlist_id, page_size, page_token, upstream_fields
+                ),
             )
-            if "publishedAt" in x.get("snippet", {})
-            else datetime.min
-        ),
-        reverse=(sort_order == SortOrder.NEWEST),
-    )
+            items = response.get("items", [])
+            page_token = response.get("nextPageToken")
 
-    return {
-        "videos": videos,
+            if sorted_output:
+                top_k = top_k_playlist_items(top_k + items, max_results, sort_order)
+            else:
+                items = items[:remaining]
+                remaining -= len(items)
+                yield json.dumps(
+                    {
+                        "videos": project(items, fields),
+                        "totalResults": response.get("pageInfo", {}).get(
+                            "totalResults"
+                        ),
+                    }
+                ) + "\n"
+
+            if not page_token or remaining == 0:
+                break
+
+        if sorted_output:
+            yield json.dumps({"videos": project(top_k, fields)}) + "\n"
+    except HttpError as e:
+        # Headers are already sent, so report the failure in-band
+        yield json.dumps({"error": f"An error occurred: {e}"}) + "\n"
+
+
+def _insert_playlist_item(youtube, playlist_id, video_id):
+    request_body = {
+        "snippet": {
+            "playlistId": playlist_id,
+            "resourceId": {
+                "kind": "youtube#video",
+                "videoId": video_id,
+            },
+        }
     }
+    return youtube.playlistItems().insert(part="snippet", body=request_body)
 
 
 def add_playlist_videos(youtube, videos_request):
-    added_videos = []
-    if isinstance(videos_request.video_ids, str):
-        request_body = {
-            "snippet": {
-                "playlistId": videos_request.playlist_id,
-                "resourceId": {
-                    "kind": "youtube#video",
-                    "videoId": videos_request.video_ids,
-                },
-            }
-        }
+    video_ids = videos_request.video_ids
+    if isinstance(video_ids, str):
+        video_ids = [video_ids]
 
-        request = youtube.playlistItems().insert(part="snippet", body=request_body)
-        response = request.execute()
-        added_videos = [
+    added_videos = []
+    failed_videos = []
+    for video_id in video_ids:
+        # Insert video into playlist, a failure no longer aborts the rest
+        try:
+            response = _insert_playlist_item(
+                youtube, videos_request.playlist_id, video_id
+            ).execute()
+        except HttpError as e:
+            failed_videos.append({"videoId": video_id, "error": str(e)})
+            continue
+        added_videos.append(
             {
-                "videoId": videos_request.video_ids,
+                "videoId": response["snippet"]["resourceId"]["videoId"],
                 "title": response["snippet"]["title"],
             }
-        ]
-    else:
-        for video_id in videos_request.video_ids:
-            request_body = {
-                "snippet": {
-                    "playlistId": videos_request.playlist_id,
-                    "resourceId": {
-                        "kind": "youtube#video",
-                        "videoId": video_id,
-                    },
-                }
-            }
+        )
+
+    message = (
+        "Videos added successfully."
+        if not failed_videos
+        else f"{len(failed_videos)} of {len(video_ids)} videos could not be added."
+    )
+    return {
+        "message": message,
+        "added_videos": added_videos,
+        "failed_videos": failed_videos,
+    }
+
+
+async def _run_bulk(video_ids, operation, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
 
-            # Insert video into playlist
-            request = youtube.playlistItems().insert(part="snippet", body=request_body)
-            response = request.execute()
-            added_videos.append(
-                {
-                    "videoId": response["snippet"]["resourceId"]["videoId"],
-                    "title": response["snippet"]["title"],
+    async def run(video_id):
+        async with semaphore:
+            try:
+                return await operation(video_id)
+            except HttpError as e:
+                return {
+                    "videoId": video_id,
+                    "status": "failed",
+                    "statusCode": e.resp.status,
+                    "error": str(e),
                 }
+            except Exception as e:
+                # One broken item must not end the stream before its summary
+                return {"videoId": video_id, "status": "failed", "error": str(e)}
+
+    # Yield results in completion order so clients see progress immediately
+    for result in asyncio.as_completed([run(video_id) for video_id in video_ids]):
+        yield await result
+
+
+async def _video_items(credentials, playlist_id, video_id, part="id") -> List[Dict]:
+    """Every occurrence of a video in a playlist, across all pages."""
+    items = []
+    page_token = None
+    while True:
+        response = await execute_with_retry(
+            credentials,
+            lambda youtube: youtube.playlistItems().list(
+                part=part,
+                playlistId=playlist_id,
+                videoId=video_id,
+                maxResults=50,
+                pageToken=page_token,
+            ),
+        )
+        items.extend(response.get("items", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return items
+
+
+def _added_since(items: List[Dict], since: datetime) -> Optional[Dict]:
+    for item in items:
+        added_at = parse_timestamp(item["snippet"].get("publishedAt"))
+        if added_at is not None and added_at >= since:
+            return item
+    return None
+
+
+async def _insert_once(credentials, playlist_id, video_id) -> Dict:
+    """
+    Insert a video into a playlist without adding it twice.
+
+    Inserts are not idempotent: a conflict or server error may come back for
+    an insert that was applied. Before such a failure is retried the playlist
+    is checked for an item of the video added since the first attempt.
+    """
+    started_at = naive_utc(datetime.now(timezone.utc)) - INSERT_CLOCK_SKEW
+    for attempt in range(INSERT_RETRIES + 1):
+        try:
+            return await execute_with_retry(
+                credentials,
+                lambda youtube: _insert_playlist_item(youtube, playlist_id, video_id),
+                statuses=REJECTED_STATUSES,
             )
-    return {"message": "Videos added successfully.", "added_videos": added_videos}
+        except HttpError as e:
+            if e.resp.status not in TRANSIENT_STATUSES or attempt == INSERT_RETRIES:
+                raise
+        await asyncio.sleep(retry_delay(attempt))
+        inserted = _added_since(
+            await _video_items(credentials, playlist_id, video_id, part="snippet"),
+            started_at,
+        )
+        if inserted is not None:
+            return inserted
+
+
+async def bulk_add_playlist_videos(credentials, playlist_id, video_ids, concurrency=4):
+    """Insert videos into a playlist with bounded concurrency, yielding one result per video."""
+
+    async def add(video_id):
+        response = await _insert_once(credentials, playlist_id, video_id)
+        return {
+            "videoId": video_id,
+            "status": "added",
+            "playlistItemId": response["id"],
+            "title": response["snippet"]["title"],
+        }
+
+    async for result in _run_bulk(video_ids, add, concurrency):
+        yield result
+
+
+async def bulk_remove_playlist_videos(
+    credentials, playlist_id, video_ids, concurrency=4
+):
+    """Remove every occurrence of the videos from a playlist, yielding one result per video."""
+
+    async def remove(video_id):
+        # Collected before deleting, so the pages do not shift under the walk
+        items = await _video_items(credentials, playlist_id, video_id)
+        item_ids = [item["id"] for item in items]
+        if not item_ids:
+            return {"videoId": video_id, "status": "not_found"}
+
+        for item_id in item_ids:
+            try:
+                await execute_with_retry(
+                    credentials,
+                    lambda youtube: youtube.playlistItems().delete(id=item_id),
+                )
+            except HttpError as e:
+                # A retried delete finds the item already gone
+                if e.resp.status != 404:
+                    raise
+        return {"videoId": video_id, "status": "removed", "removed": len(item_ids)}
+
+    async for result in _run_bulk(video_ids, remove, concurrency):
+        yield result
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from models.downloads import PostProcessOperation, PostProcessOptions
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+# ffmpeg runs in its own process, so the pool is sized to the machine
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", str(os.cpu_count() or 1)))
+# Threads per ffmpeg process, so a full pool does not oversubscribe the CPUs
+FFMPEG_THREADS = max(1, (os.cpu_count() or 1) // POSTPROCESS_WORKERS)
+
+AUDIO_CODECS = {
+    "mp3": ["-c:a", "libmp3lame", "-q:a", "2"],
+    "m4a": ["-c:a", "aac", "-b:a", "192k"],
+    "opus": ["-c:a", "libopus", "-b:a", "128k"],
+    "flac": ["-c:a", "flac"],
+}
+VIDEO_CODECS = {
+    "h264": ["-c:v", "libx264", "-crf", "23", "-preset", "medium"],
+    "h265": ["-c:v", "libx265", "-crf", "28", "-preset", "medium"],
+    "vp9": ["-c:v", "libvpx-vp9", "-crf", "31", "-b:v", "0"],
+}
+AUDIO_EXTENSIONS = set(AUDIO_CODECS)
+# Containers ffmpeg cannot write an attached cover image into
+COVERLESS_EXTENSIONS = {"webm", "opus"}
+
+
+class PostProcessError(Exception):
+    pass
+
+
+@dataclass
+class PostJob:
+    video_id: str
+    operation: PostProcessOperation
+    input_path: str
+    output_path: str
+    args: List[str]  # ffmpeg arguments between the inputs and the output file
+    inputs: List[str] = field(default_factory=list)
+    duration: Optional[float] = None  # Seconds, used to turn progress into a fraction
+    on_progress: Optional[Callable[[str, Optional[float]], None]] = None
+    future: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+    process: Optional[asyncio.subprocess.Process] = None
+
+    @property
+    def tmp_path(self) -> str:
+        base, ext = os.path.splitext(self.output_path)
+        return f"{base}.pp-tmp{ext}"
+
+    def report(self, status: str, progress: Optional[float] = None):
+        if self.on_progress:
+            self.on_progress(status, progress)
+
+    def cancel(self):
+        if self.process and self.process.returncode is None:
+            self.process.kill()
+        if not self.future.done():
+            self.future.cancel()
+
+
+def build_job(
+    video_id: str,
+    operation: PostProcessOperation,
+    input_path: str,
+    options: PostProcessOptions,
+    duration: Optional[float] = None,
+    thumbnail_path: Optional[str] = None,
+) -> Optional[PostJob]:
+    """Describe one ffmpeg step, returns None when there is nothing to do."""
+    base, ext = os.path.splitext(input_path)
+    ext = ext.lstrip(".").lower()
+    inputs = [input_path]
+
+    if operation == PostProcessOperation.REMUX:
+        if ext == options.remux_format:
+            return None
+        output_path = f"{base}.{options.remux_format}"
+        args = ["-map", "0", "-c", "copy"]
+    elif operation == PostProcessOperation.EXTRACT_AUDIO:
+        output_path = f"{base}.{options.audio_format}"
+        args = ["-vn", *AUDIO_CODECS[options.audio_format]]
+    elif operation == PostProcessOperation.TRANSCODE:
+        if ext in AUDIO_EXTENSIONS:
+            return None
+        output_path = input_path
+        args = ["-map", "0", *VIDEO_CODECS[options.video_codec], "-c:a", "copy"]
+    elif operation == PostProcessOperation.EMBED_THUMBNAIL:
+        if not thumbnail_path:
+            return None
+        if ext in COVERLESS_EXTENSIONS:
+            # Skipped like yt-dlp does, rather than failing after the download
+            logger.warning(f"Cannot embed a thumbnail into {ext}, skipping")
+            return None
+        output_path = input_path
+        inputs.append(thumbnail_path)
+        # The cover is the only video stream of audio files, the second of videos
+        cover = 0 if ext in AUDIO_EXTENSIONS else 1
+        args = ["-map", "0", "-map", "1", "-c", "copy"]
+        args += [f"-c:v:{cover}", "mjpeg", f"-disposition:v:{cover}", "attached_pic"]
+    else:
+        raise ValueError(f"Unknown post-processing operation: {operation}")
+
+    return PostJob(
+        video_id=video_id,
+        operation=operation,
+        input_path=input_path,
+        output_path=output_path,
+        args=args,
+        inputs=inputs,
+        duration=duration,
+    )
+
+
+class PostProcessPool:
+    """
+    Runs post-processing jobs on a fixed number of workers.
+
+    Each job is one ffmpeg process. Progress comes from ffmpeg's -progress
+    output and is reported as a fraction of the media duration.
+    """
+
+    def __init__(self, workers: int = POSTPROCESS_WORKERS):
+        self.workers = workers
+        self.running = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers)
+            ]
+
+    async def submit(self, job: PostJob) -> str:
+        """Queue a job and wait for it, returns the output path."""
+        self._ensure_started()
+        await self._queue.put(job)
+        return await job.future
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.future.done():  # Canceled while queued
+                continue
+            self.running += 1
+            try:
+                await self._run(job)
+                if not job.future.done():
+                    job.future.set_result(job.output_path)
+            except Exception as e:
+                logger.warning(f"{job.operation.value} of {job.video_id} failed: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.running -= 1
+
+    async def _run(self, job: PostJob):
+        command = [FFMPEG_PATH, "-hide_banner", "-nostdin", "-y"]
+        command += ["-loglevel", "error", "-progress", "pipe:1", "-nostats"]
+        for path in job.inputs:
+            command += ["-i", path]
+        command += [*job.args, "-threads", str(FFMPEG_THREADS), job.tmp_path]
+
+        job.report("started")
+        job.process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stderr_task = asyncio.create_task(job.process.stderr.read())
+        try:
+            async for line in job.process.stdout:
+                key, _, value = line.decode(errors="replace").strip().partition("=")
+                if key == "out_time_us" and job.duration and value.isdigit():
+                    job.report(
+                        "processing", min(int(value) / (job.duration * 1e6), 1.0)
+                    )
+            returncode = await job.process.wait()
+            stderr = await stderr_task
+        except BaseException:
+            if job.process.returncode is None:
+                job.process.kill()
+            raise
+
+        if job.future.done():  # Canceled while running
+            _remove(job.tmp_path)
+            return
+        if returncode != 0:
+            _remove(job.tmp_path)
+            message = stderr.decode(errors="replace").strip().splitlines()
+            raise PostProcessError(message[-1] if message else f"exit {returncode}")
+
+        os.replace(job.tmp_path, job.output_path)
+        if job.operation == PostProcessOperation.REMUX:
+            _remove(job.input_path)
+        job.report("finished", 1.0)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+postprocess_pool = PostProcessPool()
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict
+
+from core.metrics import metrics
+from core.quota import QuotaBudget
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_TTL = 60 * 2  # Prefetched pages are dropped after 2 minutes
+PREFETCH_MAX_ENTRIES = 256
+# Quota units speculative fetches may spend per hour
+PREFETCH_QUOTA_UNITS = int(os.getenv("PREFETCH_QUOTA_UNITS", "2000"))
+
+
+@dataclass
+class PrefetchStats:
+    hits: int = 0  # Page requests answered from a prefetched page
+    misses: int = 0  # Page requests that had to go to the API
+    prefetched: int = 0  # Speculative fetches issued
+    wasted: int = 0  # Prefetched pages expired or evicted before use
+    errors: int = 0  # Speculative fetches that failed
+    skipped: int = 0  # Speculative fetches skipped for lack of quota budget
+
+    def as_dict(self) -> Dict[str, Any]:
+        served = self.hits + self.misses
+        return {
+            **self.__dict__,
+            "hit_rate": round(self.hits / served, 3) if served else None,
+        }
+
+
+@dataclass
+class _Entry:
+    namespace: str
+    task: asyncio.Task
+    expires_at: float = field(default_factory=lambda: time.time() + PREFETCH_TTL)
+
+
+class PageCache:
+    """
+    Short-lived cache of speculatively fetched next pages.
+
+    After a page is served with prefetching enabled, the page behind its
+    `nextPageToken` is fetched in the background within the quota budget.
+    Each prefetched page is served at most once.
+    """
+
+    def __init__(self, budget: QuotaBudget, max_entries: int = PREFETCH_MAX_ENTRIES):
+        self.budget = budget
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._stats: Dict[str, PrefetchStats] = {}
+
+    def stats(self, namespace: str) -> PrefetchStats:
+        return self._stats.setdefault(namespace, PrefetchStats())
+
+    @staticmethod
+    def _key(namespace: str, scope: str, params: Dict, page_token) -> str:
+        return json.dumps([namespace, scope, params, page_token], sort_keys=True)
+
+    def _purge(self):
+        now = time.time()
+        for key in [k for k, e in self._entries.items() if e.expires_at < now]:
+            self._drop(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        self.stats(entry.namespace).wasted += 1
+        entry.task.cancel()
+
+    async def get_page(
+        self,
+        namespace: str,
+        scope: str,
+        params: Dict,
+        page_token,
+        fetch: Callable[[Any], Awaitable[Dict]],
+        prefetch: bool = False,
+        cost: int = 1,
+    ) -> Dict:
+        """Return a page, from the prefetch cache when possible, and optionally prefetch the next one."""
+        self._purge()
+        stats = self.stats(namespace)
+        response = None
+
+        entry = self._entries.pop(self._key(namespace, scope, params, page_token), None)
+        if entry is not None:
+            try:
+                response = await entry.task
+                stats.hits += 1
+            except Exception:
+                response = None
+        if response is None:
+            if page_token:
+                # First pages can never be prefetched, so they do not count
+                stats.misses += 1
+            response = await fetch(page_token)
+
+        next_page_token = response.get("nextPageToken")
+        if prefetch and next_page_token:
+            self._prefetch(namespace, scope, params, next_page_token, fetch, cost)
+        return response
+
+    def _prefetch(self, namespace, scope, params, page_token, fetch, cost):
+        key = self._key(namespace, scope, params, page_token)
+        stats = self.stats(namespace)
+        if key in self._entries:
+            return
+        if not self.budget.try_spend(cost):
+            stats.skipped += 1
+            return
+
+        async def run():
+            try:
+                return await fetch(page_token)
+            except Exception as e:
+                stats.errors += 1
+                logger.warning(f"Prefetch of {namespace} page failed: {e}")
+                raise
+
+        task = asyncio.create_task(run())
+        # Failures are reported through stats, not as unretrieved task exceptions
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._entries[key] = _Entry(namespace=namespace, task=task)
+        stats.prefetched += 1
+
+
+page_cache = PageCache(QuotaBudget(PREFETCH_QUOTA_UNITS, period=60 * 60))
+
+
+def _prefetch_metrics():
+    lines = [
+        "# HELP youtube_prefetch_total Speculative next-page prefetch outcomes.",
+        "# TYPE youtube_prefetch_total counter",
+    ]
+    for namespace, stats in sorted(page_cache._stats.items()):
+        for outcome, count in stats.__dict__.items():
+            lines.append(
+                f'youtube_prefetch_total{{listing="{namespace}",outcome="{outcome}"}} {count}'
+            )
+    return lines
+
+
+metrics.register_collector(_prefetch_metrics)
@@ -0,0 +1,156 @@
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Nothing is installed unless this is set, so normal serving pays no overhead
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "20"))
+# When set, X-Profile must carry this value and the admin endpoints require it
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_HEADER = b"x-profile"
+ADMIN_PREFIX = "/admin/profiles"
+
+
+@dataclass
+class ProfileRecord:
+    id: int
+    method: str
+    path: str
+    route: Optional[str]
+    reason: str  # "header" or "sampled"
+    started_at: datetime
+    duration: float = 0.0
+    status: int = 500
+    profile: cProfile.Profile = field(default_factory=cProfile.Profile, repr=False)
+
+    def as_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "reason": self.reason,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 2),
+        }
+
+    def summary(self, sort: str = "cumulative", limit: int = 40) -> str:
+        output = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def dump(self) -> bytes:
+        """Serialize in the .prof format read by pstats, snakeviz and friends."""
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+
+class ProfileStore:
+    """Bounded ring of the most recent profiles."""
+
+    def __init__(self, size: int = PROFILE_RING_SIZE):
+        self._records: deque = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self.active: Optional[ProfileRecord] = None
+
+    def start(self, method: str, path: str, reason: str) -> ProfileRecord:
+        record = ProfileRecord(
+            id=next(self._ids),
+            method=method,
+            path=path,
+            route=None,
+            reason=reason,
+            started_at=datetime.now(),
+        )
+        self.active = record
+        return record
+
+    def finish(self, record: ProfileRecord):
+        self.active = None
+        self._records.append(record)
+
+    def list(self) -> List[Dict]:
+        return [record.as_dict() for record in reversed(self._records)]
+
+    def get(self, profile_id: int) -> Optional[ProfileRecord]:
+        for record in self._records:
+            if record.id == profile_id:
+                return record
+        return None
+
+
+profile_store = ProfileStore()
+
+
+def _profile_reason(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            if PROFILE_TOKEN is None or value.decode("latin-1") == PROFILE_TOKEN:
+                return "header"
+            return None
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware running cProfile around requests that ask for it.
+
+    Requests are profiled when they carry an X-Profile header or fall into
+    the PROFILE_SAMPLE_RATE sample. Only one profile runs at a time, since
+    cProfile hooks the whole event loop thread; other requests meanwhile
+    show up in the trace where they interleave. Work handed to worker
+    threads is not traced, only the wait for it.
+    """
+
+    def __init__(self, app, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or self.store.active is not None
+            or scope["path"].startswith(ADMIN_PREFIX)
+        ):
+            await self.app(scope, receive, send)
+            return
+        reason = _profile_reason(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        record = self.store.start(scope["method"], scope["path"], reason)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                record.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", str(record.id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        start = time.perf_counter()
+        record.profile.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record.profile.disable()
+            record.duration = time.perf_counter() - start
+            route = scope.get("route")
+            record.route = route.path if route is not None else None
+            self.store.finish(record)
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import threading
+import time
+
+from typing import Dict
+
+# Quota cost of YouTube Data API calls, in units
+SEARCH_LIST_COST = 100
+LIST_COST = 1
+
+# API requests each account may make, so one busy user cannot starve the others
+ACCOUNT_REQUESTS_PER_SECOND = float(os.getenv("ACCOUNT_REQUESTS_PER_SECOND", "10"))
+ACCOUNT_REQUEST_BURST = int(os.getenv("ACCOUNT_REQUEST_BURST", "20"))
+
+
+class QuotaBudget:
+    """Token bucket over API quota units, refilled continuously over `period` seconds."""
+
+    def __init__(self, units: int, period: float):
+        self.capacity = units
+        self.rate = units / period
+        self._available = float(units)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(
+            self.capacity, self._available + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def try_spend(self, units: int) -> bool:
+        with self._lock:
+            self._refill()
+            if self._available < units:
+                return False
+            self._available -= units
+            return True
+
+    def refund(self, units: int):
+        """Give back units taken for work that did not happen."""
+        with self._lock:
+            self._refill()
+            self._available = min(self.capacity, self._available + units)
+
+    async def spend(self, units: int = 1):
+        """Wait until units are available, then take them."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._available >= units:
+                    self._available -= units
+                    return
+                wait = (units - self._available) / self.rate
+            await asyncio.sleep(wait)
+
+    @property
+    def available(self) -> int:
+        with self._lock:
+            self._refill()
+            return int(self._available)
+
+
+_account_limiters: Dict[str, QuotaBudget] = {}
+_account_limiters_lock = threading.Lock()
+
+
+def account_limiter(account: str) -> QuotaBudget:
+    """Request rate limiter of one account, created on first use."""
+    limiter = _account_limiters.get(account)
+    if limiter is None:
+        with _account_limiters_lock:
+            limiter = _account_limiters.setdefault(
+                account,
+                QuotaBudget(
+                    ACCOUNT_REQUEST_BURST,
+                    period=ACCOUNT_REQUEST_BURST / ACCOUNT_REQUESTS_PER_SECOND,
+                ),
+            )
+    return limiter
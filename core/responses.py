@@ -0,0 +1,247 @@
+import asyncio
+import gzip
+import os
+
+from typing import List, Tuple
+from urllib.parse import quote
+
+from fastapi.responses import FileResponse, JSONResponse
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    FastJSONResponse = JSONResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_THREAD_SIZE = 256 * 1024  # Larger bodies are compressed off the event loop
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4  # Fast settings, these are dynamic responses
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "text/plain",
+    "text/html",
+    "text/css",
+    "application/javascript",
+)
+FILE_CHUNK_SIZE = 1024 * 1024  # Fewer, larger sends when the server cannot sendfile
+# Hand files under ACCEL_REDIRECT_ROOT to a fronting nginx, which serves them
+# from ACCEL_REDIRECT_PREFIX (an internal location aliased to the same root)
+ACCEL_REDIRECT_ROOT = os.getenv("ACCEL_REDIRECT_ROOT")
+ACCEL_REDIRECT_PREFIX = os.getenv("ACCEL_REDIRECT_PREFIX", "/protected-files/")
+
+
+def json_response(content) -> JSONResponse:
+    """
+    Serialize plain JSON content directly with the fastest available encoder.
+
+    Returning the response skips FastAPI's jsonable_encoder pass, which is
+    the bulk of the serialization time for large API payloads.
+    """
+    return FastJSONResponse(content)
+
+
+def accel_redirect_uri(path: str):
+    """X-Accel-Redirect target for path, None when nginx does not serve it."""
+    if not ACCEL_REDIRECT_ROOT:
+        return None
+    root = os.path.abspath(ACCEL_REDIRECT_ROOT)
+    path = os.path.abspath(path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    relative = os.path.relpath(path, root).replace(os.sep, "/")
+    return ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(relative)
+
+
+class SendfileResponse(FileResponse):
+    """
+    FileResponse that lets the server send the file when it can.
+
+    Servers advertising the ASGI pathsend or zerocopy extensions send the
+    file with sendfile. Others get it in large chunks, read off the event
+    loop, so memory stays constant either way. Range and If-Range handling
+    is FileResponse's.
+    """
+
+    chunk_size = FILE_CHUNK_SIZE
+
+    async def __call__(self, scope, receive, send):
+        self._extensions = scope.get("extensions") or {}
+        await super().__call__(scope, receive, send)
+
+    async def _handle_simple(self, send, send_header_only: bool):
+        if send_header_only:
+            await super()._handle_simple(send, send_header_only)
+        elif "http.response.pathsend" in self._extensions:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            await send(
+                {"type": "http.response.pathsend", "path": os.path.abspath(self.path)}
+            )
+        elif "http.response.zerocopy" in self._extensions:
+            size = int(self.headers["content-length"])
+            await self._send_zerocopy(send, self.status_code, 0, size)
+        else:
+            await super()._handle_simple(send, send_header_only)
+
+    async def _handle_single_range(
+        self, send, start: int, end: int, file_size: int, send_header_only: bool
+    ):
+        if send_header_only or "http.response.zerocopy" not in self._extensions:
+            await super()._handle_single_range(
+                send, start, end, file_size, send_header_only
+            )
+            return
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await self._send_zerocopy(send, 206, start, end - start)
+
+    async def _send_zerocopy(self, send, status: int, offset: int, count: int):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": self.raw_headers,
+            }
+        )
+        file = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            await send(
+                {
+                    "type": "http.response.zerocopy",
+                    "file": file,
+                    "offset": offset,
+                    "count": count,
+                    "more_body": False,
+                }
+            )
+        finally:
+            file.close()
+
+
+def _accepted_encodings(headers) -> set:
+    accepted = set()
+    for name, value in headers:
+        if name != b"accept-encoding":
+            continue
+        for part in value.decode("latin-1").split(","):
+            coding, _, params = part.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def _with_vary(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """Add Accept-Encoding to the Vary header, merged into one already set."""
+    values = [
+        value.strip().lower()
+        for name, header in headers
+        if name.lower() == b"vary"
+        for value in header.split(b",")
+    ]
+    if b"*" in values or b"accept-encoding" in values:
+        return headers
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            headers[index] = (name, value + b", Accept-Encoding")
+            return headers
+    return headers + [(b"vary", b"Accept-Encoding")]
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing single-shot responses with br or gzip.
+
+    Only bodies sent in one message are compressed, so streams (NDJSON, SSE,
+    files) keep flowing chunk by chunk. Brotli is used when the `brotli`
+    package is installed and the client accepts it.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = _accepted_encodings(scope["headers"])
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                headers = {
+                    name.lower(): value for name, value in message.get("headers", [])
+                }
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if (
+                    message["status"] == 200
+                    and b"content-encoding" not in headers
+                    and content_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    start_message = message  # Held until the body shows its size
+                    return
+                await send(message)
+                return
+
+            if start_message is None:
+                await send(message)
+                return
+
+            held, start_message = start_message, None
+            body = message.get("body", b"")
+            if (
+                message["type"] != "http.response.body"
+                or message.get("more_body", False)
+                or len(body) < self.minimum_size
+            ):
+                await send(held)
+                await send(message)
+                return
+
+            if len(body) >= COMPRESSION_THREAD_SIZE:
+                body = await asyncio.to_thread(_compress, body, encoding)
+            else:
+                body = _compress(body, encoding)
+            headers = _with_vary(
+                [
+                    (name, value)
+                    for name, value in held.get("headers", [])
+                    if name.lower() != b"content-length"
+                ]
+            )
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(body)).encode()),
+            ]
+            await send({**held, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_wrapper)
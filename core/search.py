@@ -0,0 +1,81 @@
+import os
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from core.quota import QuotaBudget
+
+RRF_K = 60  # Damps the lead of top ranks in reciprocal rank fusion
+# Quota units multi-searches may spend per hour, on top of single searches
+MULTI_SEARCH_QUOTA_UNITS = int(os.getenv("MULTI_SEARCH_QUOTA_UNITS", "2000"))
+
+multi_search_budget = QuotaBudget(MULTI_SEARCH_QUOTA_UNITS, period=60 * 60)
+
+
+def _video_id(item: Dict) -> Optional[str]:
+    return item.get("id", {}).get("videoId")
+
+
+@dataclass
+class _Match:
+    item: Dict  # The first copy received
+    order: int  # Arrival order across all queries
+    ranks: Dict[int, int] = field(default_factory=dict)  # Query index to rank
+
+
+class SearchMerger:
+    """
+    Merges the result lists of several queries into one entry per video.
+
+    Results are added as each query returns. rrf scores a video by the sum
+    of 1 / (RRF_K + rank) over the queries that found it, frequency by the
+    number of those queries, first_seen keeps the order of arrival.
+    """
+
+    def __init__(self, ranking: str = "rrf"):
+        self.ranking = ranking
+        self._matches: Dict[str, _Match] = {}
+
+    def add(self, query_index: int, items: List[Dict]) -> List[Dict]:
+        """Add the results of one query, returns the videos not seen before."""
+        new = []
+        for rank, item in enumerate(items, start=1):
+            video_id = _video_id(item)
+            if video_id is None:
+                continue
+            match = self._matches.get(video_id)
+            if match is None:
+                match = self._matches[video_id] = _Match(item, len(self._matches))
+                new.append(item)
+            match.ranks.setdefault(query_index, rank)
+        return new
+
+    def _score(self, match: _Match) -> float:
+        if self.ranking == "rrf":
+            return sum(1 / (RRF_K + rank) for rank in match.ranks.values())
+        if self.ranking == "frequency":
+            return float(len(match.ranks))
+        return 0.0
+
+    def _sort_key(self, match: _Match):
+        if self.ranking == "rrf":
+            return (-self._score(match), match.order)
+        if self.ranking == "frequency":
+            # Ties go to the video ranked highest by any one query
+            return (-len(match.ranks), min(match.ranks.values()), match.order)
+        return (match.order,)
+
+    def merged(self, limit: Optional[int] = None) -> List[Dict]:
+        """Entries of the merged list, best first."""
+        matches = sorted(self._matches.values(), key=self._sort_key)[:limit]
+        return [
+            {
+                "item": match.item,
+                "matchedQueries": sorted(match.ranks),
+                "score": self._score(match),
+            }
+            for match in matches
+        ]
+
+    def __len__(self) -> int:
+        return len(self._matches)
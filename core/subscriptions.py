@@ -0,0 +1,288 @@
+import asyncio
+import json
+import logging
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from core.local_store import (
+    UPSERT_CHUNK_SIZE,
+    local_page_offset,
+    next_local_page_token,
+)
+from core.youtube import account_key, execute_with_retry, parse_timestamp
+from db.db import SessionLocal
+from schemas.schemas import SubscriptionRecord, SubscriptionSyncState
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_PAGE_SIZE = 50  # subscriptions.list returns at most 50 per page
+SUBSCRIPTION_SYNC_INTERVAL = 30 * 60  # Seconds between scheduled syncs
+SUBSCRIPTION_RETRY_INTERVAL = 5 * 60  # After a failed sync
+# Unchanged first-page checks after which the full list is walked anyway,
+# since changes beyond page one can leave the etag and total as they were
+SUBSCRIPTION_FULL_SYNC_EVERY = 12
+
+
+def subscription_row(item: Dict, account: str, position: int) -> Dict:
+    snippet = item["snippet"]
+    return {
+        "account": account,
+        "channel_id": snippet["resourceId"]["channelId"],
+        "subscription_id": item["id"],
+        "title": snippet.get("title"),
+        "description": snippet.get("description"),
+        "thumbnails": json.dumps(snippet.get("thumbnails", {})),
+        "subscribed_at": parse_timestamp(snippet.get("publishedAt")),
+        "position": position,
+    }
+
+
+def _sync_state(account: str) -> Optional[SubscriptionSyncState]:
+    db = SessionLocal()
+    try:
+        return db.get(SubscriptionSyncState, account)
+    finally:
+        db.close()
+
+
+def _touch_state(account: str):
+    db = SessionLocal()
+    try:
+        state = db.get(SubscriptionSyncState, account)
+        state.checked_at = datetime.now()
+        state.checks_since_sync = state.checks_since_sync + 1
+        db.commit()
+    finally:
+        db.close()
+
+
+def _store(account: str, rows: List[Dict], etag: str, total: int) -> Dict:
+    """Upsert the full list and drop channels that are no longer subscribed."""
+    db = SessionLocal()
+    try:
+        known = {
+            row.channel_id
+            for row in db.query(SubscriptionRecord.channel_id).filter(
+                SubscriptionRecord.account == account
+            )
+        }
+        current = {row["channel_id"] for row in rows}
+        removed = known - current
+        if removed:
+            db.query(SubscriptionRecord).filter(
+                SubscriptionRecord.account == account,
+                SubscriptionRecord.channel_id.in_(removed),
+            ).delete(synchronize_session=False)
+
+        # Chunked to stay below SQLite's limit on bound variables
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            statement = insert(SubscriptionRecord).values(
+                rows[start : start + UPSERT_CHUNK_SIZE]
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=[
+                    SubscriptionRecord.account,
+                    SubscriptionRecord.channel_id,
+                ],
+                set_={
+                    column: statement.excluded[column]
+                    for column in (
+                        "subscription_id",
+                        "title",
+                        "description",
+                        "thumbnails",
+                        "subscribed_at",
+                        "position",
+                    )
+                },
+            )
+            db.execute(statement)
+
+        now = datetime.now()
+        state = db.get(SubscriptionSyncState, account) or SubscriptionSyncState(
+            account=account
+        )
+        state.etag = etag
+        state.total_results = total
+        state.checks_since_sync = 0
+        state.synced_at = now
+        state.checked_at = now
+        db.add(state)
+        db.commit()
+        return {"added": len(current - known), "removed": len(removed)}
+    finally:
+        db.close()
+
+
+async def _fetch_page(credentials, page_token: Optional[str] = None) -> Dict:
+    return await execute_with_retry(
+        credentials,
+        lambda youtube: youtube.subscriptions().list(
+            part="snippet",
+            mine=True,
+            maxResults=SUBSCRIPTION_PAGE_SIZE,
+            pageToken=page_token,
+        ),
+    )
+
+
+async def sync_subscriptions(credentials) -> Dict:
+    """
+    Mirror the subscription list of an account into the local table.
+
+    The first page is always fetched. When its etag and totalResults match
+    the last full sync, the sync usually stops there at a cost of one quota
+    unit. A subscribe and an unsubscribe beyond the first page leave both
+    as they were, so every SUBSCRIPTION_FULL_SYNC_EVERY checks, and whenever
+    they differ, the remaining pages are walked and the table is updated to
+    match.
+    """
+    account = account_key(credentials)
+    first_page = await _fetch_page(credentials)
+    etag = first_page.get("etag")
+    total = first_page.get("pageInfo", {}).get("totalResults", 0)
+
+    state = await asyncio.to_thread(_sync_state, account)
+    if (
+        state
+        and etag
+        and state.etag == etag
+        and state.total_results == total
+        and state.checks_since_sync < SUBSCRIPTION_FULL_SYNC_EVERY
+    ):
+        await asyncio.to_thread(_touch_state, account)
+        return {"changed": False, "added": 0, "removed": 0, "total": total}
+
+    items = list(first_page.get("items", []))
+    page_token = first_page.get("nextPageToken")
+    while page_token:
+        page = await _fetch_page(credentials, page_token)
+        items.extend(page.get("items", []))
+        page_token = page.get("nextPageToken")
+
+    # Pages can shift while they are walked, a channel is kept once
+    rows = {}
+    for item in items:
+        row = subscription_row(item, account, len(rows))
+        rows.setdefault(row["channel_id"], row)
+    rows = list(rows.values())
+    changes = await asyncio.to_thread(_store, account, rows, etag, total)
+    return {"changed": True, **changes, "total": len(rows)}
+
+
+class SubscriptionSyncer:
+    """Keeps the subscription mirror of one account current in the background."""
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.account = account_key(credentials)
+        self.ready = asyncio.Event()  # Set after the first sync attempt
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def sync_now(self) -> Dict:
+        """Sync immediately, waiting for a sync that is already running."""
+        async with self._lock:
+            try:
+                return await sync_subscriptions(self.credentials)
+            finally:
+                self.ready.set()
+
+    async def _run(self):
+        while True:
+            interval = SUBSCRIPTION_SYNC_INTERVAL
+            try:
+                await self.sync_now()
+            except Exception as e:
+                logger.warning(f"Subscription sync failed: {e}")
+                interval = SUBSCRIPTION_RETRY_INTERVAL
+            await asyncio.sleep(interval)
+
+
+syncers: Dict[str, SubscriptionSyncer] = {}
+
+
+def ensure_syncer(credentials) -> SubscriptionSyncer:
+    """Return the running syncer of an account, starting it on first use."""
+    key = account_key(credentials)
+    syncer = syncers.get(key)
+    if syncer is None:
+        syncer = syncers[key] = SubscriptionSyncer(credentials)
+    syncer.start()
+    return syncer
+
+
+def subscribed_channel_ids(account: str, limit: Optional[int] = None) -> List[str]:
+    """Channel IDs from the mirror, in the order the API returned them."""
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(SubscriptionRecord.channel_id)
+            .filter(SubscriptionRecord.account == account)
+            .order_by(SubscriptionRecord.position)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return [row.channel_id for row in query]
+    finally:
+        db.close()
+
+
+def _subscription_item(record: SubscriptionRecord) -> Dict:
+    # Shaped like a subscriptions.list item
+    return {
+        "kind": "youtube#subscription",
+        "id": record.subscription_id,
+        "snippet": {
+            "publishedAt": (
+                record.subscribed_at.isoformat() + "Z" if record.subscribed_at else None
+            ),
+            "title": record.title,
+            "description": record.description,
+            "resourceId": {"kind": "youtube#channel", "channelId": record.channel_id},
+            "thumbnails": json.loads(record.thumbnails or "{}"),
+        },
+    }
+
+
+def query_subscriptions(
+    db: Session,
+    account: str,
+    q: Optional[str] = None,
+    page_token: Optional[str] = None,
+    max_results: int = 50,
+) -> Dict:
+    """Search and paginate the mirrored subscriptions without calling the API."""
+    query = db.query(SubscriptionRecord).filter(SubscriptionRecord.account == account)
+    if q:
+        query = query.filter(SubscriptionRecord.title.ilike(f"%{q}%"))
+
+    offset = local_page_offset(page_token)
+    total = query.count()
+    records = (
+        query.order_by(SubscriptionRecord.position)
+        .offset(offset)
+        .limit(max_results)
+        .all()
+    )
+    next_offset = offset + len(records)
+    state = db.get(SubscriptionSyncState, account)
+    return {
+        "kind": "youtube#subscriptionListResponse",
+        "items": [_subscription_item(record) for record in records],
+        "nextPageToken": next_local_page_token(next_offset, total),
+        "pageInfo": {"totalResults": total, "resultsPerPage": max_results},
+        "syncedAt": state.synced_at if state else None,
+    }
@@ -0,0 +1,156 @@
+import threading
+import time
+
+from array import array
+from typing import Dict, List, Optional
+
+THROUGHPUT_RING_SIZE = 600
+THROUGHPUT_SAMPLE_INTERVAL = 0.5  # Seconds, progress hooks fire on every chunk
+FLEET_RATE_WINDOW = 10  # Seconds averaged for the fleet rate
+ACTIVE_STATUSES = ("queued", "downloading", "merged", "postprocessing")
+
+
+class ThroughputRing:
+    """
+    Fixed-size ring of (timestamp, cumulative bytes) samples.
+
+    Samples live in two flat arrays, so recording one allocates nothing.
+    Once full, the oldest samples are overwritten.
+    """
+
+    def __init__(self, size: int = THROUGHPUT_RING_SIZE):
+        self.size = size
+        self._times = array("d", bytes(8 * size))
+        self._bytes = array("q", bytes(8 * size))
+        self._next = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, timestamp: float, total_bytes: int):
+        with self._lock:
+            self._times[self._next] = timestamp
+            self._bytes[self._next] = total_bytes
+            self._next = (self._next + 1) % self.size
+            self.count = min(self.count + 1, self.size)
+
+    def samples(self):
+        """Samples from oldest to newest."""
+        with self._lock:
+            start = (self._next - self.count) % self.size
+            indexes = [(start + i) % self.size for i in range(self.count)]
+            return [(self._times[i], self._bytes[i]) for i in indexes]
+
+    def bytes_since(self, since: float):
+        """Oldest sample not older than since, None when there is none."""
+        for timestamp, total_bytes in self.samples():
+            if timestamp >= since:
+                return timestamp, total_bytes
+        return None
+
+    def series(self, points: int = 100) -> List[Dict]:
+        """Downsample to at most points buckets of equal duration, with rates."""
+        samples = self.samples()
+        if len(samples) < 2:
+            return [{"t": t, "bytes": b, "rate": 0.0} for t, b in samples]
+
+        start, end = samples[0][0], samples[-1][0]
+        width = (end - start) / points or 1.0
+        # The last sample of each bucket stands for it
+        buckets: Dict[int, tuple] = {}
+        for timestamp, total_bytes in samples:
+            buckets[min(int((timestamp - start) / width), points - 1)] = (
+                timestamp,
+                total_bytes,
+            )
+
+        series = []
+        previous = samples[0]
+        for timestamp, total_bytes in buckets.values():
+            elapsed = timestamp - previous[0]
+            rate = (total_bytes - previous[1]) / elapsed if elapsed > 0 else 0.0
+            series.append({"t": timestamp, "bytes": total_bytes, "rate": rate})
+            previous = (timestamp, total_bytes)
+        return series
+
+
+class TaskThroughput:
+    """Throttled sampling of one download into its ring."""
+
+    def __init__(self, fleet: "FleetThroughput", size: int = THROUGHPUT_RING_SIZE):
+        self.fleet = fleet
+        self.ring = ThroughputRing(size)
+        self._last_bytes = 0
+        self._last_sample = 0.0
+
+    def update(self, total_bytes: int, force: bool = False):
+        """Called on every progress hook, records at most one sample per interval."""
+        now = time.time()
+        self.fleet.add_bytes(total_bytes - self._last_bytes, now)
+        self._last_bytes = total_bytes
+        if force or now - self._last_sample >= THROUGHPUT_SAMPLE_INTERVAL:
+            self.ring.add(now, total_bytes)
+            self._last_sample = now
+
+    def summary(self, points: int = 100) -> Dict:
+        series = self.ring.series(points)
+        rates = [point["rate"] for point in series[1:]]
+        return {
+            "samples": self.ring.count,
+            "bytes": self._last_bytes,
+            "peak_rate": max(rates, default=0.0),
+            "mean_rate": sum(rates) / len(rates) if rates else 0.0,
+            "series": series,
+        }
+
+
+class FleetThroughput:
+    """
+    Totals over all downloads, each update is O(1).
+
+    Bytes from every task are added to one counter that is sampled into
+    its own ring. Task counts per status are adjusted on each transition.
+    """
+
+    def __init__(self, size: int = THROUGHPUT_RING_SIZE):
+        self.ring = ThroughputRing(size)
+        self.total_bytes = 0
+        self.statuses: Dict[str, int] = {}
+        self._last_sample = 0.0
+        self._lock = threading.Lock()  # Tasks report from their download threads
+
+    def add_bytes(self, delta: int, now: Optional[float] = None):
+        now = now or time.time()
+        with self._lock:
+            self.total_bytes += max(0, delta)
+            if now - self._last_sample >= THROUGHPUT_SAMPLE_INTERVAL:
+                self.ring.add(now, self.total_bytes)
+                self._last_sample = now
+
+    def transition(self, old: Optional[str], new: str):
+        if old == new:
+            return
+        with self._lock:
+            if old is not None:
+                self.statuses[old] = self.statuses.get(old, 0) - 1
+            self.statuses[new] = self.statuses.get(new, 0) + 1
+
+    def rate(self, window: float = FLEET_RATE_WINDOW) -> float:
+        """Bytes per second over the last window, drops to 0 when nothing moves."""
+        now = time.time()
+        since = self.ring.bytes_since(now - window)
+        if since is None:
+            return 0.0
+        return (self.total_bytes - since[1]) / max(now - since[0], 1.0)
+
+    def summary(self, points: int = 100) -> Dict:
+        return {
+            "bytes": self.total_bytes,
+            "rate": self.rate(),
+            "queued": self.statuses.get("queued", 0),
+            "active": sum(self.statuses.get(status, 0) for status in ACTIVE_STATUSES),
+            "statuses": {k: v for k, v in self.statuses.items() if v},
+            "series": self.ring.series(points),
+        }
+
+
+fleet_throughput = FleetThroughput()
@@ -0,0 +1,250 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import urllib.error
+import urllib.request
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set, Tuple
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Any server that answers GET {video_id} URLs works, e.g. a local stand-in
+THUMBNAIL_SOURCE_URL = os.getenv(
+    "THUMBNAIL_SOURCE_URL", "https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+)
+THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR", "thumbnail_cache")
+THUMBNAIL_CACHE_MAX_BYTES = int(
+    os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+THUMBNAIL_WIDTHS = (120, 240, 320, 480)  # Variants are limited to a few sizes
+THUMBNAIL_MAX_SOURCE_BYTES = 5 * 1024 * 1024
+THUMBNAIL_FETCH_TIMEOUT = 10
+JPEG_QUALITY = 85
+
+
+class ThumbnailNotFound(Exception):
+    pass
+
+
+@dataclass
+class CacheEntry:
+    size: int
+    etag: Optional[str] = None  # Computed lazily for files found on startup
+    # Widths an original is served for, as it is not wider than them
+    covers: Set[int] = field(default_factory=set)
+
+
+def _etag(data: bytes) -> str:
+    # Strong validator: derived from the exact bytes that are served
+    return f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"'
+
+
+def _fetch(url: str) -> bytes:
+    try:
+        with urllib.request.urlopen(url, timeout=THUMBNAIL_FETCH_TIMEOUT) as response:
+            data = response.read(THUMBNAIL_MAX_SOURCE_BYTES + 1)
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            raise ThumbnailNotFound(url)
+        raise
+    if len(data) > THUMBNAIL_MAX_SOURCE_BYTES:
+        raise ValueError(f"Thumbnail at {url} is larger than the size limit")
+    return data
+
+
+def _resize(path: str, width: int) -> Optional[bytes]:
+    """Scale an image down to `width`, returns None when it is not wider than that."""
+    with Image.open(path) as image:
+        if image.width <= width:
+            return None
+        height = max(1, round(image.height * width / image.width))
+        resized = image.convert("RGB").resize((width, height), Image.LANCZOS)
+    output = io.BytesIO()
+    resized.save(output, format="JPEG", quality=JPEG_QUALITY)
+    return output.getvalue()
+
+
+def _write(path: str, data: bytes):
+    # A lost cache file is simply fetched again, so no fsync here
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _hash_file(path: str) -> str:
+    with open(path, "rb") as file:
+        return _etag(file.read())
+
+
+class ThumbnailCache:
+    """
+    Disk cache of thumbnails and their resized variants.
+
+    Originals are fetched once from the source URL, variants are generated
+    from the cached original on first request. Concurrent misses for the
+    same file share one fetch. The least recently served files are evicted
+    once the cache grows past `max_bytes`, except files still being served.
+    """
+
+    def __init__(
+        self,
+        directory: str = THUMBNAIL_CACHE_DIR,
+        max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES,
+        source_url: str = THUMBNAIL_SOURCE_URL,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.source_url = source_url
+        self.total_bytes = 0
+        self._index: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._in_use: Dict[str, int] = {}  # References by file name
+        self._loaded = False
+        self._loading: Optional[asyncio.Task] = None
+
+    def _load(self):
+        """Index files left by a previous run, oldest first."""
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith(".tmp-"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._index[name] = CacheEntry(size)
+            self.total_bytes += size
+        self._loaded = True
+
+    async def _ensure_loaded(self):
+        """Index the directory once, concurrent first requests share the scan."""
+        if self._loaded:
+            return
+        if self._loading is None:
+            self._loading = asyncio.create_task(asyncio.to_thread(self._load))
+        task = self._loading
+        try:
+            await asyncio.shield(task)
+        except Exception:
+            if self._loading is task:
+                self._loading = None  # Scanned again by the next request
+            raise
+
+    @staticmethod
+    def filename(video_id: str, width: Optional[int] = None) -> str:
+        return f"{video_id}.jpg" if width is None else f"{video_id}_w{width}.jpg"
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _acquire(self, name: str):
+        self._in_use[name] = self._in_use.get(name, 0) + 1
+
+    def release(self, path: str):
+        """Drop a reference taken by get(), the file may be evicted again."""
+        name = os.path.basename(path)
+        count = self._in_use.pop(name) - 1
+        if count:
+            self._in_use[name] = count
+
+    async def get(self, video_id: str, width: Optional[int] = None) -> Tuple[str, str]:
+        """
+        Return the path and ETag of a thumbnail, fetching or resizing on a miss.
+
+        The file is not evicted until release() is called with its path.
+        """
+        await self._ensure_loaded()
+        if width is not None and Image is None:
+            width = None  # Without Pillow only originals can be served
+        if width is not None:
+            original = self._index.get(self.filename(video_id))
+            if original is not None and width in original.covers:
+                width = None
+
+        name = self.filename(video_id, width)
+        path = self.path(name)
+        self._acquire(name)
+        try:
+            entry = self._index.get(name)
+            if entry is not None:
+                self._index.move_to_end(name)
+                if entry.etag is None:
+                    entry.etag = await asyncio.to_thread(_hash_file, path)
+                return path, entry.etag
+
+            task = self._pending.get(name)
+            if task is None:
+                task = asyncio.create_task(self._create(video_id, width))
+                self._pending[name] = task
+                task.add_done_callback(lambda _: self._pending.pop(name, None))
+            # Shielded, a client going away must not cancel the other waiters
+            created_path, etag = await asyncio.shield(task)
+        except BaseException:
+            self.release(path)
+            raise
+        if created_path == path:
+            return path, etag
+        # Not worth a variant, the original is served for this width from now on
+        self.release(path)
+        return await self.get(video_id)
+
+    async def _create(self, video_id: str, width: Optional[int]) -> Tuple[str, str]:
+        if width is None:
+            url = self.source_url.format(video_id=video_id)
+            data = await asyncio.to_thread(_fetch, url)
+        else:
+            original_path, original_etag = await self.get(video_id)
+            try:
+                data = await asyncio.to_thread(_resize, original_path, width)
+            finally:
+                self.release(original_path)
+            if data is None:
+                original = self._index.get(self.filename(video_id))
+                if original is not None:
+                    original.covers.add(width)
+                return original_path, original_etag
+
+        name = self.filename(video_id, width)
+        await asyncio.to_thread(_write, self.path(name), data)
+        entry = CacheEntry(len(data), _etag(data))
+        self._index[name] = entry
+        self.total_bytes += entry.size
+        self._evict()
+        return self.path(name), entry.etag
+
+    def _evict(self):
+        for name in list(self._index):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if name in self._in_use:
+                continue  # Still being served or resized
+            entry = self._index.pop(name)
+            self.total_bytes -= entry.size
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "files": len(self._index),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+
+from collections import OrderedDict
+from datetime import datetime, timezone
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from core.quota import ACCOUNT_REQUESTS_PER_SECOND, account_limiter
+
+# Root URL for every client, e.g. http://127.0.0.1:8090/ for the load test fake API
+YOUTUBE_API_ENDPOINT = os.getenv("YOUTUBE_API_ENDPOINT")
+
+# googleapiclient services wrap a non thread-safe httplib2 client, so every
+# worker thread keeps its own service per account, least recently used first.
+_local = threading.local()
+MAX_CLIENTS_PER_THREAD = int(os.getenv("MAX_CLIENTS_PER_THREAD", "16"))
+
+# Statuses worth retrying: concurrent playlist modification, rate limits, backend errors
+TRANSIENT_STATUSES = {409, 429, 500, 502, 503, 504}
+# Statuses of requests that were rejected before taking effect
+REJECTED_STATUSES = {429}
+
+
+def build_youtube(credentials=None, developer_key=None):
+    """Build a YouTube Data API client, honouring YOUTUBE_API_ENDPOINT."""
+    client_options = (
+        {"api_endpoint": YOUTUBE_API_ENDPOINT} if YOUTUBE_API_ENDPOINT else None
+    )
+    return build(
+        "youtube",
+        "v3",
+        credentials=credentials,
+        developerKey=developer_key,
+        cache_discovery=False,
+        client_options=client_options,
+    )
+
+
+def get_youtube_client(credentials):
+    """Return a YouTube client for the current thread and credentials."""
+    clients = getattr(_local, "clients", None)
+    if clients is None:
+        clients = _local.clients = OrderedDict()
+
+    cached = clients.get(id(credentials))
+    if cached and cached[0] is credentials:
+        clients.move_to_end(id(credentials))
+        return cached[1]
+
+    while len(clients) >= MAX_CLIENTS_PER_THREAD:
+        clients.popitem(last=False)
+    youtube = build_youtube(credentials)
+    clients[id(credentials)] = (credentials, youtube)
+    return youtube
+
+
+async def execute_async(credentials, make_request):
+    """Build a request with `make_request(youtube)` and execute it in a worker thread."""
+    if ACCOUNT_REQUESTS_PER_SECOND:
+        await account_limiter(account_key(credentials)).spend()
+
+    def run():
+        return make_request(get_youtube_client(credentials)).execute()
+
+    return await asyncio.to_thread(run)
+
+
+def retry_delay(attempt: int, backoff: float = 0.5) -> float:
+    """Exponential backoff with jitter before retry number `attempt + 1`."""
+    return backoff * 2**attempt + random.uniform(0, backoff)
+
+
+async def execute_with_retry(
+    credentials, make_request, retries=3, backoff=0.5, statuses=TRANSIENT_STATUSES
+):
+    """
+    Like `execute_async`, retrying transient API errors with exponential backoff.
+
+    Requests that are not idempotent should only retry REJECTED_STATUSES.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await execute_async(credentials, make_request)
+        except HttpError as e:
+            if e.resp.status not in statuses or attempt == retries:
+                raise
+            await asyncio.sleep(retry_delay(attempt, backoff))
+
+
+def account_key(credentials) -> str:
+    """Stable, non-secret key identifying the account behind a set of credentials."""
+    secret = credentials.refresh_token or credentials.token or ""
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+
+def uploads_playlist_id(channel_id: str) -> str:
+    # Every channel's uploads playlist shares its ID with the "UU" prefix
+    return "UU" + channel_id[2:]
+
+
+def naive_utc(value: datetime | None) -> datetime | None:
+    # DateTime columns store naive UTC
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_timestamp(value: str | None) -> datetime | None:
+    """Parse an API timestamp such as 2024-01-01T00:00:00Z into naive UTC."""
+    if not value:
+        return None
+    return naive_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 from datetime import datetime
 
@@ -13,6 +13,30 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# Full-text index over stored comments, kept in sync by triggers
+COMMENTS_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+        text, author, content='comments', content_rowid='rowid'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts(rowid, text, author)
+        VALUES (new.rowid, new.text, new.author);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, text, author)
+        VALUES ('delete', old.rowid, old.text, old.author);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, text, author)
+        VALUES ('delete', old.rowid, old.text, old.author);
+        INSERT INTO comments_fts(rowid, text, author)
+        VALUES (new.rowid, new.text, new.author);
+    END""",
+]
+with engine.begin() as connection:
+    for statement in COMMENTS_FTS_DDL:
+        connection.execute(text(statement))
+
 
 # Db dependency
 def get_db():
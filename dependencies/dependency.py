@@ -2,27 +2,44 @@ import os
 import re
 from fastapi.exceptions import HTTPException
 from dotenv import load_dotenv
-from fastapi import Query
-from googleapiclient.discovery import build
+from typing import Optional
+from fastapi import Depends, Query
 
+from core.fields import FieldTree, parse_fields
+from core.youtube import build_youtube
+from models.downloads import YOUTUBE_VIDEO_ID_REGEX
 from routers.ouauth2 import authenticate_youtube
 
 load_dotenv()
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 
 
-async def get_credentials():
-    # Dependency to inject credentials
-    credentials = authenticate_youtube()
+def get_credentials(credentials=Depends(authenticate_youtube)):
+    # Dependency to inject the credentials of the selected account. Sync like
+    # authenticate_youtube, so a token refresh runs in the threadpool, off the loop.
     return credentials
 
 
 async def get_youtube():
-    return build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+    return build_youtube(developer_key=YOUTUBE_API_KEY)
 
 
-# Regular expressions for video ID and YouTube URL
-YOUTUBE_VIDEO_ID_REGEX = r"^[a-zA-Z0-9_-]{11}$"
+def get_fields(
+    fields: Optional[str] = Query(
+        None,
+        description="Item fields to return, in the API's fields syntax, e.g. id,snippet(title,publishedAt)",
+    ),
+) -> Optional[FieldTree]:
+    """Parses the optional `fields` selector of list endpoints."""
+    if fields is None:
+        return None
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Regular expression for YouTube URLs, the video ID one lives in models.downloads
 YOUTUBE_URL_REGEX = (
     r"^(https?:\/\/)?(www\.)?(youtube\.com|youtu\.be)\/(watch\?v=)?[a-zA-Z0-9_-]{11}$"
 )
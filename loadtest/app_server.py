@@ -0,0 +1,33 @@
+"""
+Runs the real application for load tests.
+
+Credentials are replaced with a static token, so no OAuth flow or token file
+is needed. Set YOUTUBE_API_ENDPOINT to the fake API before starting.
+"""
+
+import argparse
+
+import uvicorn
+
+from google.oauth2.credentials import Credentials
+
+from app import app
+from dependencies.dependency import get_credentials
+
+LOADTEST_CREDENTIALS = Credentials(token="loadtest", refresh_token="loadtest")
+
+
+async def get_loadtest_credentials():
+    return LOADTEST_CREDENTIALS
+
+
+app.dependency_overrides[get_credentials] = get_loadtest_credentials
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(
+        app, host=args.host, port=args.port, log_level="warning", access_log=False
+    )
@@ -0,0 +1,395 @@
+"""
+Local stand-in for the YouTube Data API v3 used by the load tests.
+
+List endpoints return deterministic synthetic resources shaped like the real
+ones, with paging, `part` and `fields` support. Latency and errors are
+injected according to the FAKE_YT_* environment variables or CLI flags.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import zlib
+
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from core.fields import parse_fields, project
+
+LATENCY_MS = float(os.getenv("FAKE_YT_LATENCY_MS", "50"))
+JITTER_MS = float(os.getenv("FAKE_YT_JITTER_MS", "15"))
+ERROR_RATE = float(os.getenv("FAKE_YT_ERROR_RATE", "0"))
+ERROR_STATUSES = [
+    int(status) for status in os.getenv("FAKE_YT_ERROR_STATUSES", "503").split(",")
+]
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+THUMBNAIL_SIZES = {
+    "default": (120, 90),
+    "medium": (320, 180),
+    "high": (480, 360),
+    "standard": (640, 480),
+    "maxres": (1280, 720),
+}
+SUBSCRIPTION_COUNT = 120
+ACTIVITY_COUNT = 50
+REPLIES_PER_THREAD = 3
+
+app = FastAPI()
+rng = random.Random(int(os.getenv("FAKE_YT_SEED", "0")))
+
+
+def _number(value: str, modulo: int) -> int:
+    return zlib.crc32(value.encode()) % modulo
+
+
+def _timestamp(index: int) -> str:
+    # Higher indexes are older, so lists come back newest first
+    return (EPOCH - timedelta(hours=7 * index)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _video_id(index: int) -> str:
+    return f"v{index:010d}"
+
+
+def _channel_id(index: int) -> str:
+    return f"UC{index:022d}"
+
+
+def _thumbnails(video_id: str) -> Dict:
+    return {
+        name: {
+            "url": f"https://i.ytimg.com/vi/{video_id}/{name}.jpg",
+            "width": width,
+            "height": height,
+        }
+        for name, (width, height) in THUMBNAIL_SIZES.items()
+    }
+
+
+def _snippet(video_id: str, index: int, channel_index: int) -> Dict:
+    return {
+        "publishedAt": _timestamp(index),
+        "channelId": _channel_id(channel_index),
+        "title": f"Load test video {index}",
+        "description": "Synthetic description for load testing. " * 12,
+        "thumbnails": _thumbnails(video_id),
+        "channelTitle": f"Channel {channel_index}",
+        "liveBroadcastContent": "none",
+    }
+
+
+def video(index: int, parts: List[str]) -> Dict:
+    video_id = _video_id(index)
+    resource = {
+        "kind": "youtube#video",
+        "etag": f"etag-video-{index}",
+        "id": video_id,
+        "snippet": {
+            **_snippet(video_id, index, index % 97),
+            "tags": ["load", "test", f"tag{index % 10}"],
+            "categoryId": "22",
+            "localized": {"title": f"Load test video {index}", "description": ""},
+        },
+        "contentDetails": {
+            "duration": f"PT{index % 50}M{index % 60}S",
+            "dimension": "2d",
+            "definition": "hd" if index % 3 else "sd",
+            "caption": "false",
+        },
+        "statistics": {
+            "viewCount": str(index * 137 % 1000003),
+            "likeCount": str(index * 13 % 10007),
+            "commentCount": str(index % 503),
+        },
+    }
+    return {
+        key: value
+        for key, value in resource.items()
+        if key in parts or key in ("kind", "etag", "id")
+    }
+
+
+def search_result(index: int) -> Dict:
+    video_id = _video_id(index)
+    return {
+        "kind": "youtube#searchResult",
+        "etag": f"etag-search-{index}",
+        "id": {"kind": "youtube#video", "videoId": video_id},
+        "snippet": _snippet(video_id, index, index % 97),
+    }
+
+
+def channel(channel_id: str) -> Dict:
+    index = _number(channel_id, 10_000)
+    return {
+        "kind": "youtube#channel",
+        "etag": f"etag-channel-{index}",
+        "id": channel_id,
+        "snippet": {
+            "title": f"Channel {index}",
+            "description": "Synthetic channel. " * 8,
+            "publishedAt": _timestamp(index),
+            "thumbnails": _thumbnails(_video_id(index)),
+        },
+        "statistics": {
+            "viewCount": str(index * 1009),
+            "subscriberCount": str(index * 31),
+            "videoCount": "300",
+        },
+        "contentDetails": {"relatedPlaylists": {"uploads": "UU" + channel_id[2:]}},
+        "brandingSettings": {
+            "image": {"bannerExternalUrl": "https://example.com/banner"}
+        },
+    }
+
+
+def playlist_item(playlist_id: str, position: int) -> Dict:
+    index = _number(playlist_id, 100_000) + position * 7
+    video_id = _video_id(index)
+    return {
+        "kind": "youtube#playlistItem",
+        "etag": f"etag-item-{playlist_id}-{position}",
+        "id": f"PLI{playlist_id}{position:05d}",
+        "snippet": {
+            **_snippet(video_id, index, index % 97),
+            "playlistId": playlist_id,
+            "position": position,
+            "resourceId": {"kind": "youtube#video", "videoId": video_id},
+        },
+        "contentDetails": {"videoId": video_id, "videoPublishedAt": _timestamp(index)},
+    }
+
+
+def comment(comment_id: str, video_id: str, index: int) -> Dict:
+    return {
+        "kind": "youtube#comment",
+        "id": comment_id,
+        "snippet": {
+            "videoId": video_id,
+            "authorDisplayName": f"@user{index % 211}",
+            "textDisplay": f"Synthetic comment number {index}",
+            "textOriginal": f"Synthetic comment number {index}",
+            "likeCount": index % 97,
+            "publishedAt": _timestamp(index),
+            "updatedAt": _timestamp(index),
+        },
+    }
+
+
+def comment_thread(video_id: str, index: int) -> Dict:
+    thread_id = f"T{video_id}{index:05d}"
+    return {
+        "kind": "youtube#commentThread",
+        "id": thread_id,
+        "snippet": {
+            "videoId": video_id,
+            "topLevelComment": comment(thread_id, video_id, index),
+            "totalReplyCount": REPLIES_PER_THREAD if index % 4 == 0 else 0,
+            "canReply": True,
+        },
+    }
+
+
+def subscription(index: int) -> Dict:
+    return {
+        "kind": "youtube#subscription",
+        "id": f"SUB{index:06d}",
+        "snippet": {
+            "title": f"Channel {index}",
+            "publishedAt": _timestamp(index),
+            "resourceId": {"kind": "youtube#channel", "channelId": _channel_id(index)},
+            "thumbnails": _thumbnails(_video_id(index)),
+        },
+    }
+
+
+def activity(index: int) -> Dict:
+    return {
+        "kind": "youtube#activity",
+        "id": f"ACT{index:06d}",
+        "snippet": {
+            "type": "upload",
+            "title": f"Load test video {index}",
+            "description": "",
+            "publishedAt": _timestamp(index),
+        },
+        "contentDetails": {"upload": {"videoId": _video_id(index)}},
+    }
+
+
+def _playlist_length(playlist_id: str) -> int:
+    return 1000 if playlist_id.startswith("PL") else 300
+
+
+def _page(params, total: int, make_item: Callable[[int], Dict], default_size=5) -> Dict:
+    size = min(int(params.get("maxResults", default_size)), 50)
+    start = int(params.get("pageToken") or 0)
+    end = min(start + size, total)
+    response = {
+        "kind": "youtube#listResponse",
+        "etag": f"etag-page-{start}-{total}",
+        "pageInfo": {"totalResults": total, "resultsPerPage": size},
+        "items": [make_item(index) for index in range(start, end)],
+    }
+    if end < total:
+        response["nextPageToken"] = str(end)
+    return response
+
+
+def _error(status: int, reason: str, message: str) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"code": status, "message": message, "errors": [{"reason": reason}]}},
+        status_code=status,
+    )
+
+
+def list_resource(resource: str, params) -> Dict | JSONResponse:
+    if resource == "search":
+        offset = _number(params.get("q") or params.get("channelId", ""), 10_000)
+        return _page(params, 500, lambda i: search_result(offset + i))
+    if resource == "videos":
+        parts = params.get("part", "snippet").split(",")
+        if params.get("chart"):
+            return _page(params, 200, lambda i: video(i, parts))
+        ids = params.get("id", "").split(",")
+        items = [
+            video(
+                (
+                    int(video_id[1:])
+                    if video_id[1:].isdigit()
+                    else _number(video_id, 10**6)
+                ),
+                parts,
+            )
+            for video_id in ids
+            if video_id
+        ]
+        return {
+            "kind": "youtube#videoListResponse",
+            "items": items,
+            "pageInfo": {"totalResults": len(items), "resultsPerPage": len(items)},
+        }
+    if resource == "channels":
+        channel_id = params.get("id") or _channel_id(0)
+        return {
+            "kind": "youtube#channelListResponse",
+            "items": [channel(channel_id)],
+            "pageInfo": {"totalResults": 1, "resultsPerPage": 1},
+        }
+    if resource == "playlists" and params.get("id"):
+        playlist_id = params["id"]
+        total = _playlist_length(playlist_id)
+        return {
+            "kind": "youtube#playlistListResponse",
+            "items": [
+                {
+                    "kind": "youtube#playlist",
+                    "etag": f"etag-playlist-{playlist_id}-{total}",
+                    "id": playlist_id,
+                    "contentDetails": {"itemCount": total},
+                }
+            ],
+            "pageInfo": {"totalResults": 1, "resultsPerPage": 1},
+        }
+    if resource == "playlists":
+        channel_id = params.get("channelId", "mine")
+        return _page(
+            params,
+            40,
+            lambda i: {
+                "kind": "youtube#playlist",
+                "id": f"PL{_number(channel_id, 10**6):08d}{i:04d}",
+                "snippet": {
+                    "title": f"Playlist {i}",
+                    "thumbnails": _thumbnails(_video_id(i)),
+                },
+            },
+        )
+    if resource == "playlistItems":
+        playlist_id = params["playlistId"]
+        total = _playlist_length(playlist_id)
+        return _page(params, total, lambda i: playlist_item(playlist_id, i))
+    if resource == "commentThreads":
+        video_id = params["videoId"]
+        return _page(
+            params, 400, lambda i: comment_thread(video_id, i), default_size=20
+        )
+    if resource == "comments":
+        parent_id = params["parentId"]
+        return _page(
+            params,
+            REPLIES_PER_THREAD,
+            lambda i: comment(f"{parent_id}.{i}", parent_id[1:12], i),
+            default_size=20,
+        )
+    if resource == "subscriptions":
+        return _page(params, SUBSCRIPTION_COUNT, subscription)
+    if resource == "activities":
+        return _page(params, ACTIVITY_COUNT, activity)
+    return _error(404, "notFound", f"Unknown resource {resource}")
+
+
+async def _inject():
+    delay = max(0.0, rng.gauss(LATENCY_MS, JITTER_MS)) / 1000
+    await asyncio.sleep(delay)
+    if ERROR_RATE and rng.random() < ERROR_RATE:
+        status = rng.choice(ERROR_STATUSES)
+        return _error(status, "backendError", "Injected error")
+    return None
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/youtube/v3/{resource}")
+async def list_endpoint(resource: str, request: Request):
+    error = await _inject()
+    if error is not None:
+        return error
+    params = request.query_params
+    response = list_resource(resource, params)
+    if isinstance(response, Response):
+        return response
+    if params.get("fields"):
+        response = project(response, parse_fields(params["fields"]))
+    return response
+
+
+@app.post("/youtube/v3/{resource}")
+async def insert_endpoint(resource: str, request: Request):
+    error = await _inject()
+    if error is not None:
+        return error
+    body = await request.json()
+    return {
+        "kind": f"youtube#{resource.rstrip('s')}",
+        "id": f"NEW{rng.getrandbits(32):08x}",
+        **body,
+    }
+
+
+@app.delete("/youtube/v3/{resource}")
+async def delete_endpoint(resource: str):
+    error = await _inject()
+    if error is not None:
+        return error
+    return Response(status_code=204)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+    uvicorn.run(
+        app, host=args.host, port=args.port, log_level="warning", access_log=False
+    )
@@ -0,0 +1,308 @@
+"""
+Load test driver.
+
+Boots the fake YouTube API and the application in separate processes, drives
+a request mix with a fixed number of concurrent clients and reports
+throughput and latency percentiles per route. Results are written as JSON
+tagged with the git commit, and can be compared against an earlier run:
+
+    python -m loadtest.run --mix browse --duration 30 --output before.json
+    python -m loadtest.run --mix browse --duration 30 --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+
+from loadtest.scenarios import MIXES, pick
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT = 30
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def git_info() -> Dict:
+    return {
+        "sha": _git("rev-parse", "HEAD"),
+        "subject": _git("log", "-1", "--format=%s"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _spawn(module: str, port: int, env: Dict, cwd: str) -> subprocess.Popen:
+    # Server output goes to a log file in the work directory
+    with open(os.path.join(cwd, f"{module.rsplit('.', 1)[-1]}.log"), "wb") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", module, "--port", str(port)],
+            cwd=cwd,
+            env={**os.environ, "PYTHONPATH": REPO_ROOT, **env},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+
+
+async def _wait_ready(client: httpx.AsyncClient, url: str, process: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: str, latency: float, status: str):
+        self.latencies.setdefault(route, []).append(latency)
+        statuses = self.statuses.setdefault(route, {})
+        statuses[status] = statuses.get(status, 0) + 1
+        if not status.isdigit() or int(status) >= 500:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, duration: float) -> Dict:
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            routes[route] = {
+                "requests": len(latencies),
+                "errors": self.errors.get(route, 0),
+                "rps": round(len(latencies) / duration, 2),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2),
+                "statuses": self.statuses[route],
+            }
+        every = sorted(value for values in self.latencies.values() for value in values)
+        total = {
+            "requests": len(every),
+            "errors": sum(self.errors.values()),
+            "rps": round(len(every) / duration, 2),
+            "p50_ms": round(percentile(every, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(every, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(every, 0.99) * 1000, 2),
+        }
+        return {"routes": routes, "total": total}
+
+
+async def _worker(
+    client: httpx.AsyncClient,
+    routes,
+    rng: random.Random,
+    stop_at: float,
+    record_from: float,
+    recorder: Recorder,
+):
+    while True:
+        route = pick(routes, rng)
+        method, path, params = route.build(rng)
+        start = time.monotonic()
+        if start >= stop_at:
+            return
+        try:
+            response = await client.request(method, path, params=params)
+            await response.aread()
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        if start >= record_from:
+            recorder.record(route.name, time.monotonic() - start, status)
+
+
+async def drive(
+    target: str, mix: str, concurrency: int, duration: float, warmup: float, seed: int
+) -> Dict:
+    recorder = Recorder()
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    async with httpx.AsyncClient(base_url=target, timeout=60, limits=limits) as client:
+        now = time.monotonic()
+        record_from = now + warmup
+        stop_at = record_from + duration
+        await asyncio.gather(
+            *(
+                _worker(
+                    client,
+                    MIXES[mix],
+                    random.Random(seed + worker),
+                    stop_at,
+                    record_from,
+                    recorder,
+                )
+                for worker in range(concurrency)
+            )
+        )
+    return recorder.summary(duration)
+
+
+async def run(args) -> Dict:
+    processes = []
+    target = args.target
+    try:
+        if target is None:
+            workdir = tempfile.mkdtemp(prefix="loadtest-")
+            print(f"servers running in {workdir}", file=sys.stderr)
+            api_port, app_port = _free_port(), _free_port()
+            fake_env = {
+                "FAKE_YT_LATENCY_MS": str(args.latency_ms),
+                "FAKE_YT_JITTER_MS": str(args.jitter_ms),
+                "FAKE_YT_ERROR_RATE": str(args.error_rate),
+                "FAKE_YT_SEED": str(args.seed),
+            }
+            fake_api = _spawn("loadtest.fake_youtube", api_port, fake_env, workdir)
+            processes.append(fake_api)
+            app_env = {
+                "YOUTUBE_API_ENDPOINT": f"http://127.0.0.1:{api_port}/",
+                "ACCESS_LOG_SAMPLE_RATE": "0",
+                # One account drives all the load, its rate limit would cap it
+                "ACCOUNT_REQUESTS_PER_SECOND": "0",
+            }
+            app_server = _spawn("loadtest.app_server", app_port, app_env, workdir)
+            processes.append(app_server)
+            target = f"http://127.0.0.1:{app_port}"
+
+            async with httpx.AsyncClient() as client:
+                await _wait_ready(
+                    client, f"http://127.0.0.1:{api_port}/healthz", fake_api
+                )
+                await _wait_ready(client, f"{target}/metrics", app_server)
+
+        results = await drive(
+            target, args.mix, args.concurrency, args.duration, args.warmup, args.seed
+        )
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    return {
+        "git": git_info(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "target": args.target or "local",
+        },
+        **results,
+    }
+
+
+def print_report(results: Dict, baseline: Dict | None = None):
+    git = results["git"]
+    print(
+        f"commit {git['sha'][:12]}{' (dirty)' if git['dirty'] else ''} {git['subject']}"
+    )
+    print(json.dumps(results["config"]))
+    header = (
+        f"{'route':<24}{'reqs':>8}{'errs':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+    )
+    if baseline:
+        header += f"{'Δrps':>9}{'Δp95':>9}"
+    print(header)
+
+    rows = [*results["routes"].items(), ("TOTAL", results["total"])]
+    for route, stats in rows:
+        line = (
+            f"{route:<24}{stats['requests']:>8}{stats['errors']:>6}{stats['rps']:>9.1f}"
+            f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+        )
+        before = (
+            (baseline["total"] if route == "TOTAL" else baseline["routes"].get(route))
+            if baseline
+            else None
+        )
+        if before:
+            line += f"{_delta(before['rps'], stats['rps']):>9}"
+            line += f"{_delta(before['p95_ms'], stats['p95_ms']):>9}"
+        print(line)
+
+
+def _delta(before: float, after: float) -> str:
+    if not before:
+        return "-"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--mix", choices=sorted(MIXES), default="browse")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds measured")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds not measured")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Fake API latency")
+    parser.add_argument("--jitter-ms", type=float, default=15)
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fake API error rate"
+    )
+    parser.add_argument("--target", help="Drive an already running app instead")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Request mixes for the load tests.
+
+Each route builds one request from a seeded random generator, so a mix sends
+the same sequence of requests on every run and results stay comparable.
+"""
+
+import random
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+QUERIES = ["lofi", "python", "speedrun", "cooking", "synthwave", "chess", "news"]
+LIST_VIEW_FIELDS = "id,snippet(title,publishedAt,thumbnails/medium/url)"
+PLAYLIST_VIEW_FIELDS = "snippet(title,position,resourceId/videoId)"
+
+
+@dataclass
+class Route:
+    name: str
+    weight: int
+    build: Callable[[random.Random], Tuple[str, str, Dict]]  # method, path, params
+
+
+def _video_id(rng: random.Random) -> str:
+    return f"v{rng.randrange(5000):010d}"
+
+
+def _channel_id(rng: random.Random) -> str:
+    return f"UC{rng.randrange(200):022d}"
+
+
+def _playlist_id(rng: random.Random) -> str:
+    return f"PL{rng.randrange(50):032d}"
+
+
+BROWSE = [
+    Route(
+        "search",
+        20,
+        lambda rng: (
+            "GET",
+            "/search/",
+            {"query": rng.choice(QUERIES), "max_results": 25},
+        ),
+    ),
+    Route(
+        "video",
+        20,
+        lambda rng: ("GET", "/videos/", {"video_id": _video_id(rng)}),
+    ),
+    Route(
+        "channel",
+        10,
+        lambda rng: ("GET", "/channels/", {"channel_id": _channel_id(rng)}),
+    ),
+    Route(
+        "channel_videos",
+        10,
+        lambda rng: ("GET", "/channels/videos", {"channel_id": _channel_id(rng)}),
+    ),
+    Route(
+        "playlist_items",
+        10,
+        lambda rng: (
+            "GET",
+            "/playlists/items/",
+            {
+                "playlist_id": _playlist_id(rng),
+                "max_results": 200,
+                "sort_order": "position",
+            },
+        ),
+    ),
+    Route(
+        "comments",
+        15,
+        lambda rng: (
+            "GET",
+            "/comments/",
+            {"video_id": _video_id(rng), "max_results": 20},
+        ),
+    ),
+    Route("home", 10, lambda rng: ("GET", "/home/", {})),
+    Route(
+        "notifications",
+        5,
+        lambda rng: ("GET", "/activities/notifications", {"max_results": 20}),
+    ),
+]
+
+# Large list views, with and without a fields projection
+LISTS = [
+    Route(
+        "playlist_items_sorted",
+        40,
+        lambda rng: (
+            "GET",
+            "/playlists/items/",
+            {
+                "playlist_id": _playlist_id(rng),
+                "max_results": 1000,
+                "sort_order": "newest",
+            },
+        ),
+    ),
+    Route(
+        "playlist_items_fields",
+        30,
+        lambda rng: (
+            "GET",
+            "/playlists/items/",
+            {
+                "playlist_id": _playlist_id(rng),
+                "max_results": 1000,
+                "sort_order": "newest",
+                "fields": PLAYLIST_VIEW_FIELDS,
+            },
+        ),
+    ),
+    Route(
+        "search_fields",
+        30,
+        lambda rng: (
+            "GET",
+            "/search/",
+            {
+                "query": rng.choice(QUERIES),
+                "max_results": 50,
+                "fields": LIST_VIEW_FIELDS,
+            },
+        ),
+    ),
+]
+
+MIXES: Dict[str, List[Route]] = {"browse": BROWSE, "lists": LISTS}
+
+
+def pick(routes: List[Route], rng: random.Random) -> Route:
+    return rng.choices(routes, weights=[route.weight for route in routes])[0]
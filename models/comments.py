@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, Field
 
 
 class AddCommentRequest(BaseModel):
@@ -9,3 +12,15 @@ class AddCommentRequest(BaseModel):
 class AICommentRequest(BaseModel):
     comment_text: str
     category: str
+
+
+class CommentSearchParams(BaseModel):
+    q: str | None = None  # FTS5 query over comment text and author
+    video_id: str | None = None
+    author: str | None = None
+    min_likes: int | None = Field(None, ge=0)
+    published_after: datetime | None = None
+    published_before: datetime | None = None
+    order: Literal["relevance", "likes", "newest", "oldest"] = "relevance"
+    limit: int = Field(50, ge=1, le=500)
+    offset: int = Field(0, ge=0)
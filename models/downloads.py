@@ -1,7 +1,9 @@
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Annotated, List, Literal, Optional
+from pydantic import BaseModel, Field
 from enum import Enum
 
+YOUTUBE_VIDEO_ID_REGEX = r"^[a-zA-Z0-9_-]{11}$"
+
 
 class DownloadStatus(Enum):
     QUEUED = "queued"
@@ -10,6 +12,43 @@ class DownloadStatus(Enum):
     CANCELED = "canceled"
     ERROR = "error"
     MERGED = "merged"
+    POSTPROCESSING = "postprocessing"
+
+
+# Containers yt-dlp can merge into and ffmpeg can remux into
+ContainerFormat = Literal["mp4", "mkv", "webm", "mov"]
+
+
+class PostProcessOperation(str, Enum):
+    REMUX = "remux"
+    EXTRACT_AUDIO = "extract_audio"
+    TRANSCODE = "transcode"
+    EMBED_THUMBNAIL = "embed_thumbnail"
+
+
+class PostProcessOptions(BaseModel):
+    operations: List[PostProcessOperation] = []  # Applied in order
+    remux_format: ContainerFormat = "mp4"
+    audio_format: Literal["mp3", "m4a", "opus", "flac"] = "mp3"
+    video_codec: Literal["h264", "h265", "vp9"] = "h264"
+
+
+class FormatConstraints(BaseModel):
+    max_height: Optional[int] = Field(None, ge=1)
+    max_fps: Optional[float] = Field(None, gt=0)
+    # Most preferred first, e.g. ["av1", "vp9", "h264"] and ["opus", "aac"]
+    video_codecs: List[str] = []
+    audio_codecs: List[str] = []
+    container: Optional[Literal["mp4", "webm"]] = None
+    max_filesize: Optional[int] = Field(None, ge=1)  # Bytes for video and audio
+    audio_only: bool = False
+
+
+class FormatResolveRequest(BaseModel):
+    video_ids: List[Annotated[str, Field(pattern=YOUTUBE_VIDEO_ID_REGEX)]] = Field(
+        ..., min_length=1, max_length=50
+    )
+    constraints: FormatConstraints = FormatConstraints()
 
 
 # Currently not being used - replaced by Query
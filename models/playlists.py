@@ -1,11 +1,15 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Literal, List
 from enum import Enum
 
+from models.downloads import FormatConstraints
+
 
 class SortOrder(str, Enum):
     NEWEST = "newest"
     OLDEST = "oldest"
+    TITLE = "title"
+    POSITION = "position"  # Playlist order, no sorting
 
 
 class PlaylistCreateRequest(BaseModel):
@@ -19,3 +23,19 @@ class PlaylistCreateRequest(BaseModel):
 class PlaylistAddVideosRequest(BaseModel):
     playlist_id: str
     video_ids: str | List[str]  # List of video IDs to add
+
+
+class PlaylistBulkVideosRequest(BaseModel):
+    playlist_id: str
+    video_ids: List[str] = Field(..., min_length=1, max_length=500)
+    concurrency: int = Field(4, ge=1, le=10)  # Parallel API calls
+
+
+class PlaylistMirrorRequest(BaseModel):
+    playlist_id: str
+    output_dir: str
+    constraints: FormatConstraints = FormatConstraints()
+    output_format: Literal["mp4", "mkv", "webm"] = "mp4"
+    prune: bool = False  # Delete downloads of videos removed from the playlist
+    interval_minutes: int = Field(60, ge=5, le=7 * 24 * 60)
+    enabled: bool = True
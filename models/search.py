@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Literal
+from typing import List, Literal
 
 
 class YouTubeSearchParams(BaseModel):
@@ -14,7 +14,17 @@ class YouTubeSearchParams(BaseModel):
     order: Literal["relevance", "date", "rating", "viewCount"] = "relevance"
     publishedAfter: datetime | None = None
     publishedBefore: datetime | None = None
+    channelId: str | None = None  # Only search this channel's videos
 
 
 class SearchRecordAddRequest(BaseModel):
     query: str
+
+
+class MultiSearchRequest(BaseModel):
+    queries: List[YouTubeSearchParams] = Field(..., min_length=1, max_length=10)
+    # rrf: reciprocal rank fusion, frequency: matched by most queries first,
+    # first_seen: in the order results arrived
+    ranking: Literal["rrf", "frequency", "first_seen"] = "rrf"
+    concurrency: int = Field(4, ge=1, le=10)  # Parallel search.list calls
+    max_results: int = Field(50, ge=1, le=500)  # Of the merged list
@@ -1,11 +1,16 @@
+import asyncio
+import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from sqlalchemy.orm import Session
+from typing import AsyncGenerator, List, Optional
 
+from core.activities import ensure_poller
+from db.db import get_db
 from dependencies.dependency import get_credentials
+from schemas.schemas import ActivityRecord
 
 router = APIRouter(prefix="/activities", tags=["Activities"])
 
@@ -24,47 +29,62 @@ class NotificationsResponse(BaseModel):
     notifications: List[NotificationItem]
 
 
-def fetch_youtube_notifications(credentials) -> List[NotificationItem]:
-    """
-    Fetches the user's YouTube notifications using the YouTube Data API v3.
-    """
-    try:
-        service = build("youtube", "v3", credentials=credentials)
-
-        # Assuming notifications can be fetched from "activities" endpoint
-        request = service.activities().list(
-            part="snippet",
-            mine=True,
-            maxResults=10,  # Adjust as needed
-        )
-        response = request.execute()
+FIRST_POLL_TIMEOUT = 10  # Seconds a first page load waits for the initial poll
+HEARTBEAT_INTERVAL = 15
 
-        notifications = []
-        for item in response.get("items", []):
-            snippet = item.get("snippet", {})
-            title = snippet.get("title", "No Title")
-            description = snippet.get("description", "")
-            link = f"https://www.youtube.com/watch?v={snippet.get('resourceId', {}).get('videoId', '')}"
 
-            notifications.append(
-                NotificationItem(title=title, description=description, link=link)
-            )
-
-        return notifications
-
-    except HttpError as e:
-        logger.error(f"YouTube API error: {e}")
-        raise HTTPException(status_code=e.resp.status, detail=f"YouTube API error: {e}")
-
-    except Exception as e:
-        logger.exception("Unexpected error fetching YouTube notifications")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+def to_notification(record: ActivityRecord) -> NotificationItem:
+    return NotificationItem(
+        title=record.title or "No Title",
+        description=record.description or "",
+        link=f"https://www.youtube.com/watch?v={record.video_id or ''}",
+    )
 
 
 @router.get("/notifications", response_model=NotificationsResponse)
-async def get_notifications(credentials=Depends(get_credentials)):
+async def get_notifications(
+    max_results: int = Query(10, ge=1, le=200),
+    credentials=Depends(get_credentials),
+    db: Session = Depends(get_db),
+):
     """
-    FastAPI endpoint to get user's YouTube notifications.
+    FastAPI endpoint to get user's YouTube notifications from the local activity store.
     """
-    notifications = fetch_youtube_notifications(credentials)
-    return {"notifications": notifications}
+    poller = ensure_poller(credentials)
+    try:
+        await asyncio.wait_for(poller.ready.wait(), timeout=FIRST_POLL_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Serving notifications before the first activity poll")
+
+    records = (
+        db.query(ActivityRecord)
+        .filter(ActivityRecord.account == poller.account)
+        .order_by(ActivityRecord.published_at.desc())
+        .limit(max_results)
+        .all()
+    )
+    return {"notifications": [to_notification(record) for record in records]}
+
+
+@router.get("/stream")
+async def stream_activities(request: Request, credentials=Depends(get_credentials)):
+    """Pushes new activities via SSE as the background poller detects them."""
+    poller = ensure_poller(credentials)
+    queue = poller.subscribe()
+
+    async def event_generator() -> AsyncGenerator[str, None]:
+        try:
+            while not await request.is_disconnected():
+                try:
+                    activity = await asyncio.wait_for(
+                        queue.get(), timeout=HEARTBEAT_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"data: {json.dumps(activity)}\n\n"
+        finally:
+            poller.unsubscribe(queue)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
@@ -0,0 +1,53 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+
+from core.profiling import ADMIN_PREFIX, PROFILE_TOKEN, profile_store
+
+
+def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    if PROFILE_TOKEN is not None and x_profile_token != PROFILE_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+
+router = APIRouter(
+    prefix=ADMIN_PREFIX,
+    tags=["Admin"],
+    dependencies=[Depends(require_profile_token)],
+)
+
+
+def _get_record(profile_id: int):
+    record = profile_store.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return record
+
+
+@router.get("/")
+async def list_profiles():
+    """Most recent request profiles, newest first."""
+    return {"profiles": profile_store.list()}
+
+
+@router.get("/{profile_id}", response_class=PlainTextResponse)
+async def get_profile_summary(
+    profile_id: int,
+    sort: Literal["cumulative", "tottime", "calls"] = "cumulative",
+    limit: int = Query(40, ge=1, le=500),
+):
+    """Text summary of one profile, as printed by pstats."""
+    return PlainTextResponse(_get_record(profile_id).summary(sort, limit))
+
+
+@router.get("/{profile_id}/download")
+async def download_profile(profile_id: int):
+    """Raw profile in .prof format, for pstats or snakeviz."""
+    return Response(
+        _get_record(profile_id).dump(),
+        media_type="application/octet-stream",
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'
+        },
+    )
@@ -1,51 +1,157 @@
-from googleapiclient.discovery import build
+from datetime import datetime
+from typing import Optional
 from googleapiclient.errors import HttpError
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.orm import Session
 
-from dependencies.dependency import get_credentials
+from core.channel_catalog import (
+    CATALOG_TTL,
+    is_local_page_token,
+    query_channel_videos,
+    schedule_catalog_refresh,
+    sync_channel_catalog,
+)
+from core.fields import FieldTree, format_fields, list_fields, project
+from core.local_store import is_valid_local_page_token
+from core.prefetch import page_cache
+from core.quota import SEARCH_LIST_COST
+from core.responses import json_response
+from core.youtube import account_key, build_youtube, execute_async
+from db.db import get_db
+from dependencies.dependency import get_credentials, get_fields
 from models.channels import ChannelSearchParams
+from schemas.schemas import ChannelCatalog
 
 router = APIRouter(prefix="/channels", tags=["Channels"])
 
 
 @router.get("/")
-async def get_channel_info(channel_id: str, credentials=Depends(get_credentials)):
-    youtube = build("youtube", "v3", credentials=credentials)
+async def get_channel_info(
+    channel_id: str,
+    fields: Optional[FieldTree] = Depends(get_fields),
+    credentials=Depends(get_credentials),
+):
+    youtube = build_youtube(credentials)
+    response_fields = list_fields(fields) if fields else None
     try:
         response = (
-            youtube.channels().list(part="snippet,statistics", id=channel_id).execute()
+            youtube.channels()
+            .list(
+                part="snippet,statistics",
+                id=channel_id,
+                fields=format_fields(response_fields) if fields else None,
+            )
+            .execute()
         )
         if not response.get("items"):
             raise HTTPException(status_code=404, detail="Channel not found.")
 
-        return response
+        return json_response(project(response, response_fields))
     except HttpError as e:
         raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
 
 
+# search.list only knows "high" and "standard" definitions
+API_DEFINITIONS = {
+    "any": "any",
+    "high": "high",
+    "medium": "standard",
+    "low": "standard",
+}
+
+
+def _channel_videos_request(
+    youtube,
+    request: ChannelSearchParams,
+    page_token: str | None,
+    fields: str | None = None,
+):
+    return youtube.search().list(
+        part=request.part,
+        channelId=request.channel_id,
+        maxResults=request.max_results,
+        pageToken=page_token,  # If provided, fetch the next page
+        order=request.order,  # Order videos by date (most recent first)
+        type="video",  # Filter results to include only videos
+        videoType=request.videoType,
+        videoDefinition=API_DEFINITIONS[request.videoDefinition],
+        videoDuration=request.videoDuration,
+        publishedAfter=(
+            request.publishedAfter.isoformat() if request.publishedAfter else None
+        ),
+        publishedBefore=(
+            request.publishedBefore.isoformat() if request.publishedBefore else None
+        ),
+        fields=fields,
+    )
+
+
 @router.get("/videos")
 async def get_channel_sections(
-    request: ChannelSearchParams = Depends(), credentials=Depends(get_credentials)
+    request: ChannelSearchParams = Depends(),
+    prefetch: bool = Query(False, description="Prefetch the next page"),
+    fields: Optional[FieldTree] = Depends(get_fields),
+    credentials=Depends(get_credentials),
+    db: Session = Depends(get_db),
 ):
-    youtube = build("youtube", "v3", credentials=credentials)
+    response_fields = list_fields(fields) if fields else None
+
+    # Synced channels are served from the local catalog
+    catalog = db.get(ChannelCatalog, request.channel_id)
+    if request.page_token and is_local_page_token(request.page_token):
+        # Local offsets only mean something against a catalog
+        if not catalog or not is_valid_local_page_token(request.page_token):
+            raise HTTPException(status_code=400, detail="Invalid page token")
+    if catalog and is_local_page_token(request.page_token):
+        if (datetime.now() - catalog.synced_at).total_seconds() > CATALOG_TTL:
+            schedule_catalog_refresh(credentials, request.channel_id)
+        return json_response(
+            project(query_channel_videos(db, request), response_fields)
+        )
+
+    upstream_fields = format_fields(response_fields) if fields else None
+
+    async def fetch(page_token):
+        return await execute_async(
+            credentials,
+            lambda youtube: _channel_videos_request(
+                youtube, request, page_token, upstream_fields
+            ),
+        )
+
     try:
-        response = (
-            youtube.search()
-            .list(
-                part=request.part,
-                channelId=request.channel_id,
-                maxResults=request.max_results,
-                pageToken=request.page_token,  # If provided, fetch the next page
-                order=request.order,  # Order videos by date (most recent first)
-                type=request.videoType,  # Filter results to include only videos
-            )
-            .execute()
+        response = await page_cache.get_page(
+            "channel_videos",
+            account_key(credentials),
+            {
+                **request.model_dump(mode="json", exclude={"page_token"}),
+                "fields": upstream_fields,
+            },
+            request.page_token,
+            fetch,
+            prefetch=prefetch,
+            cost=SEARCH_LIST_COST,
         )
         if not response.get("items"):
             raise HTTPException(status_code=404, detail="Channel not found.")
 
-        return response
+        return json_response(project(response, response_fields))
+    except HttpError as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
+
+
+@router.post("/catalog/sync")
+async def sync_catalog(
+    channel_id: str,
+    credentials=Depends(get_credentials),
+    db: Session = Depends(get_db),
+):
+    """
+    Mirrors a channel's uploads into the local catalog, fetching only new videos.
+    """
+    try:
+        return await sync_channel_catalog(credentials, db, channel_id)
     except HttpError as e:
         raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
 
@@ -58,7 +164,7 @@ async def get_channel_cover_photo(
     # Append to the end of the low resolution image
     BANNER_URL_WORKAROUND = "=w2120-fcrop64=1,00005a57ffffa5a8-k-c0xffffffff-no-nd-rj"
 
-    youtube = build("youtube", "v3", credentials=credentials)
+    youtube = build_youtube(credentials)
     try:
         response = (
             youtube.channels().list(part="brandingSettings", id=channel_id).execute()
@@ -72,9 +178,9 @@ async def get_channel_cover_photo(
             else None
         )
         return {
-            "cover_photo_url": cover_photo_url + BANNER_URL_WORKAROUND
-            if cover_photo_url
-            else None,
+            "cover_photo_url": (
+                cover_photo_url + BANNER_URL_WORKAROUND if cover_photo_url else None
+            ),
             "response": response,
         }
     except HttpError as e:
@@ -1,20 +1,38 @@
-import os
-import google.generativeai as genai
+import asyncio
+import json
+import logging
 
-from dotenv import load_dotenv
 from fastapi import APIRouter, Depends, Query
 from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
 from googleapiclient.errors import HttpError
-from googleapiclient.discovery import build
-
-from models.comments import AddCommentRequest, AICommentRequest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from core.ai import comment_generator
+from core.comment_store import (
+    search_comments,
+    store_comment_threads,
+    sync_video_comments,
+)
+from core.comments import export_comment_threads
+from core.youtube import build_youtube
+from db.db import SessionLocal, get_db
+from models.comments import AddCommentRequest, AICommentRequest, CommentSearchParams
 from dependencies.dependency import get_credentials
 
 router = APIRouter(prefix="/comments", tags=["Comments"])
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+async def _index_threads(db: Session, threads):
+    """Store fetched threads for local search, failing only costs searchability."""
+    try:
+        await asyncio.to_thread(store_comment_threads, db, threads)
+    except Exception as e:
+        logger.warning(f"Indexing comments failed: {e}")
+        await asyncio.to_thread(db.rollback)
 
 
 @router.get("/")
@@ -23,9 +41,10 @@ async def get_video_comments(
     max_results: int = Query(10, ge=1, le=100),
     page_token: str | None = None,
     youtube=Depends(get_credentials),
+    db: Session = Depends(get_db),
 ):
     try:
-        youtube = build("youtube", "v3", credentials=youtube)
+        youtube = build_youtube(youtube)
         # Make the API request to get comments
         request_params = {
             "part": "snippet",
@@ -38,6 +57,8 @@ async def get_video_comments(
 
         request = youtube.commentThreads().list(**request_params)
         response = request.execute()
+        # Keep fetched comments searchable locally
+        await _index_threads(db, response.get("items", []))
 
         # Only return necessary data
         return {
@@ -49,6 +70,65 @@ async def get_video_comments(
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
 
 
+@router.get("/export")
+async def export_video_comments(
+    video_id: str,
+    page_token: str | None = Query(None, description="Checkpoint token to resume from"),
+    concurrency: int = Query(4, ge=1, le=10),
+    credentials=Depends(get_credentials),
+):
+    """
+    Streams all comment threads of a video, including every reply, as NDJSON.
+    Exported comments are stored in the local comment index as well.
+    """
+    db = SessionLocal()
+
+    async def stream():
+        try:
+            async for line in export_comment_threads(
+                credentials,
+                video_id,
+                page_token,
+                concurrency,
+                on_page=lambda threads: _index_threads(db, threads),
+            ):
+                yield line
+        finally:
+            db.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post("/sync")
+async def sync_comments(
+    video_id: str,
+    credentials=Depends(get_credentials),
+    db: Session = Depends(get_db),
+):
+    """
+    Stores the comment threads posted since the last sync of a video.
+    """
+    try:
+        return await sync_video_comments(credentials, db, video_id)
+    except HttpError as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+
+
+@router.get("/search")
+def search_stored_comments(
+    params: CommentSearchParams = Depends(), db: Session = Depends(get_db)
+):
+    """
+    Searches locally stored comments without calling the YouTube API.
+    """
+    try:
+        comments = search_comments(db, **params.model_dump())
+    except OperationalError as e:
+        # Malformed FTS5 query syntax
+        raise HTTPException(status_code=400, detail=f"Invalid query: {e.orig}")
+    return {"comments": comments}
+
+
 @router.post("/add")
 async def add_comment(
     request: AddCommentRequest,
@@ -67,7 +147,7 @@ async def add_comment(
         }
 
         # Build the YouTube API client
-        youtube = build("youtube", "v3", credentials=credentials)
+        youtube = build_youtube(credentials)
 
         # Call the YouTube API to insert the comment
         response = youtube.commentThreads().insert(part="snippet", body=body).execute()
@@ -91,26 +171,26 @@ async def add_comment(
 
 @router.get("/ai")
 async def generate_comment(request: AICommentRequest = Depends()):
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-
-    model = genai.GenerativeModel(model_name="gemini-1.5-flash")
-    response = model.generate_content(
-        f"Please improve this comment by making it more {request.category}: {request.comment_text}"
+    # The model client, worker pool and result cache are shared across requests
+    categorized_comments = await comment_generator.generate(
+        request.comment_text, request.category
     )
-    text_response = response.text.split("\n")
-
-    # Clean and categorize comments
-    categorized_comments = {}
-    current_category = None
-    for line in text_response:
-        line = line.strip()  # Remove leading/trailing whitespace
-        if line.startswith("**") and line.endswith("**"):  # Detect category headers
-            current_category = line.strip("**")
-            categorized_comments[current_category] = []
-        elif line and current_category:  # Add comments to the current category
-            categorized_comments[current_category].append(line)
-
     return {
         "message": "Comment generated successfully.",
         "comments": categorized_comments,
     }
+
+
+@router.get("/ai/stream")
+async def stream_generated_comment(request: AICommentRequest = Depends()):
+    """
+    Streams generated comments as NDJSON, one line per suggestion as it is produced.
+    """
+
+    async def stream():
+        async for suggestion in comment_generator.stream(
+            request.comment_text, request.category
+        ):
+            yield json.dumps(suggestion) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
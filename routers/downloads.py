@@ -1,37 +1,56 @@
 import os
 import asyncio
 import json
-import time
+import mimetypes
+import re
 import subprocess
 
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Depends
-from fastapi.responses import StreamingResponse
-from typing import Dict, Any, AsyncGenerator, Optional
-from yt_dlp import YoutubeDL
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Depends, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import AsyncGenerator, List, Literal, Optional
 from sqlalchemy.orm import Session
 
 from schemas.schemas import Download
 
 # Replace these with the imports and definitions of your custom classes and enums
 from core.downloads import (
-    DownloadTask,
     DownloadStatus,
+    download_tasks,
+    find_download_file,
+    start_download,
 )  # Example import
-
-from dependencies.dependency import validate_video_id
-from models.downloads import DownloadRequest, CancelParams
+from core.formats import (
+    FormatsUnavailable,
+    get_video_formats,
+    resolve_format,
+    video_formats_cache,
+)
+from core.diskspace import (
+    InsufficientSpace,
+    disk_space,
+    estimate_download_size,
+    required_space,
+)
+from core.postprocess import postprocess_pool
+from core.responses import SendfileResponse, accel_redirect_uri
+from core.throughput import fleet_throughput
+
+from dependencies.dependency import YOUTUBE_VIDEO_ID_REGEX, validate_video_id
+from models.downloads import (
+    ContainerFormat,
+    DownloadRequest,
+    CancelParams,
+    FormatResolveRequest,
+    PostProcessOperation,
+    PostProcessOptions,
+)
 from db.db import get_db
 
 # Router definition
 router = APIRouter(prefix="/downloads", tags=["Downloads"])
 
-# In-memory tasks and cache
-download_tasks: Dict[str, DownloadTask] = {}
-video_formats_cache: Dict[str, Dict[str, Any]] = {}
-cache_expiration_time = 60 * 30  # Cache expiration time in seconds
-# semaphore = asyncio.Semaphore(5)  # Limit to 5 concurrent extractions
-
 
 @router.get("/download/")
 async def initiate_download(
@@ -42,52 +61,92 @@ async def initiate_download(
     video_format_id: str = Query(..., description="Format ID for video"),
     audio_format_id: str = Query(..., description="Format ID for audio"),
     output_filename: str = Query(..., description="Output filename"),
-    output_format: Optional[str] = Query("mp4", description="Output file format"),
+    output_format: ContainerFormat = Query("mp4", description="Output file format"),
     output_dir: str = Query("./tmp", description="Output directory"),
+    postprocess: List[PostProcessOperation] = Query(
+        [], description="Post-processing steps, applied in order after the download"
+    ),
+    audio_format: str = Query("mp3", description="Format for extract_audio"),
+    video_codec: str = Query("h264", description="Codec for transcode"),
     db: Session = Depends(get_db),
 ):
-    def cleanup_task(video_id: str):
-        # Remove the task from download_tasks once it's complete or canceled
-        download_tasks.pop(video_id, None)
-
-    # Check for existing downloads with the same video_id
-    existing_download = db.query(Download).filter_by(video_id=video_id).first()
-
-    # If an existing download is cancelled or errored, delete it
-    if existing_download:
-        try:
-            db.delete(existing_download)
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(
-                status_code=500, detail=f"Error removing existing download: {str(e)}"
-            )
+    try:
+        postprocess_options = PostProcessOptions(
+            operations=postprocess,
+            remux_format=output_format,
+            audio_format=audio_format,
+            video_codec=video_codec,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    # Create and store a DownloadTask for each video with the cleanup callback
-    task = DownloadTask(
-        video_id=video_id,
-        video_title=output_filename,
-        on_complete=cleanup_task,
-        db=db,
+    # Sizes come from formats already fetched for the picker, unknown ones count 0
+    cached_formats = video_formats_cache.get(video_id, {}).get("data", {})
+    download_size = estimate_download_size(
+        cached_formats.get("formats", []), [video_format_id, audio_format_id]
     )
+    needed_space = required_space(download_size, bool(postprocess))
+    try:
+        disk_space.check(output_dir, needed_space)
+    except InsufficientSpace as e:
+        raise HTTPException(status_code=507, detail=str(e))
 
-    # task = DownloadTask(video_id, on_complete=cleanup_task, db=db)
-    download_tasks[video_id] = task
-    # Schedule the background download task
-    background_tasks.add_task(
-        task.download,
-        channel_title,
-        quality,
-        video_format_id,
-        audio_format_id,
-        output_filename,
-        output_format,
-    )
+    try:
+        start_download(
+            background_tasks,
+            db,
+            video_id,
+            video_format_id,
+            audio_format_id,
+            output_filename,
+            channel_title=channel_title,
+            quality=quality,
+            output_format=output_format,
+            output_dir=output_dir,
+            postprocess_options=postprocess_options,
+            needed_space=needed_space,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
     return {"message": "Download started", "video_ids": video_id}
 
 
+@router.get("/postprocess/stats")
+async def get_postprocess_stats():
+    """Workers, running and queued jobs of the post-processing pool."""
+    return postprocess_pool.stats()
+
+
+@router.get("/disk")
+async def get_disk_reservations():
+    """Space reserved by queued and running downloads, per filesystem."""
+    return {"filesystems": disk_space.stats()}
+
+
+@router.get("/throughput")
+async def get_fleet_throughput(points: int = Query(100, ge=1, le=600)):
+    """Combined throughput of all downloads and task counts per status."""
+    return fleet_throughput.summary(points)
+
+
+@router.get("/throughput/{video_id}")
+async def get_download_throughput(
+    video_id: str, points: int = Query(100, ge=1, le=600)
+):
+    """Downsampled bytes and rate over time for one download."""
+    if video_id not in download_tasks:
+        raise HTTPException(
+            status_code=404, detail=f"Download with id: '{video_id}' not found"
+        )
+    task = download_tasks[video_id]
+    return {
+        "video_id": video_id,
+        "status": task.status.value,
+        **task.throughput.summary(points),
+    }
+
+
 @router.get("/progress/{video_id}")
 async def stream_progress(video_id: str) -> StreamingResponse:
     """Streams download progress data via SSE."""
@@ -99,7 +158,11 @@ async def stream_progress(video_id: str) -> StreamingResponse:
     task = download_tasks[video_id]
 
     async def event_generator() -> AsyncGenerator[str, None]:
-        while task.status not in {DownloadStatus.COMPLETE, DownloadStatus.CANCELED}:
+        while task.status not in {
+            DownloadStatus.COMPLETE,
+            DownloadStatus.CANCELED,
+            DownloadStatus.ERROR,
+        }:
             progress_data = {
                 "video_id": task.video_id,
                 "downloaded_bytes": task.downloaded_bytes,
@@ -145,72 +208,55 @@ async def cancel_downloads(params: CancelParams):
     }
 
 
-async def fetch_video_formats(video_id: str):
-    """Fetch video formats with yt-dlp for a given video ID."""
-    ydl_opts = {
-        "skip_download": True,
-        "quiet": False,
-        "verbose": True,
-    }
-    # async with semaphore:  # Limit concurrency
+@router.get("/formats/{video_id}")
+async def get_formats(video_id: str):
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            info = await asyncio.to_thread(
-                ydl.extract_info,
-                f"https://www.youtube.com/watch?v={video_id}",
-            )
-            formats = [
-                {
-                    "format_id": f["format_id"],
-                    "ext": f["ext"],
-                    "resolution": f.get("resolution"),
-                    "vcodec": f.get("vcodec"),
-                    "acodec": f.get("acodec"),
-                    "filesize": f.get("filesize"),
-                    "fps": f.get("fps"),
-                    "type": (
-                        "video+audio"
-                        if f.get("vcodec") != "none" and f.get("acodec") != "none"
-                        else (
-                            "video-only" if f.get("vcodec") != "none" else "audio-only"
-                        )
-                    ),
-                }
-                for f in info.get("formats", [])
-            ]
-
-            return {
-                "video_id": video_id,
-                "title": info.get("title"),
-                "formats": formats,
-            }
-    except Exception as e:
-        print(f"Error fetching video formats for {video_id}: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail="An unexpected error occurred while fetching formats.",
-        )
-
-
-async def get_video_formats(video_id: str):
-    """Get video formats from cache or fetch them if not cached."""
-    current_time = time.time()
-
-    # Check cache first
-    if video_id in video_formats_cache:
-        cache_entry = video_formats_cache[video_id]
-        # if current_time - cache_entry["timestamp"] < cache_expiration_time:
-        return cache_entry["data"]
-
-    # Fetch data if not in cache or expired
-    data = await fetch_video_formats(video_id)
-    video_formats_cache[video_id] = {"data": data, "timestamp": current_time}
-    return data
+        return await get_video_formats(video_id)
+    except FormatsUnavailable as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/formats/resolve")
+async def resolve_formats(request: FormatResolveRequest):
+    """
+    Picks the best format pair for each video under the given constraints.
+
+    Cached formats are used as they are, missing ones are extracted
+    concurrently. The returned format can be passed as quality, or its IDs
+    as video_format_id and audio_format_id.
+    """
+    video_ids = list(dict.fromkeys(request.video_ids))
+    misses = [video_id for video_id in video_ids if video_id not in video_formats_cache]
+    fetched = await asyncio.gather(
+        *(get_video_formats(video_id) for video_id in misses), return_exceptions=True
+    )
+    errors = {
+        video_id: str(result)
+        for video_id, result in zip(misses, fetched)
+        if isinstance(result, Exception)
+    }
 
+    results = []
+    for video_id in video_ids:
+        if video_id in errors:
+            results.append({"video_id": video_id, "error": errors[video_id]})
+            continue
+        data = video_formats_cache[video_id]["data"]
+        selection = resolve_format(
+            data["formats"], request.constraints, data.get("duration")
+        )
+        if selection is None:
+            results.append(
+                {"video_id": video_id, "error": "No format matches the constraints"}
+            )
+            continue
+        results.append({"video_id": video_id, "title": data["title"], **selection})
 
-@router.get("/formats/{video_id}")
-async def get_formats(video_id: str):
-    return await get_video_formats(video_id)
+    return {
+        "results": results,
+        "cached": len(video_ids) - len(misses),
+        "extracted": len(misses) - len(errors),
+    }
 
 
 @router.post("/download/sub")
@@ -246,6 +292,89 @@ async def download_video(request: DownloadRequest):
         )
 
 
+def _not_modified(request: Request, etag: str, last_modified: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # Weak comparison, W/ prefixes are ignored
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            return parsedate_to_datetime(last_modified) <= since
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@router.get("/file/{video_id}")
+async def get_download_file(
+    request: Request,
+    video_id: str,
+    ext: Optional[str] = Query(None, description="Pick the file with this extension"),
+    disposition: Literal["attachment", "inline"] = Query("attachment"),
+    db: Session = Depends(get_db),
+):
+    """
+    Serves a finished download, with Range requests and conditional GET.
+    """
+    if not re.match(YOUTUBE_VIDEO_ID_REGEX, video_id):
+        raise HTTPException(status_code=400, detail="Invalid video ID")
+
+    task = download_tasks.get(video_id)
+    if task:
+        if task.status != DownloadStatus.COMPLETE:
+            raise HTTPException(
+                status_code=409, detail=f"Download is {task.status.value}"
+            )
+        output_dir = task.output_dir
+    else:
+        record = db.query(Download).filter_by(video_id=video_id).first()
+        if record is None:
+            raise HTTPException(
+                status_code=404, detail=f"Download with id: '{video_id}' not found"
+            )
+        output_dir = record.output_dir
+
+    if task and task.output_path and ext is None:
+        path = task.output_path
+    else:
+        path = await asyncio.to_thread(find_download_file, output_dir, video_id, ext)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, path) if path else None
+    except FileNotFoundError:
+        stat_result = None
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Downloaded file not found")
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    response = SendfileResponse(
+        path,
+        media_type=media_type,
+        filename=os.path.basename(path),
+        stat_result=stat_result,
+        content_disposition_type=disposition,
+    )
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+    if _not_modified(request, etag, last_modified):
+        return Response(
+            status_code=304, headers={"ETag": etag, "Last-Modified": last_modified}
+        )
+
+    accel_uri = accel_redirect_uri(path)
+    if accel_uri:
+        # nginx serves the file itself, including ranges, with sendfile
+        return Response(
+            headers={
+                "X-Accel-Redirect": accel_uri,
+                "Content-Type": media_type,
+                "Content-Disposition": response.headers["content-disposition"],
+            }
+        )
+    return response
+
+
 @router.get("/open_folder/{video_id}")
 async def open_folder(video_id: str):
     # Ensure the video ID exists in the task manager
@@ -1,9 +1,8 @@
-import random
 from googleapiclient.errors import HttpError
-from googleapiclient.discovery import build
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Dict
+from core.feed import get_feed_uploads, sample_feed
 from dependencies.dependency import get_credentials
 
 router = APIRouter(prefix="/home", tags=["Home Feed"])
@@ -27,50 +26,14 @@ def get_trending_videos(youtube) -> List[Dict]:
 
 
 @router.get("/")
-def get_homefeed(credentials=Depends(get_credentials)):
-    youtube = build("youtube", "v3", credentials=credentials)
+async def get_homefeed(
+    refresh: bool = Query(False, description="Rebuild the cached feed"),
+    credentials=Depends(get_credentials),
+):
     try:
-        # Step 1: Fetch 30 subscribed channels
-        subscriptions = (
-            youtube.subscriptions()
-            .list(part="snippet", mine=True, maxResults=5)
-            .execute()
-        )
-
-        channel_ids = [
-            item["snippet"]["resourceId"]["channelId"]
-            for item in subscriptions.get("items", [])
-        ]
-
-        videos = []
-
-        # Step 2: Fetch 1-3 random videos per channel
-        for channel_id in channel_ids:
-            num_videos = random.randint(1, 3)
-            request = youtube.search().list(
-                part="snippet",
-                channelId=channel_id,
-                order="date",
-                maxResults=num_videos,
-            )
-            response = request.execute()
-
-            for item in response.get("items", []):
-                if "id" in item and item["id"].get("kind") == "youtube#video":
-                    videos.append(
-                        {
-                            "title": item["snippet"]["title"],
-                            "videoId": item["id"]["videoId"],
-                            "thumbnail": item["snippet"]["thumbnails"]["high"]["url"],
-                            "channelTitle": item["snippet"]["channelTitle"],
-                        }
-                    )
-
-        # Step 3: Trim to exactly 50 videos
-        random.shuffle(videos)  # Shuffle to keep it dynamic
-        videos = videos[:10]
-
-        return {"videos": videos}
+        # Uploads are cached per user and refreshed in the background once stale
+        uploads = await get_feed_uploads(credentials, refresh=refresh)
+        return {"videos": sample_feed(uploads)}
 
     except HttpError as e:
         if e.resp.status == 403 and "quota" in e.content.decode():
@@ -1,11 +1,33 @@
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import (
+    APIRouter,
+    Cookie,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    UploadFile,
+    status,
+)
 from fastapi.responses import RedirectResponse
 from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
 from google.auth.exceptions import RefreshError
+from typing import List, Optional
+import logging
 import os
-import json
+
+from core.accounts import (
+    DEFAULT_ACCOUNT_FALLBACK,
+    SessionAccounts,
+    add_session_account,
+    credential_cache,
+    default_account_id,
+    delete_account,
+    list_accounts,
+    load_session,
+    save_account,
+    select_session_account,
+)
+from core.youtube import account_key, build_youtube
 
 router = APIRouter(prefix="/oauth2", tags=["Ouath2"])
 
@@ -19,10 +41,12 @@ SCOPES = [
     "https://www.googleapis.com/auth/youtube.readonly",
     "https://www.googleapis.com/auth/youtube.force-ssl",
 ]
-TOKEN_DIR = "creds"
-TOKEN_FILE = "token.json"
-TOKEN_FULL_PATH = os.path.join(TOKEN_DIR, TOKEN_FILE)
 REDIRECT_URI = "http://localhost:8000/oauth2/oauth2callback"
+# Issued by the OAuth callback, the accounts authorized in a browser hang off it
+SESSION_COOKIE = "session_id"
+SESSION_COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
 
 
 def initiate_flow():
@@ -38,24 +62,86 @@ def initiate_flow():
     return flow
 
 
-def authenticate_youtube():
+def current_session(
+    session_id: Optional[str] = Cookie(None),
+) -> Optional[SessionAccounts]:
+    return load_session(session_id) if session_id else None
+
+
+def session_account_ids(
+    session: Optional[SessionAccounts] = Depends(current_session),
+) -> List[str]:
+    """Accounts authorized in the caller's session."""
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="No account session"
+        )
+    return session.accounts
+
+
+def selected_account_id(
+    x_account_id: Optional[str] = Header(None),
+    session: Optional[SessionAccounts] = Depends(current_session),
+) -> Optional[str]:
+    """
+    The account of a request: the X-Account-Id header, else the one selected
+    in the session. Only accounts authorized in the session can be used.
+    """
+    if session is None:
+        if x_account_id is None and DEFAULT_ACCOUNT_FALLBACK:
+            return default_account_id()
+        return None
+    if x_account_id is None:
+        return session.selected
+    if x_account_id not in session.accounts:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Account not authorized in this session: {x_account_id}",
+        )
+    return x_account_id
+
+
+def optional_credentials(account_id: Optional[str] = Depends(selected_account_id)):
+    """Credentials of the selected account, None when no account is selected."""
+    if account_id is None:
+        return None
     try:
-        if os.path.exists(TOKEN_FULL_PATH):
-            with open(TOKEN_FULL_PATH, "r") as token_file:
-                credentials_data = json.load(token_file)
-                credentials = Credentials.from_authorized_user_info(
-                    credentials_data, SCOPES
-                )
-        if credentials and credentials.expired and credentials.refresh_token:
-            credentials.refresh(Request())
-            # Save the refreshed credentials
-            with open(TOKEN_FULL_PATH, "w") as token_file:
-                token_file.write(credentials.to_json())
-        return credentials
+        credentials = credential_cache.get(account_id)
     except RefreshError as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Unknown account: {account_id}",
+        )
+    return credentials
+
+
+def authenticate_youtube(credentials=Depends(optional_credentials)):
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No account selected, authorize via /oauth2/authorize",
+        )
+    return credentials
+
+
+def _identify(credentials):
+    """Channel ID and title of the authorized account (1 quota unit)."""
+    try:
+        response = (
+            build_youtube(credentials)
+            .channels()
+            .list(part="snippet", mine=True)
+            .execute()
+        )
+        channel = response["items"][0]
+        return channel["id"], channel["snippet"]["title"]
+    except Exception as e:
+        logger.warning(f"Could not identify the authorized channel: {e}")
+        return account_key(credentials), None
 
 
 @router.get("/authorize")
@@ -71,32 +157,62 @@ def authorize():
 
 
 @router.get("/oauth2callback")
-def oauth2callback(code: str):
+def oauth2callback(code: str, session_id: Optional[str] = Cookie(None)):
     flow = initiate_flow()
     flow.fetch_token(code=code)
     credentials = flow.credentials
 
-    # Save credentials to a token file (or database for multi-user support)
-    with open(TOKEN_FULL_PATH, "w") as token_file:
-        token_file.write(credentials.to_json())
+    # Stored as its own account, authorized and selected in this browser's session
+    account_id, title = _identify(credentials)
+    save_account(account_id, credentials, title)
+    session_id = add_session_account(session_id, account_id)
+
+    # Redirect back to your React app, adjust the port if needed
+    response = RedirectResponse(url="http://localhost:5173")
+    response.set_cookie(
+        SESSION_COOKIE,
+        session_id,
+        max_age=SESSION_COOKIE_MAX_AGE,
+        httponly=True,
+        samesite="lax",
+    )
+    return response
+
+
+@router.get("/accounts")
+def get_accounts(
+    account_ids: List[str] = Depends(session_account_ids),
+    account_id: Optional[str] = Depends(selected_account_id),
+):
+    """Accounts of this session and the one selected for this request."""
+    return {"accounts": list_accounts(account_ids), "selected": account_id}
+
+
+@router.post("/accounts/{account_id}/select")
+def select_account(
+    account_id: str, session: Optional[SessionAccounts] = Depends(current_session)
+):
+    """Select one of the session's accounts for this browser."""
+    if session is None or not select_session_account(session, account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+    return {"selected": account_id}
+
 
-    # Redirect back to your React app
-    return RedirectResponse(url="http://localhost:5173")  # Adjust the port if needed
+@router.delete("/accounts/{account_id}")
+async def remove_account(
+    account_id: str, account_ids: List[str] = Depends(session_account_ids)
+):
+    if account_id not in account_ids or not await delete_account(account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+    return {"message": "Account removed", "account_id": account_id}
 
 
 @router.get("/check")
-async def check_creds(credentials=Depends(authenticate_youtube)):
+async def check_creds(credentials=Depends(optional_credentials)):
     has_secret = os.path.exists(CLIENT_SECRETS_FULL_PATH)
     try:
         if credentials and has_secret:
-            return {
-                "valid": True,
-                "token": credentials.token,
-                "refresh_token": credentials.refresh_token,
-                "token_uri": credentials.token_uri,
-                "client_id": credentials.client_id,
-                "scopes": credentials.scopes,
-            }
+            return {"valid": True, "scopes": credentials.scopes}
         elif not has_secret:
             return {"valid": False, "reason": "No client secrets found."}
         else:
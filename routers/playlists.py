@@ -1,24 +1,50 @@
-from typing import Annotated, Optional
+import asyncio
+import json
+
+from typing import Annotated, List, Optional
 from fastapi import Query, Depends, APIRouter
 from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
 
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from sqlalchemy.orm import Session
 
+from core.fields import FieldTree, project
+from core.local_store import is_valid_local_page_token
+from core.mirrors import (
+    MirrorError,
+    delete_mirror,
+    list_mirrors,
+    mirror_owned,
+    mirror_scheduler,
+    save_mirror,
+)
+from core.playlist_snapshots import (
+    PlaylistNotFound,
+    ensure_snapshot,
+    query_playlist_items,
+)
 from core.playlists import (
-    get_playlist_items,
     add_playlist_videos,
+    bulk_add_playlist_videos,
+    bulk_remove_playlist_videos,
     get_playlists,
+    stream_playlist_items,
 )
 
 from models.playlists import (
     PlaylistCreateRequest,
     PlaylistAddVideosRequest,
+    PlaylistBulkVideosRequest,
+    PlaylistMirrorRequest,
     SortOrder,
 )
 
-from dependencies.dependency import get_credentials
-
+from core.responses import json_response
+from core.youtube import account_key, build_youtube
+from db.db import get_db
+from dependencies.dependency import get_credentials, get_fields
+from routers.ouauth2 import selected_account_id, session_account_ids
 
 router = APIRouter(prefix="/playlists", tags=["Playlists"])
 
@@ -29,7 +55,7 @@ async def collect_playlists_mine(
     credentials=Depends(get_credentials),
 ):
     try:
-        youtube = build("youtube", "v3", credentials=credentials)
+        youtube = build_youtube(credentials)
 
         # Check if the user has a channel
         channel_request = youtube.channels().list(part="id", mine=True)
@@ -75,7 +101,7 @@ async def add_playlist(
     Creates a new YouTube playlist with the specified title, description, and privacy status.
     """
     try:
-        youtube = build("youtube", "v3", credentials=credentials)
+        youtube = build_youtube(credentials)
 
         # Prepare the request body with a hardcoded privacy status for testing
         request_body = {
@@ -113,7 +139,7 @@ async def add_videos_to_playlist(
     credentials=Depends(get_credentials),
 ):
     try:
-        youtube = build("youtube", "v3", credentials=credentials)
+        youtube = build_youtube(credentials)
         response = add_playlist_videos(youtube, videos_request)
         return response
 
@@ -121,15 +147,167 @@ async def add_videos_to_playlist(
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
 
 
+async def _bulk_results_ndjson(results):
+    summary = {}
+    async for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+        yield json.dumps(result) + "\n"
+    yield json.dumps({"summary": summary}) + "\n"
+
+
+@router.post("/videos/bulk_add/")
+async def bulk_add_videos_to_playlist(
+    videos_request: PlaylistBulkVideosRequest,
+    credentials=Depends(get_credentials),
+):
+    """
+    Adds many videos to a playlist concurrently, streaming one NDJSON result per video.
+    """
+    results = bulk_add_playlist_videos(
+        credentials,
+        videos_request.playlist_id,
+        videos_request.video_ids,
+        videos_request.concurrency,
+    )
+    return StreamingResponse(
+        _bulk_results_ndjson(results), media_type="application/x-ndjson"
+    )
+
+
+@router.post("/videos/bulk_remove/")
+async def bulk_remove_videos_from_playlist(
+    videos_request: PlaylistBulkVideosRequest,
+    credentials=Depends(get_credentials),
+):
+    """
+    Removes many videos from a playlist concurrently, streaming one NDJSON result per video.
+    """
+    results = bulk_remove_playlist_videos(
+        credentials,
+        videos_request.playlist_id,
+        videos_request.video_ids,
+        videos_request.concurrency,
+    )
+    return StreamingResponse(
+        _bulk_results_ndjson(results), media_type="application/x-ndjson"
+    )
+
+
 @router.get("/items/")
 async def get_playlist_videos(
     playlist_id: str = "PLX7CQOTnV_M35rbnhHyMHLrUXQlG71zef",
     max_results: int = Query(500, ge=1, le=1000),
     sort_order: SortOrder = Query(SortOrder.OLDEST),
+    page_token: Optional[str] = Query(None),
+    refresh: bool = Query(False, description="Check YouTube for changes first"),
+    stream: bool = Query(False, description="Stream pages as NDJSON"),
+    fields: Optional[FieldTree] = Depends(get_fields),
+    credentials=Depends(get_credentials),
+    db: Session = Depends(get_db),
+):
+    """
+    Items of a playlist, served from its local snapshot.
+
+    Streaming reads YouTube directly and bypasses the snapshot.
+    """
+    if stream:
+        return StreamingResponse(
+            stream_playlist_items(
+                credentials, playlist_id, max_results, sort_order, fields
+            ),
+            media_type="application/x-ndjson",
+        )
+    if page_token and not is_valid_local_page_token(page_token):
+        raise HTTPException(status_code=400, detail="Invalid page token")
+
+    try:
+        await ensure_snapshot(credentials, playlist_id, refresh)
+    except PlaylistNotFound:
+        raise HTTPException(status_code=404, detail="Playlist not found.")
+    except HttpError as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+
+    page = query_playlist_items(
+        db,
+        account_key(credentials),
+        playlist_id,
+        sort_order,
+        page_token,
+        max_results,
+    )
+    page["videos"] = project(page["videos"], fields)
+    return json_response(page)
+
+
+@router.post("/items/sync")
+async def sync_playlist_videos(
+    playlist_id: str,
+    force: bool = Query(False, description="Walk the playlist even if unchanged"),
+    credentials=Depends(get_credentials),
+):
+    """
+    Refreshes the local snapshot of a playlist and reports the items added and removed.
+    """
+    try:
+        return await ensure_snapshot(
+            credentials, playlist_id, refresh=True, force=force
+        )
+    except PlaylistNotFound:
+        raise HTTPException(status_code=404, detail="Playlist not found.")
+    except HttpError as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+
+
+@router.get("/mirrors")
+async def get_playlist_mirrors(account_ids: List[str] = Depends(session_account_ids)):
+    return {"mirrors": await asyncio.to_thread(list_mirrors, account_ids)}
+
+
+@router.put("/mirrors")
+async def put_playlist_mirror(
+    mirror_request: PlaylistMirrorRequest,
     credentials=Depends(get_credentials),
+    account_id: Optional[str] = Depends(selected_account_id),
+    account_ids: List[str] = Depends(session_account_ids),
+):
+    """
+    Mirrors a playlist into a folder, synced with the selected account's credentials.
+
+    The first sync is scheduled right away, later ones every interval_minutes.
+    """
+    try:
+        mirror = await asyncio.to_thread(
+            save_mirror, mirror_request, account_id, account_ids
+        )
+    except MirrorError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    mirror_scheduler.wake()
+    return mirror
+
+
+@router.delete("/mirrors/{mirror_id}")
+async def delete_playlist_mirror(
+    mirror_id: int, account_ids: List[str] = Depends(session_account_ids)
 ):
+    if not await asyncio.to_thread(delete_mirror, mirror_id, account_ids):
+        raise HTTPException(status_code=404, detail="Mirror not found.")
+    return {"message": "Mirror deleted.", "mirror_id": mirror_id}
+
+
+@router.post("/mirrors/{mirror_id}/sync")
+async def sync_playlist_mirror(
+    mirror_id: int, account_ids: List[str] = Depends(session_account_ids)
+):
+    """
+    Syncs a mirror now, enqueueing the videos that are not downloaded yet.
+    """
+    if not await asyncio.to_thread(mirror_owned, mirror_id, account_ids):
+        raise HTTPException(status_code=404, detail="Mirror not found.")
     try:
-        videos = get_playlist_items(credentials, playlist_id, max_results, sort_order)
-        return videos
+        return await mirror_scheduler.sync_now(mirror_id)
+    except MirrorError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PlaylistNotFound:
+        raise HTTPException(status_code=404, detail="Playlist not found.")
     except HttpError as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
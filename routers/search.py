@@ -1,9 +1,21 @@
-from googleapiclient.discovery import build
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from models.search import YouTubeSearchParams
-from dependencies.dependency import get_credentials
+from core.fields import FieldTree, format_fields, list_fields, merge_fields, project
+from core.prefetch import page_cache
+from core.quota import SEARCH_LIST_COST
+from core.responses import json_response
+from core.search import SearchMerger, multi_search_budget
+from core.youtube import account_key, execute_async
+
+from models.search import MultiSearchRequest, YouTubeSearchParams
+from dependencies.dependency import get_credentials, get_fields
 from db.db import get_db, create_search_record
 from schemas.schemas import SearchRecord
 from models.search import SearchRecordAddRequest
@@ -11,18 +23,18 @@ from models.search import SearchRecordAddRequest
 router = APIRouter(prefix="/search", tags=["Search"])
 
 
-@router.get("/")
-async def youtube_search(
-    params: YouTubeSearchParams = Depends(),
-    credentials=Depends(get_credentials),
+def _search_request(
+    youtube,
+    params: YouTubeSearchParams,
+    page_token: str | None,
+    fields: str | None = None,
 ):
-    youtube = build("youtube", "v3", credentials=credentials)
-    request = youtube.search().list(
+    return youtube.search().list(
         part="snippet",
         q=params.query,
         type="video",
         maxResults=params.max_results,
-        pageToken=params.page_token,  # If provided, fetch the next page
+        pageToken=page_token,  # If provided, fetch the next page
         safeSearch=params.safeSearch,
         videoDefinition=params.videoDefinition,
         videoDuration=params.videoDuration,
@@ -34,16 +46,159 @@ async def youtube_search(
         publishedBefore=(
             params.publishedBefore.isoformat() if params.publishedBefore else None
         ),
+        channelId=params.channelId,
+        fields=fields,
     )
 
-    response = request.execute()
+
+async def _search_page(
+    credentials,
+    params: YouTubeSearchParams,
+    upstream_fields: str | None,
+    prefetch: bool = False,
+):
+    async def fetch(page_token):
+        return await execute_async(
+            credentials,
+            lambda youtube: _search_request(
+                youtube, params, page_token, upstream_fields
+            ),
+        )
+
+    return await page_cache.get_page(
+        "search",
+        account_key(credentials),
+        {
+            **params.model_dump(mode="json", exclude={"page_token"}),
+            "fields": upstream_fields,
+        },
+        params.page_token,
+        fetch,
+        prefetch=prefetch,
+        cost=SEARCH_LIST_COST,
+    )
+
+
+@router.get("/")
+async def youtube_search(
+    params: YouTubeSearchParams = Depends(),
+    prefetch: bool = Query(False, description="Prefetch the next page"),
+    fields: Optional[FieldTree] = Depends(get_fields),
+    credentials=Depends(get_credentials),
+):
+    upstream_fields = format_fields(list_fields(fields)) if fields else None
+    response = await _search_page(credentials, params, upstream_fields, prefetch)
 
     # Return the results including the nextPageToken for pagination
+    return json_response(
+        {
+            "results": project(response.get("items", []), fields),
+            "nextPageToken": response.get("nextPageToken"),
+            "totalResults": response["pageInfo"]["totalResults"],
+            "resultsPerPage": response["pageInfo"]["resultsPerPage"],
+        }
+    )
+
+
+async def _multi_search_ndjson(
+    credentials,
+    request: MultiSearchRequest,
+    fields: Optional[FieldTree],
+    upstream_fields: str | None,
+):
+    merger = SearchMerger(request.ranking)
+    semaphore = asyncio.Semaphore(request.concurrency)
+    failed = []
+
+    async def run(index: int, params: YouTubeSearchParams):
+        async with semaphore:
+            if not multi_search_budget.try_spend(SEARCH_LIST_COST):
+                return index, None, "Multi-search quota budget exhausted"
+            try:
+                response = await _search_page(credentials, params, upstream_fields)
+            except Exception as e:
+                multi_search_budget.refund(SEARCH_LIST_COST)
+                return index, None, f"An error occurred: {e}"
+            return index, response, None
+
+    tasks = [
+        asyncio.create_task(run(index, params))
+        for index, params in enumerate(request.queries)
+    ]
+    try:
+        # Each query is reported as soon as it returns
+        for result in asyncio.as_completed(tasks):
+            index, response, error = await result
+            if error:
+                failed.append(index)
+                yield json.dumps({"query": index, "error": error}) + "\n"
+                continue
+            items = response.get("items", [])
+            new = merger.add(index, items)
+            yield json.dumps(
+                {
+                    "query": index,
+                    "results": project(new, fields),
+                    "received": len(items),
+                    "duplicates": len(items) - len(new),
+                }
+            ) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    merged = [
+        {
+            **project(entry["item"], fields),
+            "matchedQueries": entry["matchedQueries"],
+            "score": entry["score"],
+        }
+        for entry in merger.merged(request.max_results)
+    ]
+    yield json.dumps(
+        {
+            "merged": merged,
+            "ranking": request.ranking,
+            "totalResults": len(merger),
+            "failed": sorted(failed),
+        }
+    ) + "\n"
+
+
+@router.post("/multi")
+async def youtube_multi_search(
+    request: MultiSearchRequest,
+    fields: Optional[FieldTree] = Depends(get_fields),
+    credentials=Depends(get_credentials),
+):
+    """
+    Runs several searches concurrently and merges their results, one entry per video.
+
+    Streams one NDJSON line per query as it returns, holding the videos it
+    added to the merge, then a last line with the merged and ranked list.
+    """
+    if multi_search_budget.available < SEARCH_LIST_COST:
+        raise HTTPException(
+            status_code=429, detail="Multi-search quota budget exhausted."
+        )
+    # Results are deduplicated by video ID, so it is fetched even when not selected
+    upstream_fields = (
+        format_fields(list_fields(merge_fields(fields, "id/videoId")))
+        if fields
+        else None
+    )
+    return StreamingResponse(
+        _multi_search_ndjson(credentials, request, fields, upstream_fields),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.get("/prefetch/stats")
+async def get_prefetch_stats():
+    """Hit rate of the speculative next-page prefetch, per listing."""
     return {
-        "results": response.get("items", []),
-        "nextPageToken": response.get("nextPageToken"),
-        "totalResults": response["pageInfo"]["totalResults"],
-        "resultsPerPage": response["pageInfo"]["resultsPerPage"],
+        namespace: page_cache.stats(namespace).as_dict()
+        for namespace in ("search", "channel_videos")
     }
 
 
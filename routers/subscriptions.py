@@ -0,0 +1,50 @@
+import asyncio
+import logging
+
+from googleapiclient.errors import HttpError
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from core.local_store import is_valid_local_page_token
+from core.subscriptions import ensure_syncer, query_subscriptions
+from db.db import get_db
+from dependencies.dependency import get_credentials
+
+router = APIRouter(prefix="/subscriptions", tags=["Subscriptions"])
+
+logger = logging.getLogger(__name__)
+
+FIRST_SYNC_TIMEOUT = 30  # Seconds a first request waits for the initial sync
+
+
+@router.get("/")
+async def get_subscriptions(
+    q: str | None = Query(None, description="Filter by channel title"),
+    max_results: int = Query(50, ge=1, le=500),
+    page_token: str | None = Query(None),
+    refresh: bool = Query(False, description="Sync with YouTube before answering"),
+    credentials=Depends(get_credentials),
+    db: Session = Depends(get_db),
+):
+    """
+    Subscriptions of the account, served from the local mirror.
+    """
+    if page_token and not is_valid_local_page_token(page_token):
+        raise HTTPException(status_code=400, detail="Invalid page token")
+
+    syncer = ensure_syncer(credentials)
+    if refresh:
+        try:
+            await syncer.sync_now()
+        except HttpError as e:
+            raise HTTPException(status_code=e.resp.status, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
+    else:
+        try:
+            await asyncio.wait_for(syncer.ready.wait(), timeout=FIRST_SYNC_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Serving subscriptions before the first sync")
+
+    return query_subscriptions(db, syncer.account, q, page_token, max_results)
@@ -0,0 +1,67 @@
+import urllib.error
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Path, Query, Request
+from fastapi.responses import Response
+
+from core.responses import SendfileResponse
+from core.thumbnails import THUMBNAIL_WIDTHS, ThumbnailNotFound, thumbnail_cache
+from dependencies.dependency import YOUTUBE_VIDEO_ID_REGEX
+
+router = APIRouter(prefix="/thumbnails", tags=["Thumbnails"])
+
+THUMBNAIL_MAX_AGE = 24 * 60 * 60
+
+
+class CachedThumbnailResponse(SendfileResponse):
+    """Keeps the cached file from eviction until it has been sent."""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            thumbnail_cache.release(self.path)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+@router.get("/stats")
+async def get_thumbnail_cache_stats():
+    """Size of the local thumbnail cache."""
+    return thumbnail_cache.stats()
+
+
+@router.get("/{video_id}")
+async def get_thumbnail(
+    request: Request,
+    video_id: str = Path(..., pattern=YOUTUBE_VIDEO_ID_REGEX),
+    width: Optional[int] = Query(
+        None, description=f"Resize to one of {', '.join(map(str, THUMBNAIL_WIDTHS))}"
+    ),
+):
+    """
+    Serves a video thumbnail from the local cache, fetching it on first use.
+    """
+    if width is not None and width not in THUMBNAIL_WIDTHS:
+        raise HTTPException(
+            status_code=400, detail=f"Width must be one of {THUMBNAIL_WIDTHS}"
+        )
+    try:
+        path, etag = await thumbnail_cache.get(video_id, width)
+    except ThumbnailNotFound:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch thumbnail: {e}")
+
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={THUMBNAIL_MAX_AGE}"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        thumbnail_cache.release(path)
+        return Response(status_code=304, headers=headers)
+    # Sent with sendfile by servers that support the pathsend extension
+    return CachedThumbnailResponse(path, media_type="image/jpeg", headers=headers)
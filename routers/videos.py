@@ -1,9 +1,11 @@
-from googleapiclient.discovery import build
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Query, Depends
 from googleapiclient.http import HttpError
 
-from dependencies.dependency import get_credentials
-
+from core.fields import FieldTree, format_fields, list_fields, project
+from core.responses import json_response
+from core.youtube import build_youtube
+from dependencies.dependency import get_credentials, get_fields
 
 router = APIRouter(prefix="/videos", tags=["Video Details"])
 
@@ -12,21 +14,27 @@ router = APIRouter(prefix="/videos", tags=["Video Details"])
 async def get_video_details(
     video_id: str = Query(..., description="The ID of the YouTube video"),
     part: str = "snippet",
+    fields: Optional[FieldTree] = Depends(get_fields),
     credentials=Depends(get_credentials),
 ):
     """
     Fetch details of a YouTube video by video ID.
     """
+    response_fields = list_fields(fields) if fields else None
     try:
-        youtube = build("youtube", "v3", credentials=credentials)
-        request = youtube.videos().list(part=part, id=video_id)
+        youtube = build_youtube(credentials)
+        request = youtube.videos().list(
+            part=part,
+            id=video_id,
+            fields=format_fields(response_fields) if fields else None,
+        )
         response = request.execute()
 
-        if not response["items"]:
+        if not response.get("items"):
             raise HTTPException(status_code=404, detail="Video not found")
 
         # video_data = response["items"][0]
-        return response
+        return json_response(project(response, response_fields))
 
     except HttpError as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
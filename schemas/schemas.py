@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Enum, DateTime
+from sqlalchemy import Boolean, Column, String, Integer, Enum, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 from models.downloads import DownloadStatus
@@ -34,3 +34,190 @@ class SearchRecord(Base):
     id = Column(Integer, primary_key=True)
     query = Column(String, nullable=False)
     date = Column(DateTime, nullable=False)
+
+
+class CommentRecord(Base):
+    __tablename__ = "comments"
+    id = Column(String, primary_key=True)  # YouTube comment ID
+    video_id = Column(String, nullable=False, index=True)
+    parent_id = Column(String, nullable=True, index=True)  # Set for replies
+    author = Column(String, nullable=True, index=True)
+    text = Column(String, nullable=True)
+    like_count = Column(Integer, nullable=False, default=0, index=True)
+    published_at = Column(DateTime, nullable=False, index=True)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class CommentSyncState(Base):
+    __tablename__ = "comment_sync"
+    video_id = Column(String, primary_key=True)
+    last_published_at = Column(DateTime, nullable=True)  # Newest synced thread
+    synced_at = Column(DateTime, nullable=False)
+
+
+class ChannelVideo(Base):
+    __tablename__ = "channel_videos"
+    video_id = Column(String, primary_key=True)
+    channel_id = Column(String, nullable=False, index=True)
+    title = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    channel_title = Column(String, nullable=True)
+    thumbnails = Column(String, nullable=True)  # JSON encoded snippet.thumbnails
+    published_at = Column(DateTime, nullable=False)
+    duration_seconds = Column(Integer, nullable=True)
+    definition = Column(String, nullable=True)  # "hd" or "sd"
+    view_count = Column(Integer, nullable=True)
+    like_count = Column(Integer, nullable=True)
+    comment_count = Column(Integer, nullable=True)
+    stats_synced_at = Column(DateTime, nullable=True)  # Statistics rotate by this
+
+    # One index per local sort order, all scoped to the channel
+    __table_args__ = (
+        Index("ix_channel_videos_published", "channel_id", "published_at"),
+        Index("ix_channel_videos_views", "channel_id", "view_count"),
+        Index("ix_channel_videos_likes", "channel_id", "like_count"),
+        Index("ix_channel_videos_duration", "channel_id", "duration_seconds"),
+    )
+
+
+class ChannelCatalog(Base):
+    __tablename__ = "channel_catalogs"
+    channel_id = Column(String, primary_key=True)
+    uploads_playlist_id = Column(String, nullable=False)
+    video_count = Column(Integer, nullable=False, default=0)
+    synced_at = Column(DateTime, nullable=False)
+
+
+class ActivityRecord(Base):
+    __tablename__ = "activities"
+    id = Column(String, primary_key=True)  # YouTube activity ID
+    account = Column(String, nullable=False)
+    type = Column(String, nullable=True)  # upload, like, playlistItem, ...
+    title = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    video_id = Column(String, nullable=True)
+    published_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_activities_account_published", "account", "published_at"),
+    )
+
+
+class SubscriptionRecord(Base):
+    __tablename__ = "subscriptions"
+    account = Column(String, primary_key=True)
+    channel_id = Column(String, primary_key=True)
+    subscription_id = Column(String, nullable=False)
+    title = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    thumbnails = Column(String, nullable=True)  # JSON encoded snippet.thumbnails
+    subscribed_at = Column(DateTime, nullable=True)
+    position = Column(Integer, nullable=False)  # Order returned by the API
+
+    __table_args__ = (
+        Index("ix_subscriptions_account_position", "account", "position"),
+        Index("ix_subscriptions_account_title", "account", "title"),
+    )
+
+
+class SubscriptionSyncState(Base):
+    __tablename__ = "subscription_sync"
+    account = Column(String, primary_key=True)
+    etag = Column(String, nullable=True)  # Of the first page at the last full sync
+    total_results = Column(Integer, nullable=False, default=0)
+    # First-page checks answered without a walk since the last full sync
+    checks_since_sync = Column(Integer, nullable=False, default=0)
+    synced_at = Column(DateTime, nullable=False)
+    checked_at = Column(DateTime, nullable=False)
+
+
+class Account(Base):
+    __tablename__ = "accounts"
+    id = Column(String, primary_key=True)  # YouTube channel ID when known
+    title = Column(String, nullable=True)
+    token = Column(String, nullable=False)  # Authorized user info as JSON
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class AccountSession(Base):
+    __tablename__ = "account_sessions"
+    id = Column(String, primary_key=True)  # SHA-256 of the session cookie
+    selected_account_id = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+class AccountSessionMember(Base):
+    __tablename__ = "account_session_members"
+    session_id = Column(String, primary_key=True)
+    account_id = Column(String, primary_key=True, index=True)  # Authorized here
+
+
+class PlaylistSnapshot(Base):
+    __tablename__ = "playlist_snapshots"
+    account = Column(String, primary_key=True)  # Private playlists differ per account
+    playlist_id = Column(String, primary_key=True)
+    etag = Column(String, nullable=True)  # Of the playlist resource at the last walk
+    item_count = Column(Integer, nullable=False, default=0)
+    synced_at = Column(DateTime, nullable=False)
+    checked_at = Column(DateTime, nullable=False)
+
+
+class PlaylistSnapshotItem(Base):
+    __tablename__ = "playlist_snapshot_items"
+    account = Column(String, primary_key=True)
+    playlist_id = Column(String, primary_key=True)
+    item_id = Column(String, primary_key=True)  # YouTube playlist item ID
+    video_id = Column(String, nullable=False)
+    title = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    channel_id = Column(String, nullable=True)
+    channel_title = Column(String, nullable=True)
+    video_owner_channel_id = Column(String, nullable=True)
+    video_owner_channel_title = Column(String, nullable=True)
+    thumbnails = Column(String, nullable=True)  # JSON encoded snippet.thumbnails
+    published_at = Column(DateTime, nullable=True)  # When the item was added
+    position = Column(Integer, nullable=False)
+
+    # One index per sort order, all scoped to the playlist and ending in the
+    # position tiebreaker, so every order is a plain index scan
+    __table_args__ = (
+        Index("ix_playlist_items_position", "account", "playlist_id", "position"),
+        Index(
+            "ix_playlist_items_published",
+            "account",
+            "playlist_id",
+            "published_at",
+            "position",
+        ),
+        Index("ix_playlist_items_title", "account", "playlist_id", "title", "position"),
+    )
+
+
+class PlaylistMirror(Base):
+    __tablename__ = "playlist_mirrors"
+    id = Column(Integer, primary_key=True)
+    playlist_id = Column(String, nullable=False)
+    account_id = Column(String, nullable=True)  # Account whose credentials sync it
+    output_dir = Column(String, nullable=False)
+    constraints = Column(String, nullable=False)  # JSON encoded FormatConstraints
+    output_format = Column(String, nullable=False, default="mp4")
+    prune = Column(Boolean, nullable=False, default=False)
+    interval = Column(Integer, nullable=False)  # Seconds between scheduled syncs
+    enabled = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, nullable=False)
+    synced_at = Column(DateTime, nullable=True)
+    next_sync_at = Column(DateTime, nullable=False, index=True)
+    last_error = Column(String, nullable=True)
+
+    # A playlist can be mirrored into several folders, once per folder
+    __table_args__ = (
+        Index("ix_playlist_mirrors_folder", "playlist_id", "output_dir", unique=True),
+    )
+
+
+class PlaylistMirrorItem(Base):
+    __tablename__ = "playlist_mirror_items"
+    mirror_id = Column(Integer, primary_key=True)
+    video_id = Column(String, primary_key=True)  # Enqueued by the mirror
+    enqueued_at = Column(DateTime, nullable=False)
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# db/db.py creates sqlite.db in the working directory when it is imported
+os.chdir(tempfile.mkdtemp())
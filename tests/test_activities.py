@@ -0,0 +1,39 @@
+from core.activities import activity_row
+
+
+def _activity(activity_type, content_details):
+    return {
+        "id": "activity",
+        "snippet": {
+            "type": activity_type,
+            "title": "Title",
+            "publishedAt": "2024-05-01T12:00:00Z",
+        },
+        "contentDetails": {activity_type: content_details},
+    }
+
+
+def test_upload_video_id():
+    item = _activity("upload", {"videoId": "dQw4w9WgXcQ"})
+    assert activity_row(item, "account")["video_id"] == "dQw4w9WgXcQ"
+
+
+def test_nested_video_id():
+    item = _activity(
+        "like", {"resourceId": {"kind": "youtube#video", "videoId": "dQw4w9WgXcQ"}}
+    )
+    assert activity_row(item, "account")["video_id"] == "dQw4w9WgXcQ"
+
+
+def test_subscription_has_no_video_id():
+    item = _activity(
+        "subscription",
+        {"resourceId": {"kind": "youtube#channel", "channelId": "UC123"}},
+    )
+    assert activity_row(item, "account")["video_id"] is None
+
+
+def test_missing_content_details():
+    item = _activity("upload", {})
+    del item["contentDetails"]
+    assert activity_row(item, "account")["video_id"] is None
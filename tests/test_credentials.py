@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from google.oauth2.credentials import Credentials
+
+import core.credentials as credentials_module
+
+from core.credentials import CredentialCache
+
+
+class _Refreshing(Credentials):
+    def refresh(self, request):
+        self.token = "fresh"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+def _expired():
+    credentials = _Refreshing(token="old", refresh_token="refresh")
+    credentials.expiry = datetime.utcnow() - timedelta(minutes=1)
+    return credentials
+
+
+def test_expired_token_is_refreshed_and_persisted(monkeypatch):
+    monkeypatch.setattr(credentials_module, "Request", lambda: None)
+    persisted = []
+    cache = CredentialCache(
+        lambda key: _expired(), lambda *args: persisted.append(args)
+    )
+    credentials = cache.get("account")
+    assert credentials.token == "fresh"
+    assert persisted == [("account", credentials)]
+    assert cache.get("account") is credentials
+
+
+def test_refresh_after_evict_does_nothing(monkeypatch):
+    monkeypatch.setattr(credentials_module, "Request", lambda: None)
+    persisted = []
+    cache = CredentialCache(lambda key: None, lambda *args: persisted.append(args))
+    cache._credentials["account"] = _expired()
+    cache.evict("account")
+    # A refresh racing the deletion of the account
+    cache._refresh("account", wait=True)
+    cache._do_refresh("account")
+    assert persisted == []
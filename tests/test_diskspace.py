@@ -0,0 +1,97 @@
+import asyncio
+import os
+
+from types import SimpleNamespace
+
+import pytest
+
+import core.diskspace as diskspace
+
+from core.diskspace import (
+    DiskSpace,
+    InsufficientSpace,
+    estimate_download_size,
+    required_space,
+)
+
+
+@pytest.fixture
+def free(monkeypatch):
+    """Free bytes reported for every filesystem, adjustable by the test."""
+    disk = SimpleNamespace(free=1000)
+    monkeypatch.setattr(diskspace.shutil, "disk_usage", lambda path: disk)
+    monkeypatch.setattr(diskspace, "DISK_RECHECK_INTERVAL", 0.05)
+    return disk
+
+
+def test_estimate_and_required_space(monkeypatch):
+    formats = [
+        {"format_id": "137", "filesize": 300},
+        {"format_id": "140", "filesize": None, "filesize_approx": 50},
+        {"format_id": "18"},
+    ]
+    assert estimate_download_size(formats, ["137", "140", "18", "missing"]) == 350
+    monkeypatch.setattr(diskspace, "DISK_ESTIMATE_MARGIN", 1.5)
+    assert required_space(100) == 150
+    assert required_space(100, postprocessing=True) == 300
+
+
+def test_check_rejects_sizes_that_never_fit(tmp_path, free):
+    disk = DiskSpace(headroom=100)
+    disk.check(str(tmp_path / "not-created-yet"), 900)
+    with pytest.raises(InsufficientSpace) as error:
+        disk.check(str(tmp_path), 901)
+    assert error.value.available == 900
+
+
+def test_reservation_waits_for_release(tmp_path, free):
+    disk = DiskSpace(headroom=0)
+
+    async def run():
+        first = await disk.reserve(str(tmp_path), 700, preallocate=False)
+        second = asyncio.create_task(
+            disk.reserve(str(tmp_path), 500, preallocate=False)
+        )
+        await asyncio.sleep(0.1)
+        assert not second.done()  # 700 outstanding leaves 300
+        await disk.release(first)
+        return await asyncio.wait_for(second, timeout=1)
+
+    second = asyncio.run(run())
+    assert second.size == 500
+    assert disk.stats()[0]["outstanding"] == 500
+
+
+def test_written_bytes_stop_counting_as_outstanding(tmp_path, free):
+    disk = DiskSpace(headroom=0)
+
+    async def run():
+        reservation = await disk.reserve(str(tmp_path), 600, preallocate=False)
+        # The download wrote 400 bytes, which the free space now reflects
+        reservation.update(400)
+        free.free = 600
+        return await asyncio.wait_for(
+            disk.reserve(str(tmp_path), 400, preallocate=False), timeout=1
+        )
+
+    assert asyncio.run(run()).size == 400
+
+
+@pytest.mark.skipif(not hasattr(os, "posix_fallocate"), reason="no posix_fallocate")
+def test_preallocated_file_shrinks_and_is_removed(tmp_path, free, monkeypatch):
+    monkeypatch.setattr(diskspace, "PREALLOCATE_STEP", 100)
+    disk = DiskSpace(headroom=0)
+
+    async def run():
+        reservation = await disk.reserve(str(tmp_path), 500, preallocate=True)
+        path = reservation.preallocated
+        assert reservation.outstanding == 0
+        assert os.path.getsize(path) == 500
+        reservation.update(50)  # Below one step, left as it is
+        assert os.path.getsize(path) == 500
+        reservation.update(300)
+        assert os.path.getsize(path) == 200
+        await disk.release(reservation)
+        return path
+
+    assert not os.path.exists(asyncio.run(run()))
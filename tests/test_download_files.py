@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import core.responses as responses
+
+from core.downloads import DownloadTask, download_tasks, find_download_file
+from core.responses import SendfileResponse
+from db.db import SessionLocal
+from models.downloads import DownloadStatus
+from routers import downloads
+from schemas.schemas import Download
+
+VIDEO_ID = "eeeeeeeeeee"
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / f"Title - Channel - {VIDEO_ID}.mp4").write_bytes(CONTENT)
+    db = SessionLocal()
+    db.query(Download).filter_by(video_id=VIDEO_ID).delete()
+    db.add(
+        Download(
+            video_id=VIDEO_ID,
+            output_dir=str(tmp_path),
+            status=DownloadStatus.COMPLETE,
+        )
+    )
+    db.commit()
+    db.close()
+    app = FastAPI()
+    app.include_router(downloads.router)
+    yield TestClient(app)
+    download_tasks.clear()
+
+
+def test_finished_file_is_found_among_partial_ones(tmp_path):
+    for name in ("a - x.mp4.part", "a - x.f137.mp4", "a - x.webp"):
+        (tmp_path / name.replace("x", VIDEO_ID)).write_bytes(b"")
+    assert find_download_file(str(tmp_path), VIDEO_ID) is None
+    (tmp_path / f"a - {VIDEO_ID}.mkv").write_bytes(b"")
+    assert find_download_file(str(tmp_path), VIDEO_ID).endswith(".mkv")
+    assert find_download_file(str(tmp_path), VIDEO_ID, "mp4") is None
+
+
+def test_full_file(client):
+    response = client.get(f"/downloads/file/{VIDEO_ID}")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-type"] == "video/mp4"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "attachment" in response.headers["content-disposition"]
+
+
+def test_range(client):
+    response = client.get(
+        f"/downloads/file/{VIDEO_ID}", headers={"Range": "bytes=10-19"}
+    )
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+
+
+def test_conditional_get(client):
+    first = client.get(f"/downloads/file/{VIDEO_ID}")
+    etag = first.headers["etag"]
+    response = client.get(
+        f"/downloads/file/{VIDEO_ID}", headers={"If-None-Match": f"W/{etag}"}
+    )
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    response = client.get(
+        f"/downloads/file/{VIDEO_ID}",
+        headers={"If-Modified-Since": first.headers["last-modified"]},
+    )
+    assert response.status_code == 304
+    assert (
+        client.get(
+            f"/downloads/file/{VIDEO_ID}", headers={"If-None-Match": '"other"'}
+        ).status_code
+        == 200
+    )
+
+
+def test_unfinished_and_unknown_downloads(client):
+    task = DownloadTask(VIDEO_ID)
+    download_tasks[VIDEO_ID] = task
+    assert client.get(f"/downloads/file/{VIDEO_ID}").status_code == 409
+    download_tasks.clear()
+    assert client.get("/downloads/file/fffffffffff").status_code == 404
+    assert client.get(f"/downloads/file/{VIDEO_ID}?ext=mkv").status_code == 404
+    assert client.get("/downloads/file/not-an-id").status_code == 400
+
+
+def test_accel_redirect(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(responses, "ACCEL_REDIRECT_ROOT", str(tmp_path))
+    response = client.get(f"/downloads/file/{VIDEO_ID}")
+    assert response.headers["x-accel-redirect"] == (
+        f"/protected-files/Title%20-%20Channel%20-%20{VIDEO_ID}.mp4"
+    )
+    assert response.content == b""
+
+
+def _serve(path, extensions, headers=()):
+    """Run a SendfileResponse against a fake server, returns the sent messages."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "headers": list(headers),
+        "extensions": extensions,
+    }
+    asyncio.run(SendfileResponse(path)(scope, receive, send))
+    return sent
+
+
+def test_pathsend_hands_the_file_to_the_server(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(CONTENT)
+    sent = _serve(str(path), {"http.response.pathsend": {}})
+    assert sent[1] == {"type": "http.response.pathsend", "path": str(path)}
+
+
+def test_zerocopy_range(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(CONTENT)
+    sent = _serve(
+        str(path), {"http.response.zerocopy": {}}, [(b"range", b"bytes=100-199")]
+    )
+    assert sent[0]["status"] == 206
+    assert (b"content-range", f"bytes 100-199/{len(CONTENT)}".encode()) in sent[0][
+        "headers"
+    ]
+    assert (sent[1]["offset"], sent[1]["count"]) == (100, 100)
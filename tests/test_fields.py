@@ -0,0 +1,67 @@
+import pytest
+
+from core.fields import FIELDS_MAX_LENGTH, format_fields, parse_fields, project
+
+
+def test_flat_fields():
+    assert parse_fields("id,etag") == {"id": None, "etag": None}
+
+
+def test_paths_and_sub_selections():
+    assert parse_fields("id,snippet(title,thumbnails/default/url)") == {
+        "id": None,
+        "snippet": {"title": None, "thumbnails": {"default": {"url": None}}},
+    }
+
+
+def test_spaces_are_ignored():
+    assert parse_fields("id, snippet( title )") == {
+        "id": None,
+        "snippet": {"title": None},
+    }
+
+
+def test_repeated_paths_are_merged():
+    assert parse_fields("snippet/title,snippet/description") == {
+        "snippet": {"title": None, "description": None}
+    }
+
+
+def test_whole_field_wins_over_sub_selection():
+    assert parse_fields("snippet,snippet/title") == {"snippet": None}
+    assert parse_fields("snippet/title,snippet") == {"snippet": None}
+
+
+def test_wildcard():
+    assert parse_fields("items/*/title") == {"items": {"*": {"title": None}}}
+
+
+@pytest.mark.parametrize(
+    "spec",
+    ["", "id,", "snippet(title", "snippet()", "id)", "a//b", "id;etag"],
+)
+def test_invalid_selectors(spec):
+    with pytest.raises(ValueError):
+        parse_fields(spec)
+
+
+def test_too_long():
+    with pytest.raises(ValueError):
+        parse_fields("a" * (FIELDS_MAX_LENGTH + 1))
+
+
+def test_round_trip():
+    spec = "id,snippet(title,thumbnails/default/url)"
+    assert format_fields(parse_fields(spec)) == spec
+
+
+def test_project():
+    data = {
+        "id": "x",
+        "etag": "e",
+        "snippet": {"title": "t", "description": "d"},
+    }
+    assert project(data, parse_fields("id,snippet/title")) == {
+        "id": "x",
+        "snippet": {"title": "t"},
+    }
@@ -0,0 +1,119 @@
+import pytest
+
+from pydantic import ValidationError
+
+from core.formats import resolve_format
+from models.downloads import FormatConstraints, FormatResolveRequest
+
+
+def _video(format_id, height, vcodec="avc1.640028", ext="mp4", size=None, fps=30):
+    return {
+        "format_id": format_id,
+        "ext": ext,
+        "height": height,
+        "vcodec": vcodec,
+        "acodec": "none",
+        "filesize": size,
+        "fps": fps,
+        "type": "video-only",
+    }
+
+
+def _audio(format_id, abr, acodec="mp4a.40.2", ext="m4a", size=None):
+    return {
+        "format_id": format_id,
+        "ext": ext,
+        "vcodec": "none",
+        "acodec": acodec,
+        "filesize": size,
+        "abr": abr,
+        "type": "audio-only",
+    }
+
+
+FORMATS = [
+    _video("137", 1080, size=400),
+    _video("248", 1080, vcodec="vp9", ext="webm", size=350),
+    _video("136", 720, size=200),
+    _video("247", 720, vcodec="vp9", ext="webm", size=150),
+    _audio("140", 128, size=40),
+    _audio("139", 48, size=15),
+    _audio("251", 160, acodec="opus", ext="webm", size=45),
+]
+
+
+def test_best_pair_without_constraints():
+    selection = resolve_format(FORMATS, FormatConstraints(), None)
+    assert selection["video_format_id"] in ("137", "248")
+    assert selection["height"] == 1080
+    assert selection["audio_format_id"] == "251"
+
+
+def test_codec_preference_breaks_height_ties():
+    constraints = FormatConstraints(video_codecs=["vp9"], audio_codecs=["aac"])
+    selection = resolve_format(FORMATS, constraints, None)
+    assert selection["format"] == "248+140"
+
+
+def test_container_restricts_video_and_audio():
+    selection = resolve_format(FORMATS, FormatConstraints(container="mp4"), None)
+    assert selection["format"] == "137+140"
+    assert selection["ext"] == "mp4"
+
+
+def test_budget_lowers_audio_before_resolution():
+    constraints = FormatConstraints(container="mp4", max_filesize=420)
+    selection = resolve_format(FORMATS, constraints, None)
+    assert selection["format"] == "137+139"
+    assert selection["estimated_size"] == 415
+
+
+def test_budget_falls_back_to_lower_resolution():
+    constraints = FormatConstraints(container="mp4", max_filesize=300)
+    selection = resolve_format(FORMATS, constraints, None)
+    assert selection["format"] == "136+140"
+
+
+def test_budget_falls_back_to_combined_format():
+    formats = FORMATS + [
+        {
+            "format_id": "18",
+            "ext": "mp4",
+            "height": 360,
+            "vcodec": "avc1.42001E",
+            "acodec": "mp4a.40.2",
+            "filesize": 50,
+            "type": "video+audio",
+        }
+    ]
+    constraints = FormatConstraints(max_filesize=100)
+    selection = resolve_format(formats, constraints, None)
+    assert selection["format"] == "18"
+    assert selection["audio_format_id"] is None
+
+
+def test_nothing_fits_the_budget():
+    assert resolve_format(FORMATS, FormatConstraints(max_filesize=10), None) is None
+
+
+def test_size_estimated_from_bitrate():
+    formats = [
+        {**_video("136", 720), "tbr": 800},
+        {**_audio("140", 128), "tbr": 128},
+    ]
+    constraints = FormatConstraints(max_filesize=10_000_000)
+    selection = resolve_format(formats, constraints, duration=60)
+    assert selection["estimated_size"] == (800 + 128) * 1000 // 8 * 60
+
+
+def test_audio_only():
+    constraints = FormatConstraints(audio_only=True, audio_codecs=["aac"])
+    selection = resolve_format(FORMATS, constraints, None)
+    assert selection["format"] == "140"
+    assert selection["video_format_id"] is None
+
+
+def test_resolve_request_rejects_invalid_video_ids():
+    FormatResolveRequest(video_ids=["dQw4w9WgXcQ"])
+    with pytest.raises(ValidationError):
+        FormatResolveRequest(video_ids=["not a video id"])
@@ -0,0 +1,23 @@
+import pytest
+
+from core.local_store import (
+    is_valid_local_page_token,
+    local_page_offset,
+    next_local_page_token,
+)
+
+
+@pytest.mark.parametrize("token", ["local:0", "local:150"])
+def test_valid_tokens(token):
+    assert is_valid_local_page_token(token)
+
+
+@pytest.mark.parametrize("token", ["CAoQAA", "local:", "local:-5", "local:1e3"])
+def test_invalid_tokens(token):
+    assert not is_valid_local_page_token(token)
+
+
+def test_offsets_round_trip():
+    assert local_page_offset(None) == 0
+    assert local_page_offset(next_local_page_token(50, 120)) == 50
+    assert next_local_page_token(120, 120) is None
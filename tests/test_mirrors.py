@@ -0,0 +1,88 @@
+import asyncio
+
+from types import SimpleNamespace
+
+import pytest
+
+import core.mirrors as mirrors
+
+from core.downloads import DownloadTask, download_tasks
+from models.downloads import DownloadStatus
+from models.playlists import PlaylistMirrorRequest
+
+
+@pytest.fixture
+def pruned(monkeypatch):
+    mirror = SimpleNamespace(
+        id=1, playlist_id="PL1", account_id="account", output_dir="/mirror", prune=True
+    )
+    pruned = []
+
+    async def ensure_snapshot(credentials, playlist_id, refresh=False):
+        return {"changed": True, "total": 0}
+
+    def prune(mirror_id, output_dir, video_ids):
+        pruned.extend(video_ids)
+
+    monkeypatch.setattr(mirrors, "_get_mirror", lambda mirror_id: mirror)
+    monkeypatch.setattr(mirrors.credential_cache, "get", lambda account_id: object())
+    monkeypatch.setattr(mirrors, "account_key", lambda credentials: "account")
+    monkeypatch.setattr(mirrors, "ensure_snapshot", ensure_snapshot)
+    monkeypatch.setattr(mirrors, "_missing_videos", lambda *args: [])
+    monkeypatch.setattr(mirrors, "_removed_videos", lambda *args: ["aaaaaaaaaaa"])
+    monkeypatch.setattr(mirrors, "_prune", prune)
+    yield pruned
+    download_tasks.clear()
+
+
+def _queued_task(output_dir):
+    task = DownloadTask("aaaaaaaaaaa")
+    task.output_dir = output_dir
+    download_tasks[task.video_id] = task
+    return task
+
+
+def test_prune_cancels_queued_download_of_the_mirror(pruned):
+    task = _queued_task("/mirror")
+    result = asyncio.run(mirrors.sync_mirror(1))
+    assert result["pruned"] == ["aaaaaaaaaaa"]
+    assert task.status == DownloadStatus.CANCELED
+    assert "aaaaaaaaaaa" not in download_tasks
+
+
+def test_prune_leaves_downloads_into_other_folders(pruned):
+    task = _queued_task("/elsewhere")
+    asyncio.run(mirrors.sync_mirror(1))
+    assert task.status == DownloadStatus.QUEUED
+    assert download_tasks["aaaaaaaaaaa"] is task
+    assert pruned == ["aaaaaaaaaaa"]
+
+
+def test_canceled_queued_task_does_not_download():
+    task = DownloadTask("aaaaaaaaaaa")
+    task.cancel()
+    assert task.status == DownloadStatus.CANCELED
+    # Returns before writing a record or starting yt-dlp
+    asyncio.run(task.download(quality="best"))
+    assert task.download_record is None
+    assert task.status == DownloadStatus.CANCELED
+
+
+def _request(output_dir):
+    return PlaylistMirrorRequest(playlist_id="PLshared", output_dir=output_dir)
+
+
+def test_playlist_mirrored_per_folder_and_account():
+    first = mirrors.save_mirror(_request("/a"), "one", ["one"])
+    second = mirrors.save_mirror(_request("/b"), "two", ["two"])
+    assert first["id"] != second["id"]
+    assert [m["output_dir"] for m in mirrors.list_mirrors(["two"])] == ["/b"]
+
+    # The same folder is the same mirror, only its account may change it
+    assert mirrors.save_mirror(_request("/a"), "one", ["one"])["id"] == first["id"]
+    with pytest.raises(mirrors.MirrorError):
+        mirrors.save_mirror(_request("/a"), "two", ["two"])
+
+    assert not mirrors.delete_mirror(first["id"], ["two"])
+    assert mirrors.delete_mirror(first["id"], ["one"])
+    assert mirrors.mirror_owned(second["id"], ["two"])
@@ -0,0 +1,122 @@
+import asyncio
+
+from types import SimpleNamespace
+
+import pytest
+
+import core.playlist_snapshots as snapshots
+
+from db.db import SessionLocal
+from models.playlists import SortOrder
+
+
+def _item(number, published):
+    return {
+        "id": f"item-{number}",
+        "snippet": {
+            "playlistId": "PL1",
+            "resourceId": {"kind": "youtube#video", "videoId": f"video-{number}"},
+            "title": f"Title {number}",
+            "publishedAt": f"2024-01-0{published}T00:00:00Z",
+        },
+    }
+
+
+class FakePlaylist:
+    """Answers playlists.list and pages of playlistItems.list, two items a page."""
+
+    def __init__(self, etag, items):
+        self.etag = etag
+        self.items = items
+        self.item_pages = 0
+
+    def playlists(self):
+        return SimpleNamespace(list=lambda **kwargs: {"items": [{"etag": self.etag}]})
+
+    def playlistItems(self):
+        return SimpleNamespace(list=self._page)
+
+    def _page(self, pageToken=None, **kwargs):
+        self.item_pages += 1
+        start = int(pageToken or 0)
+        end = start + 2
+        return {
+            "items": self.items[start:end],
+            "nextPageToken": str(end) if end < len(self.items) else None,
+        }
+
+
+@pytest.fixture
+def playlist(monkeypatch, request):
+    playlist = FakePlaylist("etag-1", [_item(1, 3), _item(2, 1), _item(3, 2)])
+    # Snapshots are stored per account, one per test keeps them apart
+    playlist.account = request.node.name
+
+    async def execute_with_retry(credentials, make_request):
+        return make_request(playlist)
+
+    monkeypatch.setattr(snapshots, "execute_with_retry", execute_with_retry)
+    monkeypatch.setattr(snapshots, "account_key", lambda credentials: playlist.account)
+    return playlist
+
+
+def _sync(force=False):
+    return asyncio.run(snapshots.sync_playlist_snapshot(None, "PL1", force))
+
+
+def _videos(result):
+    return [entry["videoId"] for entry in result]
+
+
+def test_first_sync_adds_every_item(playlist):
+    result = _sync()
+    assert result["changed"] and result["total"] == 3
+    assert _videos(result["added"]) == ["video-1", "video-2", "video-3"]
+    assert result["removed"] == []
+    assert playlist.item_pages == 2
+
+
+def test_unchanged_etag_skips_the_walk(playlist):
+    _sync()
+    result = _sync()
+    assert not result["changed"] and result["total"] == 3
+    assert playlist.item_pages == 2
+    assert _sync(force=True)["changed"]
+
+
+def test_changed_etag_reports_the_diff(playlist):
+    _sync()
+    playlist.etag = "etag-2"
+    playlist.items = [_item(1, 3), _item(3, 2), _item(4, 4)]
+    result = _sync()
+    assert _videos(result["added"]) == ["video-4"]
+    assert _videos(result["removed"]) == ["video-2"]
+    assert result["total"] == 3
+
+
+def test_local_pages_in_each_order(playlist):
+    _sync()
+    db = SessionLocal()
+    try:
+
+        def page(order, token=None):
+            return snapshots.query_playlist_items(
+                db, playlist.account, "PL1", order, token, max_results=2
+            )
+
+        first = page(SortOrder.NEWEST)
+        assert [v["snippet"]["resourceId"]["videoId"] for v in first["videos"]] == [
+            "video-1",
+            "video-3",
+        ]
+        assert first["nextPageToken"] == "local:2"
+        rest = page(SortOrder.NEWEST, first["nextPageToken"])
+        assert [v["id"] for v in rest["videos"]] == ["item-2"]
+        assert rest["nextPageToken"] is None
+
+        oldest = page(SortOrder.OLDEST)
+        assert [v["id"] for v in oldest["videos"]] == ["item-2", "item-3"]
+        position = page(SortOrder.POSITION)
+        assert [v["snippet"]["position"] for v in position["videos"]] == [0, 1]
+    finally:
+        db.close()
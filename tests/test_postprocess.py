@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from core.postprocess import build_job as _build_job
+from models.downloads import PostProcessOperation, PostProcessOptions
+
+EMBED = PostProcessOperation.EMBED_THUMBNAIL
+
+
+def build_job(*args):
+    # Jobs carry a future, so they are built inside a running loop
+    async def build():
+        return _build_job(*args)
+
+    return asyncio.run(build())
+
+
+@pytest.mark.parametrize("path", ["/v/a - x.webm", "/v/a - x.opus"])
+def test_thumbnail_not_embedded_into_coverless_containers(path):
+    assert build_job("x", EMBED, path, PostProcessOptions(), None, "/v/t.jpg") is None
+
+
+@pytest.mark.parametrize(("path", "cover"), [("/v/a.mp4", 1), ("/v/a.mp3", 0)])
+def test_thumbnail_embedded_as_attached_picture(path, cover):
+    job = build_job("x", EMBED, path, PostProcessOptions(), None, "/v/t.jpg")
+    assert job.inputs == [path, "/v/t.jpg"]
+    assert job.args[-4:] == [
+        f"-c:v:{cover}",
+        "mjpeg",
+        f"-disposition:v:{cover}",
+        "attached_pic",
+    ]
+
+
+def test_remux_into_same_container_is_skipped():
+    options = PostProcessOptions(remux_format="mkv")
+    remux = PostProcessOperation.REMUX
+    assert build_job("x", remux, "/v/a.mkv", options) is None
+    assert build_job("x", remux, "/v/a.webm", options).output_path == "/v/a.mkv"
@@ -0,0 +1,66 @@
+import pytest
+
+from core.search import SearchMerger, _video_id
+
+
+def _item(video_id):
+    return {"id": {"kind": "youtube#video", "videoId": video_id}}
+
+
+def _ids(merger):
+    return [entry["item"]["id"]["videoId"] for entry in merger.merged()]
+
+
+def _merger(ranking):
+    merger = SearchMerger(ranking)
+    merger.add(0, [_item("a"), _item("b"), _item("c")])
+    merger.add(1, [_item("c"), _item("d")])
+    merger.add(2, [_item("d"), _item("c")])
+    return merger
+
+
+def test_video_id():
+    assert _video_id(_item("a")) == "a"
+    assert _video_id({"id": {"kind": "youtube#channel", "channelId": "UC"}}) is None
+    assert _video_id({}) is None
+
+
+def test_add_returns_only_new_videos():
+    merger = SearchMerger()
+    assert merger.add(0, [_item("a"), _item("b")]) == [_item("a"), _item("b")]
+    assert merger.add(1, [_item("b"), _item("c")]) == [_item("c")]
+    assert len(merger) == 3
+
+
+def test_results_without_video_are_skipped():
+    merger = SearchMerger()
+    channel = {"id": {"kind": "youtube#channel", "channelId": "UC"}}
+    assert merger.add(0, [channel, _item("a")]) == [_item("a")]
+    assert merger.merged()[0]["matchedQueries"] == [0]
+
+
+def test_rrf_ranking():
+    merger = _merger("rrf")
+    assert _ids(merger) == ["c", "d", "a", "b"]
+    top = merger.merged()[0]
+    assert top["matchedQueries"] == [0, 1, 2]
+    assert top["score"] == pytest.approx(1 / 63 + 1 / 61 + 1 / 62)
+
+
+def test_frequency_ranking():
+    # c is found by three queries, d by two, a and b by one at ranks 1 and 2
+    assert _ids(_merger("frequency")) == ["c", "d", "a", "b"]
+    merger = SearchMerger("frequency")
+    merger.add(0, [_item("a"), _item("b")])
+    merger.add(1, [_item("b")])
+    assert _ids(merger) == ["b", "a"]
+
+
+def test_first_seen_ranking():
+    merger = _merger("first_seen")
+    assert _ids(merger) == ["a", "b", "c", "d"]
+    assert merger.merged()[0]["score"] == 0.0
+
+
+def test_merged_limit():
+    assert len(_merger("rrf").merged(limit=2)) == 2
@@ -0,0 +1,36 @@
+import asyncio
+
+import core.subscriptions as subscriptions
+
+
+def _item(channel_id):
+    return {
+        "id": f"sub-{channel_id}",
+        "snippet": {"resourceId": {"channelId": channel_id}, "title": channel_id},
+    }
+
+
+def test_unchanged_first_page_walks_all_pages_periodically(monkeypatch):
+    pages = []
+
+    async def fetch_page(credentials, page_token=None):
+        pages.append(page_token)
+        if page_token is None:
+            return {
+                "etag": "etag",
+                "pageInfo": {"totalResults": 2},
+                "items": [_item("UC1")],
+                "nextPageToken": "page-2",
+            }
+        return {"items": [_item("UC2")]}
+
+    monkeypatch.setattr(subscriptions, "_fetch_page", fetch_page)
+    monkeypatch.setattr(subscriptions, "account_key", lambda credentials: "walks")
+
+    syncs = subscriptions.SUBSCRIPTION_FULL_SYNC_EVERY + 2
+    results = [
+        asyncio.run(subscriptions.sync_subscriptions(None)) for _ in range(syncs)
+    ]
+    assert [r["changed"] for r in results] == [True] + [False] * (syncs - 2) + [True]
+    assert pages.count("page-2") == 2
+    assert results[0] == {"changed": True, "added": 2, "removed": 0, "total": 2}
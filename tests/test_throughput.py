@@ -0,0 +1,60 @@
+from fastapi import BackgroundTasks
+
+from core.downloads import download_tasks, start_download
+from core.throughput import FleetThroughput, ThroughputRing, fleet_throughput
+from db.db import SessionLocal
+
+
+def test_ring_overwrites_oldest_samples():
+    ring = ThroughputRing(size=3)
+    for second in range(5):
+        ring.add(float(second), second * 100)
+    assert ring.count == 3
+    assert ring.samples() == [(2.0, 200), (3.0, 300), (4.0, 400)]
+    assert ring.bytes_since(3.0) == (3.0, 300)
+    assert ring.bytes_since(5.0) is None
+
+
+def test_series_rates():
+    ring = ThroughputRing()
+    for second in range(11):
+        ring.add(float(second), second * 1000)
+    series = ring.series(points=5)
+    assert len(series) == 5
+    assert all(point["rate"] == 1000.0 for point in series[1:])
+
+
+def test_transitions_keep_counts():
+    fleet = FleetThroughput()
+    fleet.transition(None, "queued")
+    fleet.transition("queued", "downloading")
+    fleet.transition("downloading", "downloading")
+    assert fleet.summary()["queued"] == 0
+    assert fleet.summary()["active"] == 1
+    fleet.transition("downloading", "complete")
+    assert fleet.summary()["active"] == 0
+    assert fleet.summary()["statuses"] == {"complete": 1}
+
+
+def _start(db, video_id):
+    return start_download(
+        BackgroundTasks(), db, video_id, None, None, "Title", quality="best"
+    )
+
+
+def test_replaced_and_canceled_tasks_leave_the_counts():
+    before = dict(fleet_throughput.statuses)
+    db = SessionLocal()
+    try:
+        first = _start(db, "ddddddddddd")
+        second = _start(db, "ddddddddddd")
+    finally:
+        db.close()
+    assert first.status.value == "canceled"
+    assert download_tasks["ddddddddddd"] is second
+    assert fleet_throughput.statuses["queued"] == before.get("queued", 0) + 1
+
+    second.cancel()
+    download_tasks.clear()
+    assert fleet_throughput.statuses["queued"] == before.get("queued", 0)
+    assert fleet_throughput.statuses["canceled"] == before.get("canceled", 0) + 2
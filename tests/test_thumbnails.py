@@ -0,0 +1,120 @@
+import asyncio
+import io
+import os
+import threading
+
+from types import SimpleNamespace
+
+import pytest
+
+from PIL import Image
+
+import core.thumbnails as thumbnails
+
+from core.thumbnails import ThumbnailCache
+
+
+def _jpeg(width, height=90):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    calls = []
+    release = threading.Event()
+    release.set()
+
+    def fetch(url):
+        calls.append(url)
+        release.wait(5)
+        return _jpeg(480, 360)
+
+    monkeypatch.setattr(thumbnails, "_fetch", fetch)
+    return SimpleNamespace(calls=calls, release=release)
+
+
+def test_miss_fetches_once_and_hits_after(tmp_path, fetches):
+    cache = ThumbnailCache(str(tmp_path), source_url="{video_id}")
+
+    async def run():
+        path, etag = await cache.get("aaaaaaaaaaa")
+        cache.release(path)
+        again, same = await cache.get("aaaaaaaaaaa")
+        cache.release(again)
+        return path, etag, again, same
+
+    path, etag, again, same = asyncio.run(run())
+    assert (path, etag) == (again, same)
+    assert fetches.calls == ["aaaaaaaaaaa"]
+    assert cache.stats()["bytes"] == os.path.getsize(path)
+
+
+def test_cancelled_waiter_does_not_cancel_shared_fetch(tmp_path, fetches):
+    cache = ThumbnailCache(str(tmp_path), source_url="{video_id}")
+    fetches.release.clear()
+
+    async def run():
+        first = asyncio.create_task(cache.get("aaaaaaaaaaa"))
+        second = asyncio.create_task(cache.get("aaaaaaaaaaa"))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        fetches.release.set()
+        path, _ = await second
+        cache.release(path)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return path
+
+    path = asyncio.run(run())
+    assert os.path.exists(path)
+    assert fetches.calls == ["aaaaaaaaaaa"]
+    assert cache._in_use == {}
+
+
+def test_concurrent_first_requests_load_once(tmp_path, fetches):
+    (tmp_path / "bbbbbbbbbbb.jpg").write_bytes(b"x" * 100)
+    cache = ThumbnailCache(str(tmp_path), source_url="{video_id}")
+
+    async def run():
+        results = await asyncio.gather(*(cache.get("bbbbbbbbbbb") for _ in range(5)))
+        for path, _ in results:
+            cache.release(path)
+
+    asyncio.run(run())
+    assert cache.stats() == {"files": 1, "bytes": 100, "max_bytes": cache.max_bytes}
+    assert fetches.calls == []
+
+
+def test_variant_not_wider_than_original_serves_original(tmp_path, fetches):
+    cache = ThumbnailCache(str(tmp_path), source_url="{video_id}")
+
+    async def run():
+        small, _ = await cache.get("aaaaaaaaaaa", 120)
+        cache.release(small)
+        wide, _ = await cache.get("aaaaaaaaaaa", 480)
+        cache.release(wide)
+        return small, wide
+
+    small, wide = asyncio.run(run())
+    assert small.endswith("aaaaaaaaaaa_w120.jpg")
+    assert Image.open(small).width == 120
+    assert wide.endswith("aaaaaaaaaaa.jpg")
+
+
+def test_eviction_skips_files_in_use(tmp_path, fetches):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=1, source_url="{video_id}")
+
+    async def run():
+        held, _ = await cache.get("aaaaaaaaaaa")
+        other, _ = await cache.get("ccccccccccc")
+        cache.release(other)
+        return held
+
+    held = asyncio.run(run())
+    # Both are over the limit, only the one still held survives the next eviction
+    assert os.path.exists(held)
+    cache.release(held)
+    cache._evict()
+    assert cache.stats()["files"] == 0